@@ -0,0 +1,159 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+"""
+自适应限速模块
+按下载slot（域名，可选按域名+代理）用AIMD方式调整并发数和下载延迟：
+响应正常时并发数加性增加、延迟逐步减小；出现429/5xx、超时或延迟过高时并发数乘性减小、延迟加倍。
+"""
+
+import time
+import logging
+from scrapy import signals
+from scrapy.exceptions import NotConfigured
+from scrapy.utils.httpobj import urlparse_cached
+from twisted.internet.error import TCPTimedOutError, TimeoutError
+
+
+# 视为服务端过载的响应状态码
+CONGESTION_CODES = {429, 500, 502, 503, 504}
+
+
+class SlotState:
+    """单个下载slot的AIMD状态和统计"""
+
+    def __init__(self, concurrency, delay):
+        self.concurrency = concurrency
+        self.delay = delay
+        self.latency = None
+        self.successes_since_increase = 0
+        self.last_decrease = 0.0
+        self.responses = 0
+        self.congestions = 0
+        self.timeouts = 0
+
+
+class AdaptiveThrottleMiddleware:
+    """AIMD自适应并发与延迟控制下载中间件，指标导出到crawler stats"""
+
+    def __init__(self, crawler):
+        settings = crawler.settings
+        if not settings.getbool('ADAPTIVE_THROTTLE_ENABLED'):
+            raise NotConfigured
+        self.crawler = crawler
+        self.logger = logging.getLogger(__name__)
+        self.min_concurrency = settings.getint('ADAPTIVE_THROTTLE_MIN_CONCURRENCY', 1)
+        self.max_concurrency = settings.getint('ADAPTIVE_THROTTLE_MAX_CONCURRENCY',
+                                               settings.getint('CONCURRENT_REQUESTS_PER_DOMAIN'))
+        self.start_concurrency = settings.getint('ADAPTIVE_THROTTLE_START_CONCURRENCY', 2)
+        self.min_delay = settings.getfloat('ADAPTIVE_THROTTLE_MIN_DELAY', 0.0)
+        self.max_delay = settings.getfloat('ADAPTIVE_THROTTLE_MAX_DELAY', 30.0)
+        self.delay_step = settings.getfloat('ADAPTIVE_THROTTLE_DELAY_STEP', 0.1)
+        self.target_latency = settings.getfloat('ADAPTIVE_THROTTLE_TARGET_LATENCY', 2.0)
+        self.decrease_factor = settings.getfloat('ADAPTIVE_THROTTLE_DECREASE_FACTOR', 0.5)
+        self.per_proxy = settings.getbool('ADAPTIVE_THROTTLE_PER_PROXY', False)
+        self.states = {}
+
+        crawler.signals.connect(self.spider_closed, signals.spider_closed)
+
+    @classmethod
+    def from_crawler(cls, crawler):
+        return cls(crawler)
+
+    def process_request(self, request, spider):
+        """按代理拆分slot时，同一域名下每个代理使用独立的并发和延迟"""
+        proxy = request.meta.get('kdl_proxy')
+        if self.per_proxy and proxy and 'download_slot' not in request.meta:
+            request.meta['download_slot'] = f"{urlparse_cached(request).hostname}@{proxy}"
+        return None
+
+    def process_response(self, request, response, spider):
+        key, slot, state = self._slot(request, spider)
+        if state is None:
+            return response
+        state.responses += 1
+        latency = request.meta.get('download_latency')
+        if latency is not None:
+            state.latency = latency if state.latency is None else 0.3 * latency + 0.7 * state.latency
+
+        if response.status in CONGESTION_CODES:
+            state.congestions += 1
+            self._decrease(key, state, self._retry_after(response))
+        elif latency is not None and latency > 2 * self.target_latency:
+            self._decrease(key, state)
+        elif latency is None or latency <= self.target_latency:
+            self._increase(state)
+        self._apply(key, slot, state)
+        return response
+
+    def process_exception(self, request, exception, spider):
+        if isinstance(exception, (TimeoutError, TCPTimedOutError)):
+            key, slot, state = self._slot(request, spider)
+            if state is not None:
+                state.timeouts += 1
+                self._decrease(key, state)
+                self._apply(key, slot, state)
+        return None
+
+    def _slot(self, request, spider):
+        downloader = self.crawler.engine.downloader
+        if hasattr(downloader, 'get_slot_key'):
+            key = downloader.get_slot_key(request)
+        else:
+            # 旧版本Scrapy只有私有方法，且需要spider参数
+            key = downloader._get_slot_key(request, spider)
+        slot = downloader.slots.get(key)
+        if slot is None:
+            return key, None, None
+        state = self.states.get(key)
+        if state is None:
+            state = self.states[key] = SlotState(
+                min(self.start_concurrency, self.max_concurrency), slot.delay
+            )
+        return key, slot, state
+
+    def _increase(self, state):
+        """加性增加：大约每一轮（concurrency个成功响应）并发数加1、延迟减少一步"""
+        state.successes_since_increase += 1
+        if state.successes_since_increase < state.concurrency:
+            return
+        state.successes_since_increase = 0
+        state.concurrency = min(state.concurrency + 1, self.max_concurrency)
+        state.delay = max(state.delay - self.delay_step, self.min_delay)
+
+    def _decrease(self, key, state, retry_after=None):
+        """乘性减小；同一批在途请求引发的多次信号只减一次"""
+        now = time.monotonic()
+        if now - state.last_decrease < max(state.latency or 0, 1.0):
+            return
+        state.last_decrease = now
+        state.successes_since_increase = 0
+        state.concurrency = max(int(state.concurrency * self.decrease_factor), self.min_concurrency)
+        state.delay = min(max(state.delay * 2, self.delay_step, retry_after or 0), self.max_delay)
+        self.logger.info(f"slot {key} 降速: 并发 {state.concurrency}, 延迟 {state.delay:.2f}s")
+
+    @staticmethod
+    def _retry_after(response):
+        value = response.headers.get('Retry-After')
+        try:
+            return float(value) if value else None
+        except ValueError:
+            return None
+
+    def _apply(self, key, slot, state):
+        slot.concurrency = state.concurrency
+        slot.delay = state.delay
+        stats = self.crawler.stats
+        stats.set_value(f'adaptive_throttle/{key}/concurrency', state.concurrency)
+        stats.set_value(f'adaptive_throttle/{key}/delay', round(state.delay, 3))
+        if state.latency is not None:
+            stats.set_value(f'adaptive_throttle/{key}/latency', round(state.latency, 3))
+        stats.set_value(f'adaptive_throttle/{key}/responses', state.responses)
+        stats.set_value(f'adaptive_throttle/{key}/congestions', state.congestions)
+        stats.set_value(f'adaptive_throttle/{key}/timeouts', state.timeouts)
+
+    def spider_closed(self, spider):
+        for key, state in self.states.items():
+            self.logger.info(
+                f"slot {key}: 并发 {state.concurrency}, 延迟 {state.delay:.2f}s, "
+                f"响应 {state.responses}, 过载 {state.congestions}, 超时 {state.timeouts}"
+            )
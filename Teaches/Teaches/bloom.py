@@ -0,0 +1,126 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+"""
+基于Redis位图的可扩展布隆过滤器
+容量用满后追加一个容量更大、误判率更低的新过滤器，总体误判率不超过配置值；
+可按TTL轮换代次，每一代的内存占用固定，旧代次自动过期。
+
+检查、写入和计数在同一个Lua脚本中执行（EVALSHA），多个进程并发添加同一个值时只有一个返回“不存在”。
+脚本访问的键由前缀拼接得到，不支持Redis Cluster。
+"""
+
+import hashlib
+import time
+
+# Redis单个字符串最多2^32位
+MAX_FILTER_BITS = 2 ** 32
+
+# KEYS[1]: 当前代次的键前缀
+# ARGV: 容量, 误判率, 扩容倍数, 误判率收紧系数, TTL, h1, h2, 是否添加
+BLOOM_SCRIPT = """
+local prefix = KEYS[1]
+local capacity = tonumber(ARGV[1])
+local error_rate = tonumber(ARGV[2])
+local growth = tonumber(ARGV[3])
+local tightening = tonumber(ARGV[4])
+local ttl = tonumber(ARGV[5])
+local h1 = tonumber(ARGV[6])
+local h2 = tonumber(ARGV[7])
+local add = ARGV[8] == '1'
+local count_key = prefix .. ':count'
+local count = tonumber(redis.call('GET', count_key) or '0')
+
+local function params(index)
+    local cap = capacity * growth ^ index
+    local p = error_rate * (1 - tightening) * tightening ^ index
+    local bits = math.min(math.ceil(-cap * math.log(p) / math.log(2) ^ 2), %(max_bits)d)
+    local hashes = math.max(1, math.floor(bits / cap * math.log(2) + 0.5))
+    return bits, hashes
+end
+
+-- 根据已添加总数确定当前写入的过滤器序号
+local current, total = 0, capacity
+while count >= total do
+    current = current + 1
+    total = total + capacity * growth ^ current
+end
+
+for index = 0, current do
+    local bits, hashes = params(index)
+    local key = prefix .. ':' .. index
+    local found = true
+    for i = 0, hashes - 1 do
+        if redis.call('GETBIT', key, (h1 + i * h2) %% bits) == 0 then
+            found = false
+            break
+        end
+    end
+    if found then
+        return 1
+    end
+end
+if not add then
+    return 0
+end
+
+local bits, hashes = params(current)
+local key = prefix .. ':' .. current
+for i = 0, hashes - 1 do
+    redis.call('SETBIT', key, (h1 + i * h2) %% bits, 1)
+end
+redis.call('INCR', count_key)
+if ttl > 0 then
+    -- 保留到下一代结束，之后自动释放内存
+    redis.call('EXPIRE', key, ttl * 2)
+    redis.call('EXPIRE', count_key, ttl * 2)
+end
+return 0
+""" % {'max_bits': MAX_FILTER_BITS}
+
+
+class RedisBloomFilter:
+    """存储在Redis位图中的可扩展布隆过滤器，多个进程可共享同一个过滤器"""
+
+    def __init__(self, server, key, capacity=1000000, error_rate=0.001, ttl=0,
+                 growth=2, tightening=0.5):
+        if not 0 < error_rate < 1:
+            raise ValueError("error_rate必须在0和1之间")
+        self.server = server
+        self.key = key
+        self.capacity = capacity
+        self.error_rate = error_rate
+        self.ttl = ttl
+        self.growth = growth
+        self.tightening = tightening
+        self.script = server.register_script(BLOOM_SCRIPT)
+
+    def generation(self):
+        """当前代次：未设置TTL时始终为0，否则按TTL对时间分段"""
+        return int(time.time() // self.ttl) if self.ttl else 0
+
+    @staticmethod
+    def _hashes(value):
+        """双重哈希的两个32位种子，脚本中按(h1 + i * h2) % bits生成位偏移（在双精度整数范围内）"""
+        digest = hashlib.sha256(value.encode('utf-8')).digest()
+        return int.from_bytes(digest[:4], 'big'), int.from_bytes(digest[4:8], 'big') | 1
+
+    def _run(self, value, add):
+        h1, h2 = self._hashes(value)
+        return bool(self.script(
+            keys=[f"{self.key}:bloom:{self.generation()}"],
+            args=[self.capacity, repr(self.error_rate), self.growth, repr(self.tightening), self.ttl,
+                  h1, h2, 1 if add else 0]
+        ))
+
+    def add(self, value):
+        """添加value，返回添加前是否（可能）已存在"""
+        return self._run(value, add=True)
+
+    def __contains__(self, value):
+        return self._run(value, add=False)
+
+    def clear(self):
+        """删除所有代次的过滤器"""
+        keys = list(self.server.scan_iter(match=f"{self.key}:bloom:*"))
+        if keys:
+            self.server.delete(*keys)
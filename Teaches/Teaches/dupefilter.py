@@ -0,0 +1,60 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+"""
+布隆过滤器去重
+替换scrapy_redis默认的RFPDupeFilter：默认实现把每个请求指纹存入Redis集合，
+大规模抓取时内存随请求数线性增长；这里改为存入Redis位图，内存只取决于容量和误判率。
+
+在settings.py中启用：
+    DUPEFILTER_CLASS = "Teaches.dupefilter.RedisBloomDupeFilter"
+    BLOOM_DUPEFILTER_CAPACITY = 1000000   # 单个过滤器的预计请求数，超出后自动扩容
+    BLOOM_DUPEFILTER_ERROR_RATE = 0.001   # 误判率（误判的请求会被当作重复而丢弃）
+    BLOOM_DUPEFILTER_TTL = 0              # 按秒轮换代次，0表示不轮换
+
+注意：调度器只对没有设置dont_filter的请求调用去重器。encu和faculty爬虫的请求目前都设置了
+dont_filter=True（列表页需要每次重新请求，详情页由增量模式的条件请求控制是否重新抓取），
+因此这两个爬虫暂不经过该去重器；新增需要跨请求去重的请求时不要设置dont_filter。
+"""
+
+from scrapy_redis.dupefilter import RFPDupeFilter
+from .bloom import RedisBloomFilter
+
+
+class RedisBloomDupeFilter(RFPDupeFilter):
+    """指纹存储在Redis位图布隆过滤器中的去重器，与RFPDupeFilter的构造方式兼容"""
+
+    capacity = 1000000
+    error_rate = 0.001
+    ttl = 0
+
+    @classmethod
+    def from_settings(cls, settings):
+        dupefilter = super().from_settings(settings)
+        dupefilter.configure(settings)
+        return dupefilter
+
+    @classmethod
+    def from_spider(cls, spider):
+        dupefilter = super().from_spider(spider)
+        dupefilter.configure(spider.settings)
+        return dupefilter
+
+    def configure(self, settings):
+        self.capacity = settings.getint('BLOOM_DUPEFILTER_CAPACITY', self.capacity)
+        self.error_rate = settings.getfloat('BLOOM_DUPEFILTER_ERROR_RATE', self.error_rate)
+        self.ttl = settings.getint('BLOOM_DUPEFILTER_TTL', self.ttl)
+        self._bloom = None
+
+    @property
+    def bloom(self):
+        if getattr(self, '_bloom', None) is None:
+            self._bloom = RedisBloomFilter(
+                self.server, self.key, capacity=self.capacity, error_rate=self.error_rate, ttl=self.ttl
+            )
+        return self._bloom
+
+    def request_seen(self, request):
+        return self.bloom.add(self.request_fingerprint(request))
+
+    def clear(self):
+        self.bloom.clear()
@@ -0,0 +1,78 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+"""
+声明式提取规则模块
+每个字段配置一组按顺序尝试的XPath/CSS规则，规则在创建时预编译一次；
+按页面模板记住上次成功的规则并优先尝试，同时报告每个字段命中的规则。
+"""
+
+from lxml import etree
+from parsel.csstranslator import css2xpath
+
+
+class ExtractionRule:
+    """单条提取规则，mode为first时取第一个非空文本，为join时合并所有文本"""
+
+    def __init__(self, name, xpath=None, css=None, mode='first'):
+        if (xpath is None) == (css is None):
+            raise ValueError(f"规则 {name} 需要且只能指定xpath或css之一")
+        self.name = name
+        self.mode = mode
+        self.expression = xpath if xpath is not None else css2xpath(css)
+        self.compiled = etree.XPath(self.expression)
+
+    @classmethod
+    def from_dict(cls, config):
+        return cls(config['name'], xpath=config.get('xpath'), css=config.get('css'),
+                   mode=config.get('mode', 'first'))
+
+    def apply(self, root):
+        """对文档根节点执行规则，未提取到内容时返回None"""
+        results = self.compiled(root)
+        if not isinstance(results, list):
+            results = [results]
+        texts = [text.strip() for text in map(self._to_text, results) if text and text.strip()]
+        if not texts:
+            return None
+        return texts[0] if self.mode == 'first' else ' '.join(texts)
+
+    @staticmethod
+    def _to_text(result):
+        if isinstance(result, str):
+            return result
+        if isinstance(result, etree._Element):
+            return result.text_content() if hasattr(result, 'text_content') else ''.join(result.itertext())
+        return str(result)
+
+
+class ExtractionRules:
+    """一组字段的提取规则，按模板记住上次命中的规则"""
+
+    def __init__(self, fields):
+        # fields: 字段名 -> 规则列表（ExtractionRule或配置字典）
+        self.fields = {
+            field: [rule if isinstance(rule, ExtractionRule) else ExtractionRule.from_dict(rule) for rule in rules]
+            for field, rules in fields.items()
+        }
+        self.last_hit = {}
+
+    def _ordered(self, template, field):
+        rules = self.fields[field]
+        index = self.last_hit.get((template, field))
+        if not index:
+            return enumerate(rules)
+        return [(index, rules[index])] + [(i, rule) for i, rule in enumerate(rules) if i != index]
+
+    def extract(self, response, template=None):
+        """提取所有字段，返回(字段值, 字段命中的规则名)，未命中的字段值为空字符串、规则名为None"""
+        root = response.selector.root
+        values, hits = {}, {}
+        for field in self.fields:
+            values[field], hits[field] = '', None
+            for index, rule in self._ordered(template, field):
+                value = rule.apply(root)
+                if value:
+                    values[field], hits[field] = value, rule.name
+                    self.last_hit[(template, field)] = index
+                    break
+        return values, hits
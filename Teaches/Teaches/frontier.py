@@ -0,0 +1,97 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+"""
+基于Redis的分布式任务队列（带租约和确认）
+多个爬虫进程共享同一个队列：取任务时移入处理中列表并登记租约到期时间，
+处理中定期续约，处理完成后确认删除；进程崩溃未确认的任务在租约到期后被放回队列，由其他进程重新处理。
+任务可能被处理多于一次（至少一次语义），依赖管道的幂等upsert保证结果正确。
+被领取超过max_attempts次仍未完成的任务（例如每次都让进程崩溃或卡住的任务）移入死信列表，不再重试。
+"""
+
+import json
+import time
+import uuid
+
+
+class LeasedQueue:
+    """Redis租约队列：pending列表、processing列表和记录租约到期时间的有序集合"""
+
+    def __init__(self, server, key, lease_seconds=300, max_attempts=3):
+        self.server = server
+        self.lease_seconds = lease_seconds
+        self.max_attempts = max_attempts
+        self.pending_key = f"{key}:pending"
+        self.processing_key = f"{key}:processing"
+        self.leases_key = f"{key}:leases"
+        self.attempts_key = f"{key}:attempts"
+        self.dead_key = f"{key}:dead"
+        # 上一轮检查时已在processing中但还没有租约的任务
+        self._unleased = set()
+
+    def push(self, *tasks):
+        """添加任务，每个任务自动分配唯一id"""
+        raws = [json.dumps({'id': uuid.uuid4().hex, **task}, ensure_ascii=False, sort_keys=True) for task in tasks]
+        if raws:
+            self.server.lpush(self.pending_key, *raws)
+        return len(raws)
+
+    def lease(self):
+        """取出一个任务并登记租约，返回(原始数据, 任务)，队列为空时返回None；
+        超过最大尝试次数的任务直接移入死信列表"""
+        while True:
+            raw = self.server.rpoplpush(self.pending_key, self.processing_key)
+            if raw is None:
+                return None
+            self.server.zadd(self.leases_key, {raw: time.time() + self.lease_seconds})
+            if self.server.hincrby(self.attempts_key, raw, 1) <= self.max_attempts:
+                return raw, json.loads(raw)
+            self.dead_letter(raw)
+
+    def renew(self, raw):
+        """延长处理中任务的租约；返回False表示租约已过期、任务已被放回队列"""
+        return bool(self.server.zadd(
+            self.leases_key, {raw: time.time() + self.lease_seconds}, xx=True, ch=True
+        ))
+
+    def ack(self, raw):
+        """确认任务完成；返回False表示租约已过期、任务已被放回队列"""
+        removed = self.server.lrem(self.processing_key, 1, raw)
+        self.server.zrem(self.leases_key, raw)
+        self.server.hdel(self.attempts_key, raw)
+        return bool(removed)
+
+    def dead_letter(self, raw):
+        """确认任务并移入死信列表，供人工排查"""
+        removed = self.ack(raw)
+        self.server.lpush(self.dead_key, raw)
+        return removed
+
+    def requeue_expired(self):
+        """将租约到期的任务放回队列，返回放回的任务数"""
+        now = time.time()
+        requeued = 0
+        unleased = set()
+        for raw in self.server.lrange(self.processing_key, 0, -1):
+            deadline = self.server.zscore(self.leases_key, raw)
+            if deadline is None and raw not in self._unleased:
+                # 可能是刚取出还没来得及登记租约，下一轮仍没有租约再放回
+                unleased.add(raw)
+                continue
+            if deadline is not None and deadline > now:
+                continue
+            # lrem是原子的，只有成功移除的一方负责放回，避免与ack或其他进程重复处理
+            if self.server.lrem(self.processing_key, 1, raw):
+                self.server.zrem(self.leases_key, raw)
+                self.server.rpush(self.pending_key, raw)
+                requeued += 1
+        self._unleased = unleased
+        return requeued
+
+    def pending_count(self):
+        return self.server.llen(self.pending_key)
+
+    def processing_count(self):
+        return self.server.llen(self.processing_key)
+
+    def dead_count(self):
+        return self.server.llen(self.dead_key)
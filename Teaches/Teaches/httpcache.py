@@ -0,0 +1,127 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+"""
+基于SQLite的HTTP缓存存储
+每个爬虫一个数据库文件，响应体压缩后存储（默认gzip，安装了zstandard时可选zstd），
+开启WAL和内存映射读取，重复运行和调试解析规则时可直接从本地缓存回放。
+
+请求meta中设置了dont_cache的请求由HttpCacheMiddleware跳过，不会读写缓存；
+配合RFC2616Policy时，缓存中保存的ETag/Last-Modified会用于发送条件请求，
+服务器返回304时直接使用缓存的响应。
+
+增量模式（-a incremental=1）下爬虫自己发送的条件请求会设置dont_cache，绕过缓存：
+否则缓存策略会用缓存中的校验信息替换爬虫的条件请求头、把304换成缓存的200或直接返回缓存副本，
+爬虫就无法跳过未修改的详情页。304是否跳过由爬虫决定，缓存只负责其余请求。
+"""
+
+import gzip
+import json
+import logging
+import os
+import sqlite3
+import time
+
+from scrapy.http import Headers
+from scrapy.responsetypes import responsetypes
+from scrapy.utils.project import data_path
+
+try:
+    import zstandard
+except ImportError:  # zstandard为可选依赖
+    zstandard = None
+
+logger = logging.getLogger(__name__)
+
+
+def compress(body, codec):
+    if codec == 'zstd':
+        return zstandard.ZstdCompressor().compress(body)
+    if codec == 'gzip':
+        return gzip.compress(body, compresslevel=6)
+    return body
+
+
+def decompress(data, codec):
+    if codec == 'zstd':
+        return zstandard.ZstdDecompressor().decompress(data)
+    if codec == 'gzip':
+        return gzip.decompress(data)
+    return data
+
+
+def dump_headers(headers):
+    return json.dumps({
+        key.decode('latin-1'): [value.decode('latin-1') for value in values]
+        for key, values in headers.items()
+    })
+
+
+def load_headers(data):
+    return Headers({key: [value.encode('latin-1') for value in values] for key, values in json.loads(data).items()})
+
+
+class SqliteCacheStorage:
+    """HTTPCACHE_STORAGE后端：响应按请求指纹存储在SQLite中"""
+
+    def __init__(self, settings):
+        self.cachedir = data_path(settings['HTTPCACHE_DIR'], createdir=True)
+        self.expiration_secs = settings.getint('HTTPCACHE_EXPIRATION_SECS')
+        self.codec = settings.get('HTTPCACHE_COMPRESSION', 'gzip')
+        if self.codec == 'zstd' and zstandard is None:
+            logger.warning("未安装zstandard，HTTP缓存改用gzip压缩")
+            self.codec = 'gzip'
+        self.mmap_size = settings.getint('HTTPCACHE_SQLITE_MMAP_SIZE', 256 * 1024 * 1024)
+        self.commit_every = settings.getint('HTTPCACHE_SQLITE_COMMIT_EVERY', 100)
+        self.db = None
+        self._pending = 0
+
+    def open_spider(self, spider):
+        self._fingerprinter = spider.crawler.request_fingerprinter
+        path = os.path.join(self.cachedir, f"{spider.name}.sqlite3")
+        self.db = sqlite3.connect(path)
+        self.db.execute('PRAGMA journal_mode=WAL')
+        self.db.execute('PRAGMA synchronous=NORMAL')
+        self.db.execute(f'PRAGMA mmap_size={self.mmap_size}')
+        self.db.execute(
+            'CREATE TABLE IF NOT EXISTS responses ('
+            'fingerprint TEXT PRIMARY KEY, url TEXT, status INTEGER, headers TEXT, '
+            'body BLOB, codec TEXT, timestamp REAL)'
+        )
+        self.db.commit()
+        logger.debug(f"HTTP缓存: {path}", extra={'spider': spider})
+
+    def close_spider(self, spider):
+        if self.db is not None:
+            self.db.commit()
+            self.db.close()
+            self.db = None
+
+    def retrieve_response(self, spider, request):
+        row = self.db.execute(
+            'SELECT url, status, headers, body, codec, timestamp FROM responses WHERE fingerprint = ?',
+            (self._fingerprint(request),)
+        ).fetchone()
+        if row is None:
+            return None
+        url, status, headers, body, codec, timestamp = row
+        if 0 < self.expiration_secs < time.time() - timestamp:
+            return None
+        headers = load_headers(headers)
+        body = decompress(body, codec)
+        respcls = responsetypes.from_args(headers=headers, url=url, body=body)
+        return respcls(url=url, headers=headers, status=status, body=body)
+
+    def store_response(self, spider, request, response):
+        self.db.execute(
+            'INSERT OR REPLACE INTO responses VALUES (?, ?, ?, ?, ?, ?, ?)',
+            (self._fingerprint(request), response.url, response.status, dump_headers(response.headers),
+             compress(response.body, self.codec), self.codec, time.time())
+        )
+        # 批量提交，避免每个响应都触发一次磁盘同步
+        self._pending += 1
+        if self._pending >= self.commit_every:
+            self.db.commit()
+            self._pending = 0
+
+    def _fingerprint(self, request):
+        return self._fingerprinter.fingerprint(request).hex()
@@ -17,4 +17,8 @@ class TeachesItem(scrapy.Item):
     url = scrapy.Field()
     email = scrapy.Field()
     resh_dict = scrapy.Field()
+    # 增量抓取使用：列表接口信息指纹和详情页条件请求校验信息
+    list_fingerprint = scrapy.Field()
+    http_etag = scrapy.Field()
+    http_last_modified = scrapy.Field()
 
@@ -90,8 +90,7 @@ class ProxyMiddleware:
 class KDLProxyMiddleware:
     """基于KDL API的高级代理中间件"""
     
-    def __init__(self):
-        from .proxy_extension import proxy_pool
+    def __init__(self, proxy_pool):
         self.proxy_pool = proxy_pool
         self.logger = logging.getLogger(__name__)
         
@@ -101,12 +100,20 @@ class KDLProxyMiddleware:
         
         # 是否使用用户名密码认证（私密代理/独享代理）
         self.use_auth = True  # 设置为False使用白名单认证
+        
+        # 视为代理失效的响应状态码
+        self.ban_codes = {403, 407, 429, 502, 503, 504}
+    
+    @classmethod
+    def from_crawler(cls, crawler):
+        """使用与ProxyExtension共享的本crawler代理池"""
+        from .proxy_extension import ProxyPool
+        return cls(ProxyPool.from_crawler(crawler))
     
     def process_request(self, request, spider):
-        """为每个请求随机选择代理"""
-        if self.proxy_pool.proxy_list:
-            proxy = random.choice(self.proxy_pool.proxy_list)
-            
+        """为每个请求按健康度选择代理，重试的请求避开之前失败的代理"""
+        proxy = self.proxy_pool.choose(exclude=request.meta.get('kdl_failed_proxies', ()))
+        if proxy:
             if self.use_auth:
                 # 用户名密码认证（私密代理/独享代理）
                 proxy_url = f"http://{self.username}:{self.password}@{proxy}/"
@@ -115,19 +122,38 @@ class KDLProxyMiddleware:
                 proxy_url = f"http://{proxy}/"
             
             request.meta['proxy'] = proxy_url
+            request.meta['kdl_proxy'] = proxy
             self.logger.info(f"使用KDL代理: {proxy}")
         else:
+            # 重试的请求会带着上次失败的代理，清除后才会直连，也不会再把结果记到该代理上
+            request.meta.pop('proxy', None)
+            request.meta.pop('kdl_proxy', None)
             self.logger.warning("代理池为空，使用直连")
         
         return None
     
+    def process_response(self, request, response, spider):
+        """根据响应状态记录代理健康度"""
+        proxy = request.meta.get('kdl_proxy')
+        if proxy:
+            if response.status in self.ban_codes:
+                self._mark_failed(request, proxy)
+            else:
+                self.proxy_pool.record_success(proxy, request.meta.get('download_latency'))
+        return response
+    
     def process_exception(self, request, exception, spider):
-        """代理失败时的处理"""
-        proxy = request.meta.get('proxy')
+        """代理失败时记录失败，交给RetryMiddleware换代理重试"""
+        proxy = request.meta.get('kdl_proxy')
         if proxy:
-            self.logger.warning(f"KDL代理请求失败: {exception}")
-            # 可以在这里实现代理失效处理逻辑，比如从池中移除失效代理
+            self.logger.warning(f"KDL代理 {proxy} 请求失败: {exception}")
+            self._mark_failed(request, proxy)
         return None
+    
+    def _mark_failed(self, request, proxy):
+        self.proxy_pool.record_failure(proxy)
+        # 重试请求会复制meta，这里总是新建列表，避免不同请求共享
+        request.meta['kdl_failed_proxies'] = [*request.meta.get('kdl_failed_proxies', ()), proxy]
 
 
 class UserAgentMiddleware:
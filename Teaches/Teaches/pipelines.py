@@ -5,27 +5,163 @@
 
 
 # useful for handling different item types with a single interface
+import hashlib
+import json
+from collections import defaultdict
+
 import pymongo
+from pymongo import UpdateOne
+from pymongo.errors import PyMongoError
+from twisted.internet import defer, task, threads
+
+
+FINGERPRINT_FIELD = 'fingerprint'
+
+
+def item_key(doc):
+    """记录的稳定主键：优先使用主页url，没有时使用学校+姓名"""
+    if doc.get('url'):
+        return {'url': doc['url']}
+    return {'school': doc.get('school'), 'name': doc.get('name')}
+
+
+def item_fingerprint(doc):
+    """内容指纹，用于判断重复抓取的记录是否有变化"""
+    content = {k: v for k, v in doc.items() if k not in ('_id', FINGERPRINT_FIELD)}
+    data = json.dumps(content, sort_keys=True, ensure_ascii=False, default=str)
+    return hashlib.sha1(data.encode('utf-8')).hexdigest()
+
 
 class MongoPipeline(object):
-    def __init__(self, mongo_uri, mongo_db):
+    """批量写入MongoDB：按条数或时间阈值攒批，在线程池中写入，不阻塞reactor
+
+    记录按item_key幂等upsert，内容指纹未变的记录不写入，有变化的只更新变化的字段。
+    """
+
+    def __init__(self, mongo_uri, mongo_db, batch_size=100, flush_interval=5.0, stats=None):
         self.mongo_uri = mongo_uri
         self.mongo_db = mongo_db
+        self.batch_size = batch_size
+        self.flush_interval = flush_interval
+        self.stats = stats
+        self.buffers = defaultdict(list)
+        self.pending = set()
+        # 每个集合最后一个写入批次的deferred
+        self.tails = {}
 
     @classmethod
     def from_crawler(cls, crawler):
         return cls(mongo_uri=crawler.settings.get('MONGO_URI'),
-            mongo_db=crawler.settings.get('MONGO_DB')
+            mongo_db=crawler.settings.get('MONGO_DB'),
+            batch_size=crawler.settings.getint('MONGO_BATCH_SIZE', 100),
+            flush_interval=crawler.settings.getfloat('MONGO_FLUSH_INTERVAL', 5.0),
+            stats=crawler.stats
         )
 
     def open_spider(self, spider):
+        self.spider = spider
         self.client = pymongo.MongoClient(self.mongo_uri)
         self.db = self.client[self.mongo_db]
+        # 定时写出未攒满的批次
+        self.flush_loop = task.LoopingCall(self.flush_all)
+        self.flush_loop.start(self.flush_interval, now=False)
 
     def process_item(self, item, spider):
         name = item.__class__.__name__
-        self.db[name].insert_one(dict(item))
-        return item
+        buffer = self.buffers[name]
+        buffer.append(dict(item))
+        if len(buffer) < self.batch_size:
+            return item
+        # 攒满一批的item等到写入完成才返回，引擎据此放慢抓取（背压）
+        d = self.flush(name)
+        d.addCallback(lambda _: item)
+        return d
+
+    def flush(self, name):
+        """将一个集合的缓冲区交给线程池写入
+
+        同一集合的批次依次写入：定时写出和攒满写出并发执行时，两个批次都查不到对方的记录，
+        会各自插入同一个item_key的记录。
+        """
+        batch, self.buffers[name] = self.buffers[name], []
+        if not batch:
+            return defer.succeed(None)
+        d = defer.Deferred()
+        d.addCallback(lambda _: threads.deferToThread(self.write_batch, name, batch))
+        d.addCallback(self.record_stats)
+        d.addErrback(self.log_write_error, name, len(batch))
+        self.pending.add(d)
+        d.addBoth(self._forget, d, name)
+        previous = self.tails.get(name)
+        self.tails[name] = d
+        if previous is None:
+            d.callback(None)
+        else:
+            previous.addBoth(self._start, d)
+        return d
+
+    def flush_all(self):
+        return defer.DeferredList([self.flush(name) for name in list(self.buffers)])
+
+    def write_batch(self, name, batch):
+        """在线程中执行的阻塞写入，返回(新增, 更新, 未变化)条数"""
+        # 同一批次内重复的记录只保留最后一条
+        docs = {}
+        for doc in batch:
+            doc[FINGERPRINT_FIELD] = item_fingerprint(doc)
+            key = item_key(doc)
+            docs[tuple(sorted(key.items()))] = (key, doc)
+
+        # 一次查询取出已存储的版本
+        existing = {}
+        query = {'$or': [key for key, _ in docs.values()]}
+        for stored in self.db[name].find(query):
+            for key in (item_key(stored), {'school': stored.get('school'), 'name': stored.get('name')}):
+                existing.setdefault(tuple(sorted(key.items())), stored)
+
+        operations = []
+        unchanged = inserted = 0
+        for key_tuple, (key, doc) in docs.items():
+            stored = existing.get(key_tuple)
+            if stored is None:
+                operations.append(UpdateOne(key, {'$set': doc}, upsert=True))
+                inserted += 1
+            elif stored.get(FINGERPRINT_FIELD) == doc[FINGERPRINT_FIELD]:
+                unchanged += 1
+            else:
+                changed = {k: v for k, v in doc.items() if stored.get(k) != v}
+                operations.append(UpdateOne({'_id': stored['_id']}, {'$set': changed}))
+
+        if operations:
+            self.db[name].bulk_write(operations, ordered=False)
+        return inserted, len(operations) - inserted, unchanged
+
+    def record_stats(self, counts):
+        if self.stats is None:
+            return
+        for stat, count in zip(('inserted', 'updated', 'unchanged'), counts):
+            self.stats.inc_value(f'mongo/{stat}', count)
+
+    def log_write_error(self, failure, name, count):
+        failure.trap(PyMongoError)
+        self.spider.logger.error(f"写入{name}失败（{count}条）: {failure.getErrorMessage()}")
+
+    def _start(self, result, d):
+        """上一批次写完（无论成功与否）后开始写入下一批次，上一批次的结果原样传递"""
+        d.callback(None)
+        return result
+
+    def _forget(self, result, d, name):
+        self.pending.discard(d)
+        if self.tails.get(name) is d:
+            del self.tails[name]
+        return result
 
+    @defer.inlineCallbacks
     def close_spider(self, spider):
+        if self.flush_loop.running:
+            self.flush_loop.stop()
+        # 写出剩余数据并等待所有写入完成后再关闭连接
+        self.flush_all()
+        yield defer.DeferredList(list(self.pending))
         self.client.close()
@@ -5,46 +5,137 @@
 基于KDL代理API的动态代理获取实现
 """
 
+import json
 import time
-import threading
-import requests
+import random
 import logging
 from scrapy import signals
+from twisted.internet import defer, task
+from twisted.web.client import Agent, readBody
 
 
-# 代理API配置 - 请替换为你的实际API信息
+# 代理API配置 - 请替换为你的实际API信息，也可通过PROXY_API_URL设置覆盖
 API_URL = 'https://dps.kdlapi.com/api/getdps/?secret_id=o8n0k8q1pyeqjf8dzvw1&signature=ofw1fvs1k4pxmekaz5cls41gfxr9b9xy&num=20&format=json&sep=1'
+API_TIMEOUT = 10
 
-# 全局控制变量
-proxy_refresh_running = True
+# 代理池为空且获取失败时使用的备用代理
+FALLBACK_PROXIES = [
+    '127.0.0.1:7890',
+]
+
+# 代理健康评分配置
+PROXY_LATENCY_ALPHA = 0.3  # 延迟EWMA的平滑系数
+PROXY_DEFAULT_LATENCY = 1.0  # 尚无延迟数据的代理按该延迟（秒）估算
+PROXY_MAX_CONSECUTIVE_FAILURES = 3  # 连续失败多少次后进入冷却
+PROXY_COOLDOWN = 60  # 首次冷却秒数，之后每次冷却时间翻倍
+PROXY_MAX_COOLDOWNS = 3  # 冷却次数达到该值后从池中移除
+
+
+class ProxyStats:
+    """单个代理的健康统计"""
+    
+    def __init__(self):
+        self.successes = 0
+        self.failures = 0
+        self.consecutive_failures = 0
+        self.latency = None
+        self.cooldowns = 0
+        self.cooldown_until = 0.0
+    
+    @property
+    def success_rate(self):
+        # 拉普拉斯平滑，新代理按50%估算
+        return (self.successes + 1) / (self.successes + self.failures + 2)
+    
+    @property
+    def weight(self):
+        latency = PROXY_DEFAULT_LATENCY if self.latency is None else self.latency
+        return self.success_rate / (latency + 0.1)
+    
+    def is_cooling_down(self, now):
+        return now < self.cooldown_until
+    
+    def record_success(self, latency):
+        self.successes += 1
+        self.consecutive_failures = 0
+        if latency is not None:
+            if self.latency is None:
+                self.latency = latency
+            else:
+                self.latency = PROXY_LATENCY_ALPHA * latency + (1 - PROXY_LATENCY_ALPHA) * self.latency
+    
+    def record_failure(self, now):
+        """记录一次失败，返回是否应当从池中移除"""
+        self.failures += 1
+        self.consecutive_failures += 1
+        if self.consecutive_failures < PROXY_MAX_CONSECUTIVE_FAILURES:
+            return False
+        self.consecutive_failures = 0
+        self.cooldowns += 1
+        self.cooldown_until = now + PROXY_COOLDOWN * 2 ** (self.cooldowns - 1)
+        return self.cooldowns >= PROXY_MAX_COOLDOWNS
 
 
 class ProxyPool:
-    """代理IP池类"""
+    """代理IP池类，按健康度加权选择代理，自动冷却和移除失效代理
+    
+    每个crawler一个实例（挂在crawler.proxy_pool上），同一进程中的多个爬虫互不影响；
+    所有方法都在reactor线程中调用，不需要加锁。
+    """
     
     def __init__(self):
         self.logger = logging.getLogger(__name__)
-        # 初始化时获取代理列表
-        self._proxy_list = self._fetch_proxy_list()
+        self._stats = {}
+        # 代理列表在爬虫启动后由ProxyExtension异步获取，获取到之前请求直连
+        self._proxy_list = []
+        self._agent = None
+        # 进行中的代理API请求，爬虫关闭时取消
+        self._pending = set()
+    
+    @classmethod
+    def from_crawler(cls, crawler):
+        """获取crawler的代理池，扩展和中间件共用同一个实例"""
+        pool = getattr(crawler, 'proxy_pool', None)
+        if pool is None:
+            pool = crawler.proxy_pool = cls()
+        return pool
+    
+    @staticmethod
+    def parse_proxy_list(body):
+        """解析代理API的响应"""
+        data = json.loads(body)
+        if data.get('code') != 0:
+            raise ValueError(data.get('msg', '未知错误'))
+        return data.get('data', {}).get('proxy_list', [])
+    
+    @defer.inlineCallbacks
+    def fetch_proxy_list(self, api_url=API_URL, timeout=API_TIMEOUT):
+        """在Twisted reactor上异步请求代理API"""
+        from twisted.internet import reactor
         
-    def _fetch_proxy_list(self):
-        """从API获取代理列表"""
-        try:
-            response = requests.get(API_URL, timeout=10)
-            data = response.json()
-            if data.get('code') == 0:  # 成功
-                proxy_list = data.get('data', {}).get('proxy_list', [])
-                self.logger.info(f"成功获取 {len(proxy_list)} 个代理IP")
-                return proxy_list
-            else:
-                self.logger.error(f"获取代理失败: {data.get('msg', '未知错误')}")
-                return []
-        except Exception as e:
-            self.logger.error(f"获取代理异常: {e}")
-            # 返回备用代理列表
-            return [
-                '127.0.0.1:7890',
-            ]
+        if self._agent is None:
+            self._agent = Agent(reactor, connectTimeout=timeout)
+        d = self._agent.request(b'GET', api_url.encode('utf-8'))
+        d.addTimeout(timeout, reactor)
+        response = yield self._track(d)
+        body = yield self._track(readBody(response))
+        proxy_list = self.parse_proxy_list(body)
+        self.logger.info(f"成功获取 {len(proxy_list)} 个代理IP")
+        return proxy_list
+    
+    def _track(self, d):
+        self._pending.add(d)
+        
+        def untrack(result):
+            self._pending.discard(d)
+            return result
+        
+        return d.addBoth(untrack)
+    
+    def cancel_pending(self):
+        """取消进行中的代理API请求"""
+        for d in list(self._pending):
+            d.cancel()
     
     @property
     def proxy_list(self):
@@ -53,29 +144,70 @@ class ProxyPool:
     
     @proxy_list.setter
     def proxy_list(self, proxy_list):
-        """设置代理列表"""
-        self._proxy_list = proxy_list
+        """设置代理列表，保留仍在列表中的代理的健康统计"""
+        self._proxy_list = list(proxy_list)
+        self._stats = {proxy: self._stats[proxy] for proxy in self._proxy_list if proxy in self._stats}
         self.logger.info(f"代理列表已更新，当前有 {len(proxy_list)} 个代理")
     
-    def refresh_proxy_list(self):
-        """刷新代理列表"""
-        new_list = self._fetch_proxy_list()
+    def _get_stats(self, proxy):
+        stats = self._stats.get(proxy)
+        if stats is None:
+            stats = self._stats[proxy] = ProxyStats()
+        return stats
+    
+    def choose(self, exclude=()):
+        """按健康度加权随机选择一个代理，跳过冷却中和exclude中的代理"""
+        now = time.monotonic()
+        candidates = [
+            proxy for proxy in self._proxy_list
+            if proxy not in exclude and not self._get_stats(proxy).is_cooling_down(now)
+        ]
+        if not candidates:
+            # 全部在冷却时退而使用未排除的代理
+            candidates = [proxy for proxy in self._proxy_list if proxy not in exclude] or self._proxy_list
+        if not candidates:
+            return None
+        weights = [self._get_stats(proxy).weight for proxy in candidates]
+        return random.choices(candidates, weights=weights)[0]
+    
+    def record_success(self, proxy, latency=None):
+        if proxy in self._proxy_list:
+            self._get_stats(proxy).record_success(latency)
+    
+    def record_failure(self, proxy):
+        if proxy not in self._proxy_list:
+            return
+        if self._get_stats(proxy).record_failure(time.monotonic()):
+            self._proxy_list = [p for p in self._proxy_list if p != proxy]
+            self._stats.pop(proxy, None)
+            self.logger.warning(f"代理 {proxy} 多次失败，已从池中移除，剩余 {len(self._proxy_list)} 个")
+    
+    @defer.inlineCallbacks
+    def refresh_proxy_list(self, api_url=API_URL):
+        """刷新代理列表：新列表完整获取后再整体替换，获取失败时保留当前列表"""
+        try:
+            new_list = yield self.fetch_proxy_list(api_url)
+        except defer.CancelledError:
+            # 爬虫关闭时取消的请求，不再更新列表
+            return len(self._proxy_list)
+        except Exception as e:
+            self.logger.error(f"获取代理异常: {e}")
+            new_list = [] if self._proxy_list else FALLBACK_PROXIES
         if new_list:
             self.proxy_list = new_list
         return len(self._proxy_list)
 
 
-# 全局代理池实例
-proxy_pool = ProxyPool()
-
-
 class ProxyExtension:
-    """代理扩展类 - 定期刷新代理IP池"""
+    """代理扩展类 - 在reactor上定期刷新代理IP池，随爬虫启动和停止"""
     
     def __init__(self, crawler):
         self.crawler = crawler
         self.logger = logging.getLogger(__name__)
         self.refresh_interval = crawler.settings.getint('PROXY_REFRESH_INTERVAL', 240)  # 默认60秒
+        self.api_url = crawler.settings.get('PROXY_API_URL', API_URL)
+        self.proxy_pool = ProxyPool.from_crawler(crawler)
+        self.refresh_loop = None
         
         # 绑定信号
         crawler.signals.connect(self.spider_opened, signals.spider_opened)
@@ -87,27 +219,19 @@ class ProxyExtension:
         return cls(crawler)
     
     def spider_opened(self, spider):
-        """爬虫开始时启动代理刷新线程"""
+        """爬虫开始时启动代理刷新任务"""
         self.logger.info("启动代理IP池刷新服务")
-        self.refresh_thread = threading.Thread(target=self._refresh_proxy_loop)
-        self.refresh_thread.daemon = True
-        self.refresh_thread.start()
+        self.refresh_loop = task.LoopingCall(self._refresh)
+        self.refresh_loop.start(self.refresh_interval, now=True)
     
     def spider_closed(self, spider):
         """爬虫关闭时停止代理刷新"""
-        global proxy_refresh_running
-        proxy_refresh_running = False
+        if self.refresh_loop is not None and self.refresh_loop.running:
+            self.refresh_loop.stop()
+        self.proxy_pool.cancel_pending()
         self.logger.info("代理IP池刷新服务已停止")
     
-    def _refresh_proxy_loop(self):
-        """代理刷新循环"""
-        global proxy_refresh_running
-        while proxy_refresh_running:
-            try:
-                count = proxy_pool.refresh_proxy_list()
-                self.logger.info(f"代理池已刷新，当前代理数量: {count}")
-            except Exception as e:
-                self.logger.error(f"刷新代理池时发生错误: {e}")
-            
-            # 等待指定时间后再次刷新
-            time.sleep(self.refresh_interval)
\ No newline at end of file
+    @defer.inlineCallbacks
+    def _refresh(self):
+        count = yield self.proxy_pool.refresh_proxy_list(self.api_url)
+        self.logger.info(f"代理池已刷新，当前代理数量: {count}")
@@ -0,0 +1,45 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+"""
+分布式任务调度器
+在scrapy_redis调度器的基础上，由任务队列（Teaches.frontier）领取的任务请求（meta中带frontier_task的
+预热页和列表页请求）保留在本进程内存中并优先调度，不进入共享的Redis请求队列：
+- 预热页获取的cookie保存在本进程的cookiejar中，列表页必须由同一个进程请求；
+- 任务请求不会排在共享队列中的大量详情页之后，租约不会因为排队而过期；
+- 进程崩溃时内存中的任务请求丢失，未确认的任务在租约到期后由任务队列放回，不需要Redis请求队列持久化。
+其余请求（详情页等）与scrapy_redis调度器相同，进入共享队列由同一批进程分担。
+
+在settings.py中启用：
+    SCHEDULER = "Teaches.scheduler.FrontierScheduler"
+"""
+
+from collections import deque
+
+from scrapy_redis.scheduler import Scheduler
+
+
+class FrontierScheduler(Scheduler):
+    """任务请求留在本进程的scrapy_redis调度器"""
+
+    def open(self, spider):
+        self.local = deque()
+        return super().open(spider)
+
+    def __len__(self):
+        return len(self.local) + super().__len__()
+
+    def enqueue_request(self, request):
+        if 'frontier_task' not in request.meta:
+            return super().enqueue_request(request)
+        # 任务请求都设置了dont_filter，不经过去重器
+        self.local.append(request)
+        if self.stats:
+            self.stats.inc_value('scheduler/enqueued/local', spider=self.spider)
+        return True
+
+    def next_request(self):
+        if self.local:
+            if self.stats:
+                self.stats.inc_value('scheduler/dequeued/local', spider=self.spider)
+            return self.local.popleft()
+        return super().next_request()
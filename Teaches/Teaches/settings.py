@@ -19,16 +19,36 @@ ITEM_PIPELINES = {
 }
 MONGO_URI='localhost:27017'
 MONGO_DB='pachong'
+MONGO_BATCH_SIZE = 100  # 攒够多少条item批量写入一次
+MONGO_FLUSH_INTERVAL = 5  # 未攒满的批次最多等待多少秒写入
 
 #配置scrapy-redis
-SCHEDULER = "scrapy_redis.scheduler.Scheduler"
-DUPEFILTER_CLASS = "scrapy_redis.dupefilter.RFPDupeFilter"
+#SCHEDULER = "scrapy_redis.scheduler.Scheduler"
+# scrapy_redis调度器，分布式模式下任务队列领取的预热页和列表页请求留在本进程
+SCHEDULER = "Teaches.scheduler.FrontierScheduler"
+#DUPEFILTER_CLASS = "scrapy_redis.dupefilter.RFPDupeFilter"
+# 指纹存入Redis位图布隆过滤器，内存不随请求数增长
+DUPEFILTER_CLASS = "Teaches.dupefilter.RedisBloomDupeFilter"
+BLOOM_DUPEFILTER_CAPACITY = 1000000  # 单个过滤器的预计请求数，超出后自动追加更大的过滤器
+BLOOM_DUPEFILTER_ERROR_RATE = 0.001  # 总误判率
+BLOOM_DUPEFILTER_TTL = 0  # 按秒轮换代次（到期后重新抓取），0表示不轮换
 #配置相关redis的URL和调度队列的选择
 REDIS_URL = 'redis://localhost:6379'
-SCHEDULER_QUEUE_CLASS = 'scrapy_redis.queue.FifoQueue'
+# 优先级队列（Redis有序集合）：列表页请求设置了priority，优先于详情页调度；FifoQueue会忽略priority。
+# 由FifoQueue切换过来时需先删除遗留的<spider>:requests列表，否则键类型不符
+SCHEDULER_QUEUE_CLASS = 'scrapy_redis.queue.PriorityQueue'
 #项目持久化(不自动清空指纹)
 SCHEDULER_PERSIST = True
 
+# 分布式任务队列（faculty爬虫 -a distributed=1 时使用）
+FRONTIER_KEY = '%(spider)s:%(profiles)s:frontier'  # profiles为加载的学校集合的摘要，不同集合使用不同队列
+# 分布式模式下的请求队列和去重器键同样按学校集合区分，覆盖SCHEDULER_QUEUE_KEY和SCHEDULER_DUPEFILTER_KEY
+FRONTIER_SCHEDULER_QUEUE_KEY = '%(spider)s:%(profiles)s:requests'
+FRONTIER_SCHEDULER_DUPEFILTER_KEY = '%(spider)s:%(profiles)s:dupefilter'
+FRONTIER_LEASE_SECONDS = 300  # 任务租约时长，处理中的任务定期续约，进程崩溃后未确认的任务在到期后放回队列
+FRONTIER_MAX_ATTEMPTS = 3  # 任务最多被领取的次数，超过后移入死信列表
+FRONTIER_BATCH_SIZE = 4  # 每次空闲时领取的任务数
+
 
 # Crawl responsibly by identifying yourself (and your website) on the user-agent
 #USER_AGENT = "Teaches (+http://www.yourdomain.com)"
@@ -72,14 +92,27 @@ DOWNLOADER_MIDDLEWARES = {
     # "Teaches.middlewares.ProxyMiddleware": 350,
     
     # KDL高级代理中间件（推荐使用）
-    "Teaches.middlewares.KDLProxyMiddleware": 350,
+    # 优先级高于RetryMiddleware(550)，使其先记录代理失败，重试时换用其他代理
+    "Teaches.middlewares.KDLProxyMiddleware": 560,
     
     "Teaches.middlewares.UserAgentMiddleware": 400,
     "Teaches.middlewares.TeachesDownloaderMiddleware": 543,
+    
+    # 自适应限速（需在KDL代理中间件之后，才能按代理拆分slot）
+    "Teaches.adaptive_throttle.AdaptiveThrottleMiddleware": 570,
 }
 
+# 自适应限速配置：按域名用AIMD调整并发和延迟，DOWNLOAD_DELAY为初始延迟
+ADAPTIVE_THROTTLE_ENABLED = True
+ADAPTIVE_THROTTLE_START_CONCURRENCY = 2
+ADAPTIVE_THROTTLE_MAX_CONCURRENCY = 16
+ADAPTIVE_THROTTLE_MAX_DELAY = 30
+ADAPTIVE_THROTTLE_TARGET_LATENCY = 2.0  # 延迟超过该值不再提速，超过两倍时降速
+ADAPTIVE_THROTTLE_PER_PROXY = False  # 为True时每个域名下每个代理单独调整
+
 # 代理池配置
 PROXY_REFRESH_INTERVAL = 60  # 代理刷新间隔（秒）
+# PROXY_API_URL = "http://127.0.0.1:8000/proxies"  # 覆盖代理API地址，例如指向本地测试服务
 
 # Enable or disable extensions
 # See https://docs.scrapy.org/en/latest/topics/extensions.html
@@ -114,6 +147,13 @@ EXTENSIONS = {
 #HTTPCACHE_DIR = "httpcache"
 #HTTPCACHE_IGNORE_HTTP_CODES = []
 #HTTPCACHE_STORAGE = "scrapy.extensions.httpcache.FilesystemCacheStorage"
+# 压缩存储在SQLite中（scrapy crawl faculty -s HTTPCACHE_ENABLED=1 开启）
+HTTPCACHE_STORAGE = "Teaches.httpcache.SqliteCacheStorage"
+HTTPCACHE_COMPRESSION = "gzip"  # gzip、zstd（需要安装zstandard）或none
+# 使用缓存中的ETag/Last-Modified发送条件请求，服务器返回304时使用缓存；
+# 增量模式下爬虫自带条件请求头的详情页请求设置了dont_cache，不经过缓存（304由爬虫跳过）；
+# 调试解析规则时可改为DummyPolicy，完全从缓存回放不访问网络
+HTTPCACHE_POLICY = "scrapy.extensions.httpcache.RFC2616Policy"
 
 # Set settings whose default value is deprecated to a future-proof value
 FEED_EXPORT_ENCODING = "utf-8"
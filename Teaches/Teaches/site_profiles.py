@@ -0,0 +1,132 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+"""
+学校站点配置加载模块
+每个学校一个配置文件（profiles目录下的JSON，安装了PyYAML时也支持YAML），主要字段：
+
+    name            配置名称，也用作cookiejar和提取规则的模板名
+    school          学校名称
+    school_level    学校层次
+    allowed_domains 允许抓取的域名列表
+    base_url        拼接详情页相对地址时使用的根地址
+    warmup_url      可选，开始前先访问以获取cookie的页面
+    page_headers    访问普通页面（预热页、详情页）使用的请求头
+    list            列表页配置：
+        url         列表地址，可包含{page}占位符
+        method      GET或POST，POST时formdata中的值同样可包含{page}
+        headers     列表请求头
+        format      json或html
+        items_path  json格式：教师列表在响应中的路径，用"."分隔
+        item_xpath  html格式：每位教师所在节点的XPath
+        fields      字段名 -> json键名（json格式）或相对XPath（html格式），需包含url
+        pagination  分页方式：
+            style=page_count  第一页返回总页数后一次性调度其余页，
+                              需要start和page_count_path（json）或page_count_xpath（html），
+                              可选page_count_regex从文本（如"共5页"）中提取页数，默认取第一个数字
+            style=next_link   按next_xpath提取下一页链接（仅GET）
+            style=none        只有一页
+    detail          详情页配置：rules为字段 -> 提取规则列表，格式见extraction.ExtractionRule
+"""
+
+import json
+import os
+import re
+
+try:
+    import yaml
+except ImportError:  # PyYAML为可选依赖
+    yaml = None
+
+
+PROFILE_DIR = os.path.join(os.path.dirname(__file__), 'profiles')
+PROFILE_EXTENSIONS = ('.json', '.yaml', '.yml')
+PAGINATION_STYLES = ('page_count', 'next_link', 'none')
+
+
+def load_profile(path):
+    with open(path, encoding='utf-8') as f:
+        if path.endswith('.json'):
+            return json.load(f)
+        if yaml is None:
+            raise RuntimeError(f"读取 {path} 需要安装PyYAML")
+        return yaml.safe_load(f)
+
+
+def load_profiles(directory=PROFILE_DIR, names=None):
+    """加载目录下的站点配置，names为空时加载全部"""
+    profiles = {}
+    for filename in sorted(os.listdir(directory)):
+        stem, ext = os.path.splitext(filename)
+        if ext not in PROFILE_EXTENSIONS or (ext != '.json' and yaml is None):
+            continue
+        path = os.path.join(directory, filename)
+        profile = load_profile(path)
+        profile.setdefault('name', stem)
+        validate_profile(profile, path)
+        profiles[profile['name']] = profile
+
+    if names:
+        missing = set(names) - set(profiles)
+        if missing:
+            raise ValueError(f"未找到站点配置: {', '.join(sorted(missing))}")
+        profiles = {name: profiles[name] for name in names}
+    return profiles
+
+
+def validate_profile(profile, source):
+    """检查站点配置的必填字段，缺失时给出明确的错误信息"""
+    errors = []
+    for key in ('school', 'school_level', 'list', 'detail'):
+        if key not in profile:
+            errors.append(f"缺少 {key}")
+
+    list_config = profile.get('list', {})
+    if 'url' not in list_config:
+        errors.append("缺少 list.url")
+    if 'url' not in list_config.get('fields', {}):
+        errors.append("list.fields 中缺少 url")
+    list_format = list_config.get('format', 'json')
+    if list_format == 'json' and 'items_path' not in list_config:
+        errors.append("json格式缺少 list.items_path")
+    elif list_format == 'html' and 'item_xpath' not in list_config:
+        errors.append("html格式缺少 list.item_xpath")
+    elif list_format not in ('json', 'html'):
+        errors.append(f"不支持的 list.format: {list_format}")
+
+    pagination = list_config.get('pagination', {})
+    style = pagination.get('style', 'none')
+    if style not in PAGINATION_STYLES:
+        errors.append(f"不支持的 list.pagination.style: {style}")
+    elif style == 'page_count':
+        count_key = 'page_count_path' if list_format == 'json' else 'page_count_xpath'
+        if count_key not in pagination:
+            errors.append(f"page_count分页缺少 list.pagination.{count_key}")
+    elif style == 'next_link' and 'next_xpath' not in pagination:
+        errors.append("next_link分页缺少 list.pagination.next_xpath")
+
+    if 'detail' in profile and not profile['detail'].get('rules'):
+        errors.append("缺少 detail.rules")
+
+    if errors:
+        raise ValueError(f"站点配置 {source} 无效: {'; '.join(errors)}")
+
+
+def parse_page_count(value, regex=None):
+    """将总页数转换为整数，文本（如"共5页"）按regex提取，默认取第一个数字"""
+    if value is None:
+        return 0
+    if isinstance(value, int):
+        return value
+    match = re.search(regex or r'\d+', str(value))
+    if not match:
+        return 0
+    return int(match.group(1) if match.groups() else match.group(0))
+
+
+def resolve_path(data, path):
+    """按"a.b.c"形式的路径从JSON数据中取值"""
+    for key in path.split('.') if path else ():
+        if not isinstance(data, dict):
+            return None
+        data = data.get(key)
+    return data
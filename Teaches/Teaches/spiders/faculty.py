@@ -0,0 +1,370 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+"""
+通用教师爬虫
+按profiles目录中的站点配置抓取各学校教师信息，多个学校在同一进程中并发抓取，
+共享下载器的连接和并发控制。
+
+用法：
+    scrapy crawl faculty                    # 抓取全部已配置的学校
+    scrapy crawl faculty -a profiles=ecnu   # 只抓取指定学校，多个用逗号分隔
+    scrapy crawl faculty -a incremental=1   # 增量模式：列表信息未变化的教师
+                                            # 详情页带条件请求头访问（返回304时跳过）
+    scrapy crawl encu                       # 等价于 -a profiles=ecnu
+
+分布式模式（多个进程共享Redis中的任务队列，按学校和页码分片）：
+    scrapy crawl faculty -a distributed=1 -a seed=1   # 写入各学校第一页任务并开始抓取
+    scrapy crawl faculty -a distributed=1             # 其他进程只从队列中领取任务
+同一批进程需使用相同的 -a profiles，任务队列、请求队列和去重器按加载的学校集合区分，
+不同集合的进程互不领取对方的任务和请求。任务的预热页和列表页在领取任务的进程中请求（见Teaches.scheduler），
+详情页请求进入共享的请求队列由同一批进程分担；处理中的任务定期续约。
+处理时出错或多次领取仍未完成的任务移入死信列表（<队列键>:dead）。
+"""
+
+import scrapy
+import pymongo
+from scrapy import signals
+from scrapy.exceptions import DontCloseSpider
+from twisted.internet import task
+from ..extraction import ExtractionRules
+from ..frontier import LeasedQueue
+from ..items import TeachesItem
+from ..site_profiles import load_profiles, parse_page_count, resolve_path
+import hashlib
+import json
+from urllib.parse import urljoin
+
+# 分布式模式下按学校集合区分的scrapy_redis键（可在settings中用FRONTIER_<设置名>覆盖）
+SCHEDULER_KEYS = {
+    'SCHEDULER_QUEUE_KEY': '%(spider)s:%(profiles)s:requests',
+    'SCHEDULER_DUPEFILTER_KEY': '%(spider)s:%(profiles)s:dupefilter',
+}
+
+
+class FacultySpider(scrapy.Spider):
+    """站点配置驱动的通用教师爬虫"""
+    name = "faculty"
+
+    def __init__(self, profiles=None, distributed=False, seed=False, incremental=False, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.distributed = str(distributed).lower() in ('1', 'true', 'yes')
+        self.seed = str(seed).lower() in ('1', 'true', 'yes')
+        self.incremental = str(incremental).lower() in ('1', 'true', 'yes')
+        # 增量模式下已存储的教师：url -> 列表指纹和详情页条件请求头
+        self.known = {}
+        self.frontier = None
+        # 本进程已领取、尚未确认的任务，定期续约
+        self.in_flight = set()
+        self.warmed = set()
+        names = [name.strip() for name in profiles.split(',') if name.strip()] if profiles else None
+        self.profiles = load_profiles(names=names)
+        self.allowed_domains = sorted({
+            domain for profile in self.profiles.values() for domain in profile.get('allowed_domains', [])
+        })
+        # 每个站点的详情页提取规则只编译一次
+        self.extractors = {
+            name: ExtractionRules(profile['detail']['rules']) for name, profile in self.profiles.items()
+        }
+
+    @classmethod
+    def from_crawler(cls, crawler, *args, **kwargs):
+        spider = super().from_crawler(crawler, *args, **kwargs)
+        if spider.distributed:
+            spider.setup_frontier(crawler)
+        return spider
+
+    def setup_frontier(self, crawler):
+        """分布式模式：连接共享的Redis任务队列，空闲时领取任务，定期续约和回收过期租约"""
+        from scrapy_redis.connection import get_redis_from_settings
+
+        settings = crawler.settings
+        profiles = hashlib.sha1(','.join(sorted(self.profiles)).encode('utf-8')).hexdigest()[:12]
+        key = settings.get('FRONTIER_KEY', '%(spider)s:%(profiles)s:frontier') % {
+            'spider': self.name, 'profiles': profiles
+        }
+        # 请求队列和去重器也按学校集合区分，避免其他集合的进程取到本进程无法处理的请求。
+        # 调度器在爬虫创建之后才读取设置（Scrapy 2.11起from_crawler中可以修改设置）；
+        # scrapy_redis按%(spider)s格式化，这里保留该占位符
+        for setting, default in SCHEDULER_KEYS.items():
+            template = settings.get(f'FRONTIER_{setting}', default)
+            settings.set(setting, template % {'spider': '%(spider)s', 'profiles': profiles}, priority='spider')
+        self.frontier = LeasedQueue(
+            get_redis_from_settings(settings), key,
+            settings.getint('FRONTIER_LEASE_SECONDS', 300),
+            settings.getint('FRONTIER_MAX_ATTEMPTS', 3)
+        )
+        self.logger.info(f"任务队列: {key}（{', '.join(sorted(self.profiles))}）")
+        self.frontier_batch_size = settings.getint('FRONTIER_BATCH_SIZE', 4)
+        self.reaper = task.LoopingCall(self.requeue_expired)
+        crawler.signals.connect(self.schedule_tasks, signal=signals.spider_idle)
+        crawler.signals.connect(self.start_reaper, signal=signals.spider_opened)
+        crawler.signals.connect(self.stop_reaper, signal=signals.spider_closed)
+
+    def start_reaper(self, spider):
+        self.reaper.start(max(self.frontier.lease_seconds / 4, 1), now=True)
+
+    def stop_reaper(self, spider):
+        if self.reaper.running:
+            self.reaper.stop()
+
+    def requeue_expired(self):
+        """为本进程处理中的任务续约，并把其他进程租约过期的任务放回队列"""
+        for raw in list(self.in_flight):
+            if not self.frontier.renew(raw):
+                self.logger.warning(f"任务租约已过期，可能被其他进程重复处理: {raw}")
+                self.in_flight.discard(raw)
+        count = self.frontier.requeue_expired()
+        if count:
+            self.logger.warning(f"{count} 个任务租约过期，已放回队列")
+
+    def ack_task(self, raw):
+        self.in_flight.discard(raw)
+        self.frontier.ack(raw)
+
+    def dead_letter_task(self, raw):
+        self.in_flight.discard(raw)
+        self.crawler.stats.inc_value('frontier/dead_letter')
+        self.frontier.dead_letter(raw)
+
+    def schedule_tasks(self):
+        """爬虫空闲时从队列领取一批任务；队列中仍有任务或其他进程仍在处理时保持运行"""
+        for _ in range(self.frontier_batch_size):
+            leased = self.frontier.lease()
+            if leased is None:
+                break
+            raw, frontier_task = leased
+            if frontier_task.get('profile') not in self.profiles:
+                self.logger.error(f"任务的学校未在本进程加载，移入死信列表: {raw}")
+                self.dead_letter_task(raw)
+                continue
+            self.in_flight.add(raw)
+            self.crawler.engine.crawl(self.task_request(raw, frontier_task))
+        if self.frontier.pending_count() or self.frontier.processing_count():
+            raise DontCloseSpider
+
+    def task_request(self, raw, frontier_task):
+        """将队列任务转换为请求，本进程还没有该学校的cookie时先访问预热页"""
+        name = frontier_task['profile']
+        profile = self.profiles[name]
+        if profile.get('warmup_url') and name not in self.warmed:
+            return scrapy.Request(
+                url=profile['warmup_url'],
+                callback=self.start_task,
+                errback=self.task_failed,
+                headers=profile.get('page_headers'),
+                meta={'profile': name, 'cookiejar': name, 'dont_cache': True, 'frontier_task': raw},
+                dont_filter=True
+            )
+        request = self.list_request(name, frontier_task['page'], url=frontier_task.get('url'))
+        request.meta['frontier_task'] = raw
+        return request.replace(errback=self.task_failed)
+
+    def start_task(self, response):
+        raw = response.meta['frontier_task']
+        self.warmed.add(response.meta['profile'])
+        try:
+            yield self.task_request(raw, json.loads(raw))
+        except Exception as e:
+            self.logger.error(f"任务处理异常，移入死信列表: {raw}: {e!r}")
+            self.dead_letter_task(raw)
+
+    def task_failed(self, failure):
+        """下载失败（已经过重试）的任务移入死信列表，避免反复失败的页面占用队列"""
+        raw = failure.request.meta['frontier_task']
+        self.logger.error(f"任务失败: {raw}: {failure.getErrorMessage()}")
+        self.dead_letter_task(raw)
+
+    def load_known(self):
+        """读取已配置学校上次抓取保存的列表指纹和详情页校验信息"""
+        client = pymongo.MongoClient(self.settings.get('MONGO_URI'))
+        try:
+            collection = client[self.settings.get('MONGO_DB')][TeachesItem.__name__]
+            schools = sorted({profile['school'] for profile in self.profiles.values()})
+            projection = {'_id': 0, 'url': 1, 'list_fingerprint': 1, 'http_etag': 1, 'http_last_modified': 1}
+            for doc in collection.find({'school': {'$in': schools}}, projection):
+                if doc.get('url'):
+                    self.known[doc['url']] = doc
+        finally:
+            client.close()
+        self.logger.info(f"增量模式：已加载 {len(self.known)} 位教师的历史记录")
+
+    def detail_headers(self, name, url, fingerprint):
+        """返回详情页的请求头（增量模式下带条件请求头）；列表信息未变且没有校验信息时返回None表示跳过"""
+        headers = dict(self.profiles[name].get('page_headers') or {})
+        known = self.known.get(url)
+        if not self.incremental or not known or known.get('list_fingerprint') != fingerprint:
+            return headers
+        if not known.get('http_etag') and not known.get('http_last_modified'):
+            return None
+        if known.get('http_etag'):
+            headers['If-None-Match'] = known['http_etag']
+        if known.get('http_last_modified'):
+            headers['If-Modified-Since'] = known['http_last_modified']
+        return headers
+
+    def start_requests(self):
+        if self.incremental:
+            self.load_known()
+        if self.distributed:
+            # 分布式模式下请求全部来自任务队列，seed进程负责写入各学校第一页
+            if self.seed:
+                count = self.frontier.push(*(
+                    {'profile': name, 'page': self.first_page(profile)} for name, profile in self.profiles.items()
+                ))
+                self.logger.info(f"已写入 {count} 个学校的首页任务")
+            return
+        for name, profile in self.profiles.items():
+            if profile.get('warmup_url'):
+                # 先访问预热页获取cookie，每个站点使用独立的cookiejar
+                yield scrapy.Request(
+                    url=profile['warmup_url'],
+                    callback=self.start_listing,
+                    headers=profile.get('page_headers'),
+                    meta={'profile': name, 'cookiejar': name, 'dont_cache': True},
+                    dont_filter=True
+                )
+            else:
+                yield self.list_request(name, self.first_page(profile))
+
+    def start_listing(self, response):
+        name = response.meta['profile']
+        self.logger.info(f"[{name}] 已访问预热页，开始请求列表")
+        yield self.list_request(name, self.first_page(self.profiles[name]))
+
+    @staticmethod
+    def first_page(profile):
+        return profile['list'].get('pagination', {}).get('start', 1)
+
+    def list_request(self, name, page_index, url=None):
+        """构造列表第page_index页的请求"""
+        list_config = self.profiles[name]['list']
+        url = url or list_config['url'].replace('{page}', str(page_index))
+        kwargs = dict(
+            url=url,
+            headers=list_config.get('headers'),
+            callback=self.parse_list,
+            meta={'profile': name, 'page_index': page_index, 'cookiejar': name},
+            priority=10,
+            dont_filter=True
+        )
+        if list_config.get('method', 'GET').upper() == 'POST':
+            formdata = {
+                key: str(value).replace('{page}', str(page_index))
+                for key, value in list_config.get('formdata', {}).items()
+            }
+            return scrapy.FormRequest(formdata=formdata, **kwargs)
+        return scrapy.Request(**kwargs)
+
+    def parse_list(self, response):
+        """解析列表页；分布式模式下处理完成后确认任务，处理出错时移入死信列表"""
+        raw = response.meta.get('frontier_task')
+        if raw is None:
+            yield from self.parse_list_page(response)
+            return
+        try:
+            yield from self.parse_list_page(response)
+        except Exception as e:
+            self.logger.error(f"任务处理异常，移入死信列表: {raw}: {e!r}")
+            self.dead_letter_task(raw)
+        else:
+            # 列表页处理完成（详情页请求已进入共享调度队列）后确认任务
+            self.ack_task(raw)
+
+    def parse_list_page(self, response):
+        name = response.meta['profile']
+        profile = self.profiles[name]
+        list_config = profile['list']
+        pagination = list_config.get('pagination', {'style': 'none'})
+
+        if list_config.get('format', 'json') == 'json':
+            try:
+                data = json.loads(response.text)
+            except json.JSONDecodeError:
+                self.logger.error(f"[{name}] JSON解析失败: {response.text[:200]}")
+                if 'frontier_task' in response.meta:
+                    raise
+                return
+            rows = [
+                {field: row.get(key, '') for field, key in list_config['fields'].items()}
+                for row in resolve_path(data, list_config['items_path']) or []
+            ]
+            page_count = resolve_path(data, pagination.get('page_count_path', ''))
+        else:
+            rows = [
+                {field: (node.xpath(xpath).get() or '').strip() for field, xpath in list_config['fields'].items()}
+                for node in response.xpath(list_config['item_xpath'])
+            ]
+            page_count = response.xpath(pagination['page_count_xpath']).get() if 'page_count_xpath' in pagination else None
+
+        for row in rows:
+            if not row.get('url'):
+                continue
+            fingerprint = hashlib.sha1(
+                json.dumps(row, sort_keys=True, ensure_ascii=False).encode('utf-8')
+            ).hexdigest()
+            headers = self.detail_headers(name, row['url'], fingerprint)
+            if headers is None:
+                self.crawler.stats.inc_value('incremental/skipped')
+                continue
+            basic_info = {
+                'school_level': profile['school_level'],
+                'school': profile['school'],
+                'name': row.get('name', ''),
+                'title': row.get('title', ''),
+                'school_college': row.get('school_college', ''),
+                'url': row['url'],
+                'list_fingerprint': fingerprint
+            }
+            yield scrapy.Request(
+                url=urljoin(profile.get('base_url') or response.url, row['url']),
+                callback=self.parse_detail,
+                headers=headers,
+                meta={
+                    'profile': name, 'basic_info': basic_info, 'cookiejar': name, 'handle_httpstatus_list': [304],
+                    # 带条件请求头的请求不经过HTTP缓存，304由parse_detail处理
+                    'dont_cache': 'If-None-Match' in headers or 'If-Modified-Since' in headers
+                },
+                dont_filter=True
+            )
+
+        # 分页处理
+        style = pagination.get('style', 'none')
+        if style == 'page_count' and response.meta['page_index'] == self.first_page(profile):
+            # 第一页返回后并发调度其余所有页；分布式模式下写入任务队列由各进程分担
+            page_count = parse_page_count(page_count, pagination.get('page_count_regex'))
+            pages = range(self.first_page(profile) + 1, page_count + 1)
+            if self.frontier is not None:
+                self.frontier.push(*({'profile': name, 'page': page_index} for page_index in pages))
+            else:
+                for page_index in pages:
+                    yield self.list_request(name, page_index)
+        elif style == 'next_link':
+            next_url = response.xpath(pagination['next_xpath']).get()
+            if next_url:
+                page_index, next_url = response.meta['page_index'] + 1, response.urljoin(next_url)
+                if self.frontier is not None:
+                    # 分布式模式下下一页也作为任务写入队列，与其他列表页一样由领取任务的进程先预热再请求
+                    self.frontier.push({'profile': name, 'page': page_index, 'url': next_url})
+                else:
+                    yield self.list_request(name, page_index, url=next_url)
+
+    def parse_detail(self, response):
+        """按站点配置的提取规则解析教师详情页面"""
+        name = response.meta['profile']
+        basic_info = response.meta['basic_info']
+
+        # 增量模式下详情页未修改
+        if response.status == 304:
+            self.crawler.stats.inc_value('incremental/not_modified')
+            return
+
+        teachesItem = TeachesItem(**basic_info)
+        teachesItem['http_etag'] = response.headers.get('ETag', b'').decode('latin-1')
+        teachesItem['http_last_modified'] = response.headers.get('Last-Modified', b'').decode('latin-1')
+
+        values, hits = self.extractors[name].extract(response, template=name)
+        for field, value in values.items():
+            teachesItem[field] = value
+            self.crawler.stats.inc_value(f'extraction/{name}/{field}/{hits[field] or "miss"}')
+
+        yield teachesItem
@@ -0,0 +1,101 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+"""
+分布式任务队列本地演示
+
+使用fakeredis在单机上模拟N个爬虫进程共享 Teaches.frontier.LeasedQueue：
+- 每个学校先写入第一页任务，处理第一页的进程再把其余页写入队列，由所有进程分担
+- 模拟一个进程领取任务后崩溃，验证租约到期后任务被放回队列并由其他进程完成
+- 模拟一个每次处理都会让进程崩溃的任务，验证超过最大尝试次数后移入死信列表，各进程正常退出
+- 模拟一个耗时超过租约时长的任务，验证处理中定期续约时不会被放回队列重复处理
+- 输出不同进程数下的耗时和加速比
+
+运行: python distributed_harness.py   （需要 pip install fakeredis）
+"""
+
+import threading
+import time
+
+import fakeredis
+
+from Teaches.frontier import LeasedQueue
+
+
+SCHOOLS = {'ecnu': 12, 'bupt': 10, 'fudan': 14, 'sjtu': 12}  # 学校 -> 列表页数
+PAGE_LATENCY = 0.05  # 模拟下载一页的耗时（秒）
+LEASE_SECONDS = 0.3
+
+
+def run_worker(server, processed, lock, crash=False, poison=None, slow=None):
+    """一个爬虫进程：领取任务、模拟抓取、第一页时分发其余页、确认任务；
+    领取到poison任务时模拟进程崩溃后重启（不确认任务），slow任务耗时两倍租约时长并定期续约"""
+    queue = LeasedQueue(fakeredis.FakeRedis(server=server), 'harness:frontier', LEASE_SECONDS)
+    while True:
+        queue.requeue_expired()
+        leased = queue.lease()
+        if leased is None:
+            if not queue.pending_count() and not queue.processing_count():
+                return
+            time.sleep(0.01)
+            continue
+        raw, task = leased
+        if crash:
+            # 领取任务后崩溃，既不处理也不确认
+            return
+        if (task['profile'], task['page']) == poison:
+            continue
+        if (task['profile'], task['page']) == slow:
+            for _ in range(8):
+                time.sleep(LEASE_SECONDS / 4)
+                queue.renew(raw)
+        time.sleep(PAGE_LATENCY)
+        if task['page'] == 1:
+            queue.push(*({'profile': task['profile'], 'page': page}
+                         for page in range(2, SCHOOLS[task['profile']] + 1)))
+        with lock:
+            processed.append((task['profile'], task['page']))
+        queue.ack(raw)
+
+
+def run(workers, crash=False, poison=None, slow=None):
+    server = fakeredis.FakeServer()
+    LeasedQueue(fakeredis.FakeRedis(server=server), 'harness:frontier', LEASE_SECONDS).push(
+        *({'profile': name, 'page': 1} for name in SCHOOLS)
+    )
+    processed, lock = [], threading.Lock()
+    threads = [threading.Thread(target=run_worker, args=(server, processed, lock, False, poison, slow)) for _ in range(workers)]
+    if crash:
+        threads.insert(0, threading.Thread(target=run_worker, args=(server, processed, lock, True)))
+
+    start = time.monotonic()
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    elapsed = time.monotonic() - start
+
+    expected = {(name, page) for name, pages in SCHOOLS.items() for page in range(1, pages + 1)} - {poison}
+    assert set(processed) == expected, "有任务未被处理"
+    dead = LeasedQueue(fakeredis.FakeRedis(server=server), 'harness:frontier').dead_count()
+    assert dead == (1 if poison else 0), "死信列表与预期不符"
+    return elapsed, len(processed) - len(expected)
+
+
+if __name__ == '__main__':
+    total_pages = sum(SCHOOLS.values())
+    print(f"{len(SCHOOLS)} 个学校，共 {total_pages} 页，每页模拟耗时 {PAGE_LATENCY}s")
+    baseline = None
+    for workers in (1, 2, 4, 8):
+        elapsed, duplicates = run(workers)
+        baseline = baseline or elapsed
+        print(f"{workers} 个进程: 耗时 {elapsed:.2f}s, 加速比 {baseline / elapsed:.2f}, 重复处理 {duplicates} 页")
+
+    elapsed, duplicates = run(4, crash=True)
+    print(f"4 个进程 + 1 个崩溃进程: 耗时 {elapsed:.2f}s, 全部页面完成, 重复处理 {duplicates} 页")
+
+    elapsed, duplicates = run(4, poison=('bupt', 3))
+    print(f"4 个进程 + 1 个毒任务: 耗时 {elapsed:.2f}s, 毒任务已移入死信列表, 其余页面完成")
+
+    elapsed, duplicates = run(4, slow=('fudan', 5))
+    assert duplicates == 0, "续约中的任务被重复处理"
+    print(f"4 个进程 + 1 个超过租约时长的任务: 耗时 {elapsed:.2f}s, 续约后未被放回队列, 重复处理 {duplicates} 页")
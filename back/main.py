@@ -1,15 +1,34 @@
 from typing import Union
+import asyncio
+from contextlib import asynccontextmanager
 from fastapi import FastAPI
 import uvicorn
 from typing import Union
 
 from fastapi.middleware.cors import CORSMiddleware
+from server.database import db_manager, ensure_all_indexes
+from server.services.search_service import teacher_search_index
+from server.services.email_queue import email_queue
+from server.services.smtp_pool import smtp_pool
 from server.routes.student import router as StudentRouter
 from server.routes.teacher import router as TeacherRouter
 from server.routes.smtp import router as SMTPRouter
 from server.routes.file import router as FileRouter
 
-app = FastAPI()
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    # 启动时创建/校对各集合声明的索引
+    await ensure_all_indexes()
+    # 检索索引在后台构建（失败重试、定期重建），不阻塞服务启动
+    app.state.search_index_task = asyncio.create_task(teacher_search_index.run())
+    email_queue.start()
+    yield
+    await email_queue.stop()
+    smtp_pool.close_all()
+    app.state.search_index_task.cancel()
+    await db_manager.close_connection()
+
+app = FastAPI(lifespan=lifespan)
 
 origins = [
     "http://localhost:5173",
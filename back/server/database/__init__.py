@@ -2,11 +2,15 @@ from .connection import db_manager
 from .student_collection import student_collection
 from .teacher_collection import teacher_collection
 from .smtp_collection import smtp_config_collection, email_log_collection
+from .email_job_collection import email_job_collection
+from .indexes import ensure_all_indexes
 
 __all__ = [
     "db_manager",
     "student_collection", 
     "teacher_collection",
     "smtp_config_collection",
-    "email_log_collection"
+    "email_log_collection",
+    "email_job_collection",
+    "ensure_all_indexes"
 ]
\ No newline at end of file
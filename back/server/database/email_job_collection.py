@@ -0,0 +1,113 @@
+from bson.objectid import ObjectId
+from datetime import datetime, timedelta
+from pymongo import ASCENDING, IndexModel, ReturnDocument
+from typing import Optional
+from .connection import db_manager
+
+class EmailJobCollection:
+    """邮件发送任务队列数据库操作类"""
+    indexes = [
+        IndexModel([("status", ASCENDING), ("created_at", ASCENDING)], name="status_1_created_at_1"),
+        IndexModel([("status", ASCENDING), ("lease_until", ASCENDING)], name="status_1_lease_until_1"),
+    ]
+
+    def __init__(self):
+        self.collection = db_manager.database.get_collection("email_jobs")
+
+    def email_job_helper(self, job) -> dict:
+        """将MongoDB文档转换为字典格式"""
+        return {
+            "id": str(job["_id"]),
+            "kind": job["kind"],
+            "status": job["status"],
+            "attempts": job.get("attempts", 0),
+            "delivered_count": len(job.get("delivered", [])),
+            "created_at": job["created_at"],
+            "started_at": job.get("started_at"),
+            "finished_at": job.get("finished_at"),
+            "result": job.get("result"),
+            "error_message": job.get("error_message")
+        }
+
+    async def add_job(self, kind: str, payload: dict) -> dict:
+        """添加待发送任务"""
+        job_data = {
+            "kind": kind,
+            "payload": payload,
+            "status": "queued",
+            "attempts": 0,
+            "created_at": datetime.utcnow()
+        }
+        await self.collection.insert_one(job_data)
+        return self.email_job_helper(job_data)
+
+    async def claim_next(self, worker_id: str, lease_seconds: int) -> Optional[dict]:
+        """领取最早的待发送任务；租约过期的运行中任务（工作者崩溃）会被重新领取"""
+        now = datetime.utcnow()
+        job = await self.collection.find_one_and_update(
+            {"$or": [
+                {"status": "queued"},
+                {"status": "running", "lease_until": {"$lt": now}}
+            ]},
+            {
+                "$set": {
+                    "status": "running",
+                    "worker_id": worker_id,
+                    "started_at": now,
+                    "lease_until": now + timedelta(seconds=lease_seconds)
+                },
+                "$inc": {"attempts": 1}
+            },
+            sort=[("created_at", ASCENDING)],
+            return_document=ReturnDocument.AFTER
+        )
+        return job
+
+    async def renew_lease(self, job_id, worker_id: str, lease_seconds: int) -> bool:
+        """延长任务租约；返回False表示租约已丢失（任务已被其他工作者领取或已结束）"""
+        result = await self.collection.update_one(
+            {"_id": ObjectId(job_id), "worker_id": worker_id, "status": "running"},
+            {"$set": {"lease_until": datetime.utcnow() + timedelta(seconds=lease_seconds)}}
+        )
+        return result.matched_count > 0
+
+    async def mark_delivered(self, job_id, worker_id: str, recipient_id: str) -> bool:
+        """记录任务中已成功发送的收件人，重试或被重新领取时跳过；返回False表示租约已丢失"""
+        result = await self.collection.update_one(
+            {"_id": ObjectId(job_id), "worker_id": worker_id, "status": "running"},
+            {"$addToSet": {"delivered": recipient_id}}
+        )
+        return result.matched_count > 0
+
+    async def finish_job(self, job_id, worker_id: str, status: str, result: Optional[dict] = None,
+                         error_message: Optional[str] = None) -> bool:
+        """标记任务完成或失败；返回False表示租约已丢失，结果未写入"""
+        result = await self.collection.update_one(
+            {"_id": ObjectId(job_id), "worker_id": worker_id, "status": "running"},
+            {"$set": {
+                "status": status,
+                "result": result,
+                "error_message": error_message,
+                "finished_at": datetime.utcnow()
+            }, "$unset": {"lease_until": ""}}
+        )
+        return result.matched_count > 0
+
+    async def retry_job(self, job_id, worker_id: str, error_message: str) -> bool:
+        """将任务放回队列等待重试；返回False表示租约已丢失"""
+        result = await self.collection.update_one(
+            {"_id": ObjectId(job_id), "worker_id": worker_id, "status": "running"},
+            {"$set": {"status": "queued", "error_message": error_message},
+             "$unset": {"lease_until": "", "worker_id": ""}}
+        )
+        return result.matched_count > 0
+
+    async def get_job(self, job_id: str) -> Optional[dict]:
+        """根据ID获取任务"""
+        job = await self.collection.find_one({"_id": ObjectId(job_id)})
+        if job:
+            return self.email_job_helper(job)
+        return None
+
+# 全局实例
+email_job_collection = EmailJobCollection()
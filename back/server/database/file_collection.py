@@ -1,6 +1,8 @@
 import motor.motor_asyncio
 from bson.objectid import ObjectId
-from datetime import datetime
+from pymongo import ASCENDING, DESCENDING, IndexModel, ReturnDocument
+from pymongo.errors import DuplicateKeyError
+from datetime import datetime, timedelta
 from typing import Optional, List
 
 from .connection import DatabaseManager
@@ -9,8 +11,18 @@ database_manager = DatabaseManager()
 database = database_manager.database
 
 file_collection = database.get_collection("files")
+# 按SHA-256存储的文件内容及其引用计数，_id为哈希值
+blob_collection = database.get_collection("blobs")
+
+# 删除中的文件内容超过该时长（删除进程可能已崩溃）后可被新上传接管
+BLOB_DELETE_TIMEOUT = timedelta(seconds=60)
 
 class FileCollection:
+    indexes = [
+        IndexModel([("upload_time", DESCENDING)], name="upload_time_-1"),
+        IndexModel([("file_path", ASCENDING)], name="file_path_1"),
+    ]
+    
     @staticmethod
     async def add_file(file_data: dict) -> dict:
         """添加文件记录"""
@@ -31,18 +43,66 @@ class FileCollection:
     async def retrieve_files() -> List[dict]:
         """获取所有文件列表"""
         files = []
-        async for file in file_collection.find():
+        async for file in file_collection.find().sort("upload_time", -1):
             files.append(FileCollection.file_helper(file))
         return files
     
     @staticmethod
     async def delete_file(id: str) -> bool:
-        """删除文件记录"""
-        file = await file_collection.find_one({"_id": ObjectId(id)})
-        if file:
-            await file_collection.delete_one({"_id": ObjectId(id)})
+        """删除文件记录，并发删除同一记录时只有实际删除了记录的调用返回True"""
+        result = await file_collection.delete_one({"_id": ObjectId(id)})
+        return result.deleted_count == 1
+    
+    @staticmethod
+    async def count_references(file_path: str) -> int:
+        """统计引用同一磁盘文件的记录数"""
+        return await file_collection.count_documents({"file_path": file_path})
+    
+    @staticmethod
+    async def acquire_blob(digest: str) -> bool:
+        """增加文件内容的引用计数；内容正在被删除时返回False，调用方稍后重试"""
+        try:
+            await blob_collection.find_one_and_update(
+                {"_id": digest, "deleting": {"$ne": True}},
+                {"$inc": {"refs": 1}},
+                upsert=True,
+                return_document=ReturnDocument.AFTER
+            )
+            return True
+        except DuplicateKeyError:
+            # 文档存在但处于删除中；删除进程超时未完成时接管该内容
+            result = await blob_collection.update_one(
+                {"_id": digest, "deleting": True, "deleting_at": {"$lt": datetime.utcnow() - BLOB_DELETE_TIMEOUT}},
+                {"$set": {"refs": 1}, "$unset": {"deleting": "", "deleting_at": ""}}
+            )
+            return result.modified_count > 0
+    
+    @staticmethod
+    async def release_blob(digest: str, file_path: str) -> bool:
+        """减少引用计数；返回True表示已无引用且由调用方负责删除磁盘文件"""
+        blob = await blob_collection.find_one_and_update(
+            {"_id": digest},
+            {"$inc": {"refs": -1}},
+            return_document=ReturnDocument.AFTER
+        )
+        if blob is not None and blob["refs"] > 0:
+            return False
+        # 兼容没有引用计数的旧记录
+        if await FileCollection.count_references(file_path) > 0:
+            return False
+        if blob is None:
             return True
-        return False
+        # 条件更新：与并发上传的引用计数增加互斥，只有一方能成功
+        result = await blob_collection.update_one(
+            {"_id": digest, "refs": {"$lte": 0}, "deleting": {"$ne": True}},
+            {"$set": {"deleting": True, "deleting_at": datetime.utcnow()}}
+        )
+        return result.modified_count > 0
+    
+    @staticmethod
+    async def finish_blob_delete(digest: str):
+        """磁盘文件删除完成后删除引用计数文档，之后相同内容可重新上传"""
+        await blob_collection.delete_one({"_id": digest, "deleting": True})
     
     @staticmethod
     def file_helper(file) -> dict:
@@ -52,6 +112,7 @@ class FileCollection:
             "filename": file["filename"],
             "content_type": file["content_type"],
             "size": file["size"],
+            "sha256": file.get("sha256"),
             "upload_time": file["upload_time"],
             "file_path": file["file_path"]
         }
@@ -0,0 +1,83 @@
+import logging
+from typing import List
+
+from pymongo import IndexModel
+
+from .email_job_collection import EmailJobCollection, email_job_collection
+from .file_collection import FileCollection, file_collection
+from .smtp_collection import EmailLogCollection, email_log_collection
+from .teacher_collection import TeacherCollection, teacher_collection
+
+logger = logging.getLogger(__name__)
+
+# 参与索引一致性比较的选项
+INDEX_OPTIONS = ("unique", "sparse", "expireAfterSeconds", "partialFilterExpression")
+
+# 索引注册表：(集合对象, 该集合类声明的索引)
+INDEX_REGISTRY = [
+    (teacher_collection.collection, TeacherCollection.indexes),
+    (email_log_collection.collection, EmailLogCollection.indexes),
+    (file_collection, FileCollection.indexes),
+    (email_job_collection.collection, EmailJobCollection.indexes),
+]
+
+
+def _normalize_key(key) -> list:
+    """统一索引键格式，shell创建的索引方向可能是浮点数"""
+    return [
+        (field, int(direction) if isinstance(direction, (int, float)) else direction)
+        for field, direction in key
+    ]
+
+
+async def ensure_indexes(collection, indexes: List[IndexModel]) -> dict:
+    """创建集合中缺失的声明索引，并返回与声明不一致的索引"""
+    existing = await collection.index_information()
+    declared = set()
+    missing = []
+    drifted = []
+
+    for index in indexes:
+        spec = index.document
+        name = spec["name"]
+        declared.add(name)
+        current = existing.get(name)
+        if current is None:
+            missing.append(index)
+            continue
+
+        # 同名索引的键或选项与声明不同，视为漂移（不会自动删除重建）
+        if _normalize_key(current["key"]) != _normalize_key(spec["key"].items()) or any(
+            current.get(option) != spec.get(option) for option in INDEX_OPTIONS
+        ):
+            drifted.append(name)
+
+    created = await collection.create_indexes(missing) if missing else []
+    extra = [name for name in existing if name != "_id_" and name not in declared]
+
+    return {
+        "collection": collection.name,
+        "created": created,
+        "drifted": drifted,
+        "extra": extra,
+    }
+
+
+async def ensure_all_indexes() -> List[dict]:
+    """启动时按注册表校对所有集合的索引"""
+    reports = []
+    for collection, indexes in INDEX_REGISTRY:
+        try:
+            report = await ensure_indexes(collection, indexes)
+        except Exception as e:
+            logger.error(f"集合 {collection.name} 索引校对失败: {e}")
+            continue
+
+        if report["created"]:
+            logger.info(f"集合 {report['collection']} 新建索引: {', '.join(report['created'])}")
+        if report["drifted"]:
+            logger.warning(f"集合 {report['collection']} 索引与声明不一致: {', '.join(report['drifted'])}")
+        if report["extra"]:
+            logger.warning(f"集合 {report['collection']} 存在未声明的索引: {', '.join(report['extra'])}")
+        reports.append(report)
+    return reports
@@ -1,4 +1,5 @@
 from bson.objectid import ObjectId
+from pymongo import ASCENDING, DESCENDING, IndexModel
 from typing import List, Optional
 from datetime import datetime
 from .connection import db_manager
@@ -65,6 +66,13 @@ class SMTPConfigCollection:
 
 class EmailLogCollection:
     """邮件发送记录数据库操作类"""
+    indexes = [
+        IndexModel([("send_time", DESCENDING)], name="send_time_-1"),
+        IndexModel([("status", ASCENDING), ("send_time", DESCENDING)], name="status_1_send_time_-1"),
+        # to_emails为数组，此索引为多键索引
+        IndexModel([("to_emails", ASCENDING), ("send_time", DESCENDING)], name="to_emails_1_send_time_-1"),
+    ]
+    
     def __init__(self):
         self.collection = db_manager.database.get_collection("email_logs")
     
@@ -1,9 +1,29 @@
 from bson.objectid import ObjectId
-from typing import List, Optional
+from pymongo import ASCENDING, IndexModel, UpdateOne
+from pymongo.errors import BulkWriteError
+from typing import AsyncIterator, List, Optional, Tuple
 from .connection import db_manager
 
+# 教师文档中允许对外返回（可用于字段投影）的字段
+TEACHER_FIELDS = (
+    "name", "title", "url", "email", "resh_dict",
+    "school_college", "school_level", "school",
+)
+
+# 导出时每次从MongoDB拉取的文档数量
+EXPORT_BATCH_SIZE = 1000
+
 class TeacherCollection:
     #简单的ORM，对于同一数据库的单例实现获得不同的表
+    #启动时由 indexes.ensure_all_indexes 按此声明创建/校对索引
+    indexes = [
+        IndexModel([("email", ASCENDING)], name="email_1"),
+        IndexModel([("school", ASCENDING)], name="school_1"),
+        IndexModel([("school_level", ASCENDING)], name="school_level_1"),
+        IndexModel([("title", ASCENDING)], name="title_1"),
+        IndexModel([("url", ASCENDING)], name="url_1"),
+    ]
+    
     def __init__(self):
         self.collection = db_manager.database.get_collection("TeachesItem") #初始化中更改对应的表
     
@@ -22,6 +42,13 @@ class TeacherCollection:
             "school": teacher.get("school")  # 学校名称
         }
     
+    def teacher_projection_helper(self, teacher, fields: List[str]) -> dict:
+        """按投影字段将MongoDB文档转换为字典格式"""
+        data = {"id": str(teacher["_id"])}
+        for field in fields:
+            data[field] = teacher.get(field)
+        return data
+    
     #对于find实际上返回值为一个异步的游标对象，需要使用async来进行遍历
     async def retrieve_all(self) -> List[dict]:
         """获取所有教师"""
@@ -30,11 +57,90 @@ class TeacherCollection:
             teachers.append(self.teacher_helper(teacher))
         return teachers
     
+    #基于_id的键集分页，每页只扫描limit+1条记录，与集合总量无关
+    async def retrieve_page(
+        self,
+        cursor: Optional[str] = None,
+        limit: int = 50,
+        fields: Optional[List[str]] = None
+    ) -> Tuple[List[dict], Optional[str]]:
+        """分页获取教师，cursor为上一页最后一位教师的ID，返回(教师列表, 下一页cursor)"""
+        query = {"_id": {"$gt": ObjectId(cursor)}} if cursor else {}
+        projection = {field: 1 for field in fields} if fields else None
+        
+        teachers = []
+        # 多取一条用于判断是否还有下一页
+        async for teacher in self.collection.find(query, projection).sort("_id", 1).limit(limit + 1):
+            teachers.append(teacher)
+        
+        next_cursor = None
+        if len(teachers) > limit:
+            teachers = teachers[:limit]
+            next_cursor = str(teachers[-1]["_id"])
+        
+        if fields:
+            return [self.teacher_projection_helper(t, fields) for t in teachers], next_cursor
+        return [self.teacher_helper(t) for t in teachers], next_cursor
+    
+    #流式遍历整个集合，游标按批次从服务器拉取，内存占用与集合大小无关
+    async def iter_all(
+        self,
+        fields: Optional[List[str]] = None,
+        batch_size: int = EXPORT_BATCH_SIZE
+    ) -> AsyncIterator[dict]:
+        """逐条迭代所有教师"""
+        projection = {field: 1 for field in fields} if fields else None
+        async for teacher in self.collection.find({}, projection).batch_size(batch_size):
+            if fields:
+                yield self.teacher_projection_helper(teacher, fields)
+            else:
+                yield self.teacher_helper(teacher)
+    
     async def add_teacher(self, teacher_data: dict) -> dict:
         """添加新教师"""
-        teacher = await self.collection.insert_one(teacher_data)
-        new_teacher = await self.collection.find_one({"_id": teacher.inserted_id})
-        return self.teacher_helper(new_teacher)
+        # insert_one会把生成的_id写回teacher_data，无需再查询一次
+        await self.collection.insert_one(teacher_data)
+        return self.teacher_helper(teacher_data)
+    
+    #批量写入：按url（缺失时按email）upsert，一次bulk_write完成，不回读文档
+    async def bulk_upsert(self, teachers: List[dict], ordered: bool = False) -> List[dict]:
+        """批量添加或更新教师，返回与输入一一对应的结果"""
+        operations = []
+        for teacher in teachers:
+            key = {"url": teacher["url"]} if teacher.get("url") else {"email": teacher["email"]}
+            operations.append(UpdateOne(key, {"$set": teacher}, upsert=True))
+        
+        try:
+            result = (await self.collection.bulk_write(operations, ordered=ordered)).bulk_api_result
+        except BulkWriteError as e:
+            result = e.details
+        
+        results = [{"status": "updated", "id": None} for _ in teachers]
+        for upserted in result.get("upserted", []):
+            results[upserted["index"]] = {"status": "inserted", "id": str(upserted["_id"])}
+        failed = {error["index"]: error.get("errmsg") for error in result.get("writeErrors", [])}
+        for index, error in failed.items():
+            results[index] = {"status": "failed", "id": None, "error": error}
+        # 有序写入遇到错误即停止，之后的记录未执行
+        if ordered and failed:
+            for index in range(min(failed) + 1, len(teachers)):
+                results[index] = {"status": "skipped", "id": None}
+
+        # 已存在的教师只需补查一次_id，不回读完整文档
+        updated = [i for i, r in enumerate(results) if r["status"] == "updated"]
+        if updated:
+            urls = [teachers[i]["url"] for i in updated if teachers[i].get("url")]
+            emails = [teachers[i]["email"] for i in updated if not teachers[i].get("url")]
+            ids = {}
+            query = {"$or": [{"url": {"$in": urls}}, {"email": {"$in": emails}}]}
+            async for doc in self.collection.find(query, {"url": 1, "email": 1}):
+                ids[("url", doc.get("url"))] = str(doc["_id"])
+                ids[("email", doc.get("email"))] = str(doc["_id"])
+            for index in updated:
+                teacher = teachers[index]
+                key = ("url", teacher["url"]) if teacher.get("url") else ("email", teacher["email"])
+                results[index]["id"] = ids.get(key)
+        return results
     
     async def retrieve_by_id(self, teacher_id: str) -> Optional[dict]:
         """根据ID获取教师"""
@@ -43,6 +149,22 @@ class TeacherCollection:
             return self.teacher_helper(teacher)
         return None
     
+    #一次$in查询批量获取教师，替代逐个retrieve_by_id的多次往返
+    async def retrieve_many(self, teacher_ids: List[str], fields: Optional[List[str]] = None) -> List[dict]:
+        """根据ID列表批量获取教师，按输入顺序返回，忽略无效或不存在的ID"""
+        object_ids = list(dict.fromkeys(ObjectId(i) for i in teacher_ids if ObjectId.is_valid(i)))
+        if not object_ids:
+            return []
+        
+        projection = {field: 1 for field in fields} if fields else None
+        teachers = {}
+        async for teacher in self.collection.find({"_id": {"$in": object_ids}}, projection):
+            if fields:
+                teachers[teacher["_id"]] = self.teacher_projection_helper(teacher, fields)
+            else:
+                teachers[teacher["_id"]] = self.teacher_helper(teacher)
+        return [teachers[object_id] for object_id in object_ids if object_id in teachers]
+    
     async def update_teacher(self, teacher_id: str, data: dict) -> bool:
         """更新教师信息"""
         if len(data) < 1:
@@ -14,6 +14,7 @@ class FileInfoSchema(BaseModel):
     filename: str
     content_type: str
     size: int
+    sha256: Optional[str] = None
     upload_time: datetime
     file_path: str
     
@@ -60,5 +60,14 @@ def ResponseModel(data, message):
     }
 
 
+def PageResponseModel(data, next_cursor, message):
+    return {
+        "data": [data],
+        "next_cursor": next_cursor,
+        "code": 200,
+        "message": message,
+    }
+
+
 def ErrorResponseModel(error, code, message):
     return {"error": error, "code": code, "message": message}
@@ -1,8 +1,13 @@
-from fastapi import APIRouter, UploadFile, File, HTTPException
-from fastapi.responses import FileResponse
+import os
+from fastapi import APIRouter, UploadFile, File, HTTPException, Request, Response
+from fastapi.responses import FileResponse, StreamingResponse
 from typing import List
 
-from ..services.file_service import file_service
+from ..services.download_service import (
+    MultipartRanges, RangeNotSatisfiableError, content_disposition, file_etag, file_last_modified,
+    if_range_matches, is_not_modified, iter_file_range, parse_range_header
+)
+from ..services.file_service import MAX_UPLOAD_SIZE, file_service
 from ..models.file import FileResponseModel
 from ..models.smtp import ResponseModel, ErrorResponseModel
 
@@ -11,8 +16,8 @@ router = APIRouter()
 @router.post("/upload", response_description="文件上传成功")
 async def upload_file(file: UploadFile = File(...)):
     """上传文件"""
-    # 检查文件大小（限制10MB）
-    if file.size and file.size > 10 * 1024 * 1024:
+    # 客户端声明的大小超限时直接拒绝，实际接收的字节数由file_service再次校验
+    if file.size and file.size > MAX_UPLOAD_SIZE:
         return ErrorResponseModel(
             "文件过大", 400, "文件大小不能超过10MB"
         )
@@ -25,7 +30,7 @@ async def upload_file(file: UploadFile = File(...)):
         )
     else:
         return ErrorResponseModel(
-            "上传失败", 500, result["message"]
+            "上传失败", result.get("code", 500), result["message"]
         )
 
 @router.get("/list", response_description="获取文件列表")
@@ -74,17 +79,65 @@ async def delete_file(file_id: str):
         )
 
 @router.get("/download/{file_id}", response_description="下载文件")
-async def download_file(file_id: str):
-    """下载文件"""
+async def download_file(file_id: str, request: Request):
+    """下载文件，支持ETag/Last-Modified条件请求和多区间Range请求"""
     try:
         file_info = await file_service.get_file_info(file_id)
         if not file_info:
             raise HTTPException(status_code=404, detail="文件不存在")
         
-        return FileResponse(
-            path=file_info["file_path"],
-            filename=file_info["filename"],
-            media_type=file_info["content_type"]
+        file_path = file_info["file_path"]
+        size = os.path.getsize(file_path)
+        etag = file_etag(file_info)
+        headers = {
+            "ETag": etag,
+            "Last-Modified": file_last_modified(file_info),
+            "Accept-Ranges": "bytes"
+        }
+        
+        if is_not_modified(request.headers, etag, file_info):
+            return Response(status_code=304, headers=headers)
+        
+        ranges = None
+        if if_range_matches(request.headers, etag, file_info):
+            try:
+                ranges = parse_range_header(request.headers.get("range"), size)
+            except RangeNotSatisfiableError:
+                return Response(status_code=416, headers={**headers, "Content-Range": f"bytes */{size}"})
+        
+        if not ranges:
+            return FileResponse(
+                path=file_path,
+                filename=file_info["filename"],
+                media_type=file_info["content_type"],
+                headers=headers
+            )
+        
+        # 区间响应同样带上附件文件名
+        headers["Content-Disposition"] = content_disposition(file_info["filename"])
+        
+        if len(ranges) == 1:
+            start, end = ranges[0]
+            headers.update({
+                "Content-Range": f"bytes {start}-{end}/{size}",
+                "Content-Length": str(end - start + 1)
+            })
+            return StreamingResponse(
+                iter_file_range(file_path, start, end),
+                status_code=206,
+                headers=headers,
+                media_type=file_info["content_type"]
+            )
+        
+        body = MultipartRanges(file_path, ranges, size, file_info["content_type"])
+        headers["Content-Length"] = str(body.content_length)
+        return StreamingResponse(
+            body,
+            status_code=206,
+            headers=headers,
+            media_type=body.content_type
         )
+    except HTTPException:
+        raise
     except Exception as e:
-        raise HTTPException(status_code=500, detail=f"下载文件失败: {str(e)}")
\ No newline at end of file
+        raise HTTPException(status_code=500, detail=f"下载文件失败: {str(e)}")
@@ -3,7 +3,9 @@ from fastapi.encoders import jsonable_encoder
 from typing import Optional
 
 from ..database.smtp_collection import smtp_config_collection, email_log_collection
+from ..database.email_job_collection import email_job_collection
 from ..services.smtp_service import smtp_service
+from ..services.email_queue import email_queue
 from ..models.smtp import (
     SMTPConfigSchema,
     UpdateSMTPConfigModel,
@@ -129,78 +131,76 @@ async def test_smtp_connection(config: SMTPConfigSchema = Body(...)):
             "连接测试失败", 400, result["message"]
         )
 
-# 邮件发送相关接口
-@router.post("/send", response_description="发送邮件")
+# 邮件发送相关接口（邮件进入发送队列，由后台工作者异步发送）
+@router.post("/send", response_description="邮件已加入发送队列")
 async def send_email(email: EmailSchema = Body(...)):
     """发送邮件"""
     try:
-        result = await smtp_service.send_email(
-            to_emails=email.to_emails,
-            subject=email.subject,
-            body=email.body,
-            cc_emails=email.cc_emails,
-            bcc_emails=email.bcc_emails,
-            is_html=email.is_html,
-            attachment_ids=email.attachment_ids
+        job = await email_queue.enqueue("send", {
+            "to_emails": email.to_emails,
+            "subject": email.subject,
+            "body": email.body,
+            "cc_emails": email.cc_emails,
+            "bcc_emails": email.bcc_emails,
+            "is_html": email.is_html,
+            "attachment_ids": email.attachment_ids
+        })
+        return ResponseModel(
+            {"job_id": job["id"], "status": job["status"]},
+            "邮件已加入发送队列"
         )
-        
-        if result["success"]:
-            return ResponseModel(result, "邮件发送成功")
-        else:
-            return ErrorResponseModel(
-                "邮件发送失败", 500, result["message"]
-            )
             
     except Exception as e:
         return ErrorResponseModel(
-            "发送失败", 500, f"邮件发送失败: {str(e)}"
+            "发送失败", 500, f"邮件加入发送队列失败: {str(e)}"
         )
 
-@router.post("/send-to-teachers", response_description="批量发送邮件给教师")
+@router.post("/send-to-teachers", response_description="批量邮件已加入发送队列")
 async def send_email_to_teachers(
     teacher_ids: list = Body(..., description="教师ID列表"),
     subject: str = Body(..., description="邮件主题"),
     body: str = Body(..., description="邮件正文"),
     is_html: bool = Body(False, description="是否为HTML格式"),
-    attachment_ids: list = Body(None, description="附件文件ID列表")
+    attachment_ids: list = Body(None, description="附件文件ID列表"),
+    personalize: bool = Body(True, description="是否逐个教师单独发送，支持{{姓名}}、{{职称}}、{{学校}}、{{研究方向}}等占位符")
 ):
     """批量发送邮件给指定教师"""
+    if not teacher_ids:
+        return ErrorResponseModel(
+            "无有效邮箱", 400, "未选择任何教师"
+        )
+    
     try:
-        from ..database.teacher_collection import teacher_collection
-        
-        # 获取教师邮箱列表
-        teacher_emails = []
-        for teacher_id in teacher_ids:
-            teacher = await teacher_collection.retrieve_by_id(teacher_id)
-            if teacher and teacher.get("email"):
-                teacher_emails.append(teacher["email"])
-        
-        if not teacher_emails:
-            return ErrorResponseModel(
-                "无有效邮箱", 400, "未找到有效的教师邮箱地址"
-            )
-        
-        result = await smtp_service.send_email(
-            to_emails=teacher_emails,
-            subject=subject,
-            body=body,
-            is_html=is_html,
-            attachment_ids=attachment_ids
+        job = await email_queue.enqueue("send_to_teachers", {
+            "teacher_ids": teacher_ids,
+            "subject": subject,
+            "body": body,
+            "is_html": is_html,
+            "attachment_ids": attachment_ids,
+            "personalize": personalize
+        })
+        return ResponseModel(
+            {"job_id": job["id"], "status": job["status"], "count": len(teacher_ids)},
+            f"发给 {len(teacher_ids)} 位教师的邮件已加入发送队列"
         )
-        
-        if result["success"]:
-            return ResponseModel(
-                {"sent_to": teacher_emails, "count": len(teacher_emails)},
-                f"邮件已发送给 {len(teacher_emails)} 位教师"
-            )
-        else:
-            return ErrorResponseModel(
-                "批量发送失败", 500, result["message"]
-            )
             
     except Exception as e:
         return ErrorResponseModel(
-            "批量发送失败", 500, f"批量邮件发送失败: {str(e)}"
+            "批量发送失败", 500, f"批量邮件加入发送队列失败: {str(e)}"
+        )
+
+@router.get("/jobs/{job_id}", response_description="获取邮件发送任务状态")
+async def get_email_job(job_id: str):
+    """获取邮件发送任务状态"""
+    try:
+        job = await email_job_collection.get_job(job_id)
+        if job:
+            return ResponseModel(job, "获取发送任务成功")
+        return ErrorResponseModel("任务不存在", 404, "未找到指定的发送任务")
+        
+    except Exception as e:
+        return ErrorResponseModel(
+            "获取任务失败", 500, f"获取发送任务失败: {str(e)}"
         )
 
 # 邮件日志相关接口
@@ -1,28 +1,196 @@
-from fastapi import APIRouter, Body
+import csv
+import io
+import json
+
+from bson.objectid import ObjectId
+from fastapi import APIRouter, Body, File, Query, UploadFile
 from fastapi.encoders import jsonable_encoder
+from fastapi.responses import StreamingResponse
+from pydantic import ValidationError
+from typing import List, Optional
 
 from server.database import teacher_collection
+from server.database.teacher_collection import TEACHER_FIELDS
 from server.models.teacher import (
     ErrorResponseModel,
+    PageResponseModel,
     ResponseModel,
     TeacherSchema,
     UpdateTeacherModel,
 )
+from server.services.search_service import teacher_search_index
 
 router = APIRouter()
 
+# 单次批量写入允许的最大记录数
+BULK_MAX_ROWS = 10000
+
+# 流式导出时单个响应块的目标大小（字节）
+EXPORT_CHUNK_SIZE = 64 * 1024
+
+
+def parse_fields(fields: Optional[str]) -> List[str]:
+    """解析逗号分隔的投影字段，遇到未知字段抛出ValueError"""
+    if not fields:
+        return []
+    projection = [f.strip() for f in fields.split(",") if f.strip()]
+    unknown = [f for f in projection if f not in TEACHER_FIELDS]
+    if unknown:
+        raise ValueError("Unknown fields: {0}".format(", ".join(unknown)))
+    return projection
+
 @router.post("/", response_description="Teacher data added into the database")
 async def add_teacher_data(teacher: TeacherSchema = Body(...)):
     teacher = jsonable_encoder(teacher)
     new_teacher = await teacher_collection.add_teacher(teacher)
+    teacher_search_index.add(new_teacher)
     return ResponseModel(new_teacher, "Teacher added successfully.")
 
+async def bulk_ingest(rows: list, ordered: bool):
+    if len(rows) > BULK_MAX_ROWS:
+        return ErrorResponseModel(
+            "An error occurred.", 400, f"At most {BULK_MAX_ROWS} teachers per request."
+        )
+    
+    # 先一次性校验全部记录，校验失败的记录不参与写入
+    results = [None] * len(rows)
+    valid_rows = []
+    valid_indexes = []
+    for index, row in enumerate(rows):
+        try:
+            if isinstance(row, Exception):
+                raise row
+            valid_rows.append(jsonable_encoder(TeacherSchema(**row)))
+            valid_indexes.append(index)
+        except (ValidationError, ValueError, TypeError) as e:
+            results[index] = {"index": index, "status": "invalid", "id": None, "error": str(e)}
+    
+    if valid_rows:
+        written = await teacher_collection.bulk_upsert(valid_rows, ordered)
+        for index, teacher, result in zip(valid_indexes, valid_rows, written):
+            results[index] = {"index": index, "error": None, **result}
+            if result["id"] and result["status"] in ("inserted", "updated"):
+                teacher_search_index.add({"id": result["id"], **teacher})
+    
+    summary = {
+        status: sum(1 for r in results if r["status"] == status)
+        for status in ("inserted", "updated", "invalid", "failed", "skipped")
+    }
+    return ResponseModel(
+        {**summary, "results": results},
+        "Bulk ingest finished: {inserted} inserted, {updated} updated".format(**summary),
+    )
+
+@router.post("/bulk", response_description="Teachers bulk upserted into the database")
+async def bulk_add_teachers(
+    teachers: List[dict] = Body(..., description="教师记录列表，字段同TeacherSchema"),
+    ordered: bool = Query(False, description="是否有序写入，有序写入遇到错误即停止"),
+):
+    return await bulk_ingest(teachers, ordered)
+
+@router.post("/bulk/ndjson", response_description="Teachers bulk upserted from an NDJSON upload")
+async def bulk_add_teachers_ndjson(
+    file: UploadFile = File(..., description="每行一条教师记录的NDJSON文件"),
+    ordered: bool = Query(False, description="是否有序写入，有序写入遇到错误即停止"),
+):
+    rows = []
+    # 逐行解码，编码错误和JSON错误一样只标记该行为invalid，不影响其余记录
+    for line in (await file.read()).splitlines():
+        if not line.strip():
+            continue
+        try:
+            rows.append(json.loads(line.decode("utf-8")))
+        except UnicodeDecodeError as e:
+            rows.append(ValueError(f"Invalid UTF-8: {e}"))
+        except json.JSONDecodeError as e:
+            rows.append(ValueError(f"Invalid JSON: {e}"))
+    return await bulk_ingest(rows, ordered)
+
 @router.get("/", response_description="Teachers retrieved")
-async def get_teachers():
-    teachers = await teacher_collection.retrieve_all()
+async def get_teachers(
+    cursor: Optional[str] = Query(None, description="上一页返回的next_cursor，为空时从第一页开始"),
+    limit: int = Query(50, ge=1, le=500, description="每页返回的教师数量"),
+    fields: Optional[str] = Query(None, description="逗号分隔的返回字段，如 name,email"),
+):
+    if cursor and not ObjectId.is_valid(cursor):
+        return ErrorResponseModel("An error occurred.", 400, "Invalid cursor.")
+    
+    try:
+        projection = parse_fields(fields) or None
+    except ValueError as e:
+        return ErrorResponseModel("An error occurred.", 400, str(e))
+    
+    teachers, next_cursor = await teacher_collection.retrieve_page(cursor, limit, projection)
     if teachers:
-        return ResponseModel(teachers, "Teachers data retrieved successfully")
-    return ResponseModel(teachers, "Empty list returned")
+        return PageResponseModel(teachers, next_cursor, "Teachers data retrieved successfully")
+    return PageResponseModel(teachers, next_cursor, "Empty list returned")
+
+async def export_ndjson(fields: List[str]):
+    buffer = []
+    size = 0
+    async for teacher in teacher_collection.iter_all(fields or None):
+        line = json.dumps(teacher, ensure_ascii=False, default=str) + "\n"
+        buffer.append(line)
+        size += len(line)
+        if size >= EXPORT_CHUNK_SIZE:
+            yield "".join(buffer)
+            buffer, size = [], 0
+    if buffer:
+        yield "".join(buffer)
+
+async def export_csv(fields: List[str]):
+    columns = ["id", *(fields or TEACHER_FIELDS)]
+    output = io.StringIO()
+    writer = csv.DictWriter(output, fieldnames=columns, extrasaction="ignore")
+    writer.writeheader()
+    async for teacher in teacher_collection.iter_all(fields or None):
+        writer.writerow(teacher)
+        if output.tell() >= EXPORT_CHUNK_SIZE:
+            yield output.getvalue()
+            output.seek(0)
+            output.truncate(0)
+    if output.tell():
+        yield output.getvalue()
+
+@router.get("/export", response_description="Teachers exported as a stream")
+async def export_teachers(
+    format: str = Query("ndjson", pattern="^(ndjson|csv)$", description="导出格式：ndjson/csv"),
+    fields: Optional[str] = Query(None, description="逗号分隔的导出字段，如 name,email"),
+):
+    try:
+        projection = parse_fields(fields)
+    except ValueError as e:
+        return ErrorResponseModel("An error occurred.", 400, str(e))
+    
+    if format == "csv":
+        return StreamingResponse(
+            export_csv(projection),
+            media_type="text/csv; charset=utf-8",
+            headers={"Content-Disposition": 'attachment; filename="teachers.csv"'},
+        )
+    return StreamingResponse(
+        export_ndjson(projection),
+        media_type="application/x-ndjson",
+        headers={"Content-Disposition": 'attachment; filename="teachers.ndjson"'},
+    )
+
+@router.get("/search", response_description="Teachers retrieved by research keywords")
+async def search_teachers(
+    q: str = Query(..., min_length=1, description="检索词，匹配研究方向、姓名和学院"),
+    page: int = Query(1, ge=1, description="页码"),
+    size: int = Query(20, ge=1, le=100, description="每页数量"),
+):
+    if not teacher_search_index.ready:
+        return ErrorResponseModel("An error occurred.", 503, "Search index is being built.")
+    
+    total, hits = teacher_search_index.search(q, (page - 1) * size, size)
+    scores = dict(hits)
+    teachers = await teacher_collection.retrieve_many([teacher_id for teacher_id, _ in hits])
+    results = [{**teacher, "score": round(scores[teacher["id"]], 4)} for teacher in teachers]
+    return ResponseModel(
+        {"total": total, "page": page, "size": size, "items": results},
+        f"{total} teachers matched '{q}'",
+    )
 
 @router.get("/{id}", response_description="Teacher data retrieved")
 async def get_teacher_data(id: str):
@@ -36,6 +204,9 @@ async def update_teacher_data(id: str, req: UpdateTeacherModel = Body(...)):
     req = {k: v for k, v in req.dict().items() if v is not None}
     updated_teacher = await teacher_collection.update_teacher(id, req)
     if updated_teacher:
+        teacher = await teacher_collection.retrieve_by_id(id)
+        if teacher:
+            teacher_search_index.add(teacher)
         return ResponseModel(
             f"Teacher with ID: {id} update is successful",
             "Teacher updated successfully",
@@ -50,6 +221,7 @@ async def update_teacher_data(id: str, req: UpdateTeacherModel = Body(...)):
 async def delete_teacher_data(id: str):
     deleted_teacher = await teacher_collection.delete_teacher(id)
     if deleted_teacher:
+        teacher_search_index.remove(id)
         return ResponseModel(
             f"Teacher with ID: {id} removed", "Teacher deleted successfully"
         )
@@ -0,0 +1,141 @@
+import logging
+import mimetypes
+import os
+import threading
+import urllib.parse
+from collections import OrderedDict
+from email import encoders
+from email.mime.base import MIMEBase
+from email.mime.text import MIMEText
+from typing import Optional
+
+# 缓存的已编码附件总字节数上限
+ATTACHMENT_CACHE_BYTES = int(os.getenv("ATTACHMENT_CACHE_BYTES", str(64 * 1024 * 1024)))
+# 上传文件时是否立即编码并放入缓存
+ATTACHMENT_CACHE_EAGER = os.getenv("ATTACHMENT_CACHE_EAGER", "false").lower() == "true"
+
+logger = logging.getLogger(__name__)
+
+
+def attachment_version(file_info: dict) -> str:
+    """附件内容版本：优先使用上传时的校验和，旧记录退化为大小+上传时间"""
+    return file_info.get("sha256") or f"{file_info['size']}:{file_info['upload_time']}"
+
+
+def build_attachment_part(file_info: dict, file_data: bytes) -> MIMEBase:
+    """将文件内容编码为邮件附件部分（CPU密集，调用方应放到线程中执行）"""
+    original_size = len(file_data)
+
+    # 确定MIME类型，优先使用数据库中的content_type，如果为空则根据文件扩展名推断
+    mime_type = file_info['content_type']
+    if not mime_type or mime_type == 'application/octet-stream':
+        # 使用mimetypes模块根据文件扩展名推断MIME类型
+        guessed_type, _ = mimetypes.guess_type(file_info['filename'])
+        mime_type = guessed_type or 'application/octet-stream'
+
+    main_type, sub_type = mime_type.split('/', 1) if '/' in mime_type else ('application', 'octet-stream')
+
+    logger.info(f"附件 {file_info['filename']} 原始大小: {original_size} bytes, MIME类型: {mime_type}")
+
+    # 创建附件部分 - 使用更标准的方式
+    if main_type == 'text':
+        # 对于文本文件，使用MIMEText
+        if isinstance(file_data, bytes):
+            file_data = file_data.decode('utf-8', errors='replace')
+        part = MIMEText(file_data, sub_type, 'utf-8')
+    else:
+        # 对于二进制文件，使用MIMEBase
+        part = MIMEBase(main_type, sub_type)
+
+        # 确保文件数据是bytes类型
+        if isinstance(file_data, str):
+            file_data = file_data.encode('utf-8')
+
+        part.set_payload(file_data)
+
+        # 编码附件
+        encoders.encode_base64(part)
+
+    # 记录处理后的大小
+    if main_type == 'text':
+        processed_size = len(part.get_payload().encode('utf-8'))
+        logger.info(f"附件 {file_info['filename']} 文本处理后大小: {processed_size} bytes")
+    else:
+        encoded_size = len(part.get_payload())
+        logger.info(f"附件 {file_info['filename']} base64编码后大小: {encoded_size} bytes")
+
+    # 添加附件头部
+    filename = file_info['filename']
+
+    # 使用正确的方式设置Content-Disposition，避免邮件客户端显示为.bin文件
+    try:
+        # 尝试ASCII编码
+        filename.encode('ascii')
+        # 如果是ASCII字符，直接使用
+        disposition = f'attachment; filename="{filename}"'
+    except UnicodeEncodeError:
+        # 如果包含非ASCII字符，使用RFC2231标准
+        encoded_filename = urllib.parse.quote(filename, safe='')
+        disposition = f'attachment; filename*=utf-8\'\'{encoded_filename}'
+
+    # 设置附件头部信息
+    part.add_header("Content-Disposition", disposition)
+
+    # 对于文本文件，确保正确的Content-Type设置
+    if main_type == 'text':
+        # MIMEText会自动设置Content-Type，但我们需要确保它作为附件处理
+        part.replace_header('Content-Type', f'{mime_type}; name="{filename}"')
+
+    # Content-Transfer-Encoding会由相应的MIME类和编码器自动设置
+    return part
+
+
+class AttachmentCache:
+    """按文件ID缓存已编码的附件部分，按字节预算做LRU淘汰（线程安全）
+
+    缓存的附件部分在各封邮件之间共享，只读使用，不能再修改其头部或内容。
+    """
+
+    def __init__(self, max_bytes: int = ATTACHMENT_CACHE_BYTES):
+        self.max_bytes = max_bytes
+        self.current_bytes = 0
+        self._lock = threading.Lock()
+        self._entries: "OrderedDict[str, tuple[str, MIMEBase, int]]" = OrderedDict()
+
+    def get(self, file_id: str, version: str) -> Optional[MIMEBase]:
+        """获取缓存的附件部分，文件内容版本不一致时视为未命中"""
+        with self._lock:
+            entry = self._entries.get(file_id)
+            if entry is None or entry[0] != version:
+                return None
+            self._entries.move_to_end(file_id)
+            return entry[1]
+
+    def put(self, file_id: str, version: str, part: MIMEBase):
+        size = len(part.get_payload())
+        if size > self.max_bytes:
+            return
+        with self._lock:
+            self._pop(file_id)
+            self._entries[file_id] = (version, part, size)
+            self.current_bytes += size
+            while self.current_bytes > self.max_bytes:
+                self._pop(next(iter(self._entries)))
+
+    def invalidate(self, file_id: str):
+        with self._lock:
+            self._pop(file_id)
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+            self.current_bytes = 0
+
+    def _pop(self, file_id: str):
+        entry = self._entries.pop(file_id, None)
+        if entry is not None:
+            self.current_bytes -= entry[2]
+
+
+# 全局附件缓存实例
+attachment_cache = AttachmentCache()
@@ -0,0 +1,152 @@
+import urllib.parse
+import uuid
+from email.utils import formatdate, parsedate_to_datetime
+from typing import AsyncIterator, List, Optional, Tuple
+
+import aiofiles
+
+# 下载时每次读取的块大小
+DOWNLOAD_CHUNK_SIZE = 64 * 1024
+# 单个请求最多允许的区间数，超出时忽略Range返回完整文件
+MAX_RANGES = 16
+
+
+class RangeNotSatisfiableError(Exception):
+    """请求的字节区间全部超出文件范围"""
+
+
+def file_etag(file_info: dict) -> str:
+    """由内容哈希生成强ETag，没有哈希的旧记录使用弱ETag"""
+    if file_info.get("sha256"):
+        return f'"{file_info["sha256"]}"'
+    return f'W/"{file_info["size"]}-{int(file_info["upload_time"].timestamp())}"'
+
+
+def file_last_modified(file_info: dict) -> str:
+    return formatdate(int(file_info["upload_time"].timestamp()), usegmt=True)
+
+
+def content_disposition(filename: str) -> str:
+    """附件文件名头部，非ASCII文件名使用RFC2231编码"""
+    quoted = urllib.parse.quote(filename)
+    if quoted != filename:
+        return f"attachment; filename*=utf-8''{quoted}"
+    return f'attachment; filename="{filename}"'
+
+
+def _strip_weak(etag: str) -> str:
+    return etag[2:] if etag.startswith("W/") else etag
+
+
+def is_not_modified(headers, etag: str, file_info: dict) -> bool:
+    """按If-None-Match优先、If-Modified-Since其次判断是否可返回304"""
+    if_none_match = headers.get("if-none-match")
+    if if_none_match is not None:
+        if if_none_match.strip() == "*":
+            return True
+        candidates = {_strip_weak(tag.strip()) for tag in if_none_match.split(",")}
+        return _strip_weak(etag) in candidates
+
+    if_modified_since = headers.get("if-modified-since")
+    if if_modified_since:
+        try:
+            since = parsedate_to_datetime(if_modified_since).timestamp()
+        except (TypeError, ValueError):
+            return False
+        return int(file_info["upload_time"].timestamp()) <= since
+    return False
+
+
+def if_range_matches(headers, etag: str, file_info: dict) -> bool:
+    """If-Range校验失败时应忽略Range返回完整文件"""
+    if_range = headers.get("if-range")
+    if not if_range:
+        return True
+    if_range = if_range.strip()
+    if if_range.startswith('"') or if_range.startswith("W/"):
+        # If-Range只接受强ETag比较
+        return not etag.startswith("W/") and if_range == etag
+    return if_range == file_last_modified(file_info)
+
+
+def parse_range_header(range_header: Optional[str], size: int) -> Optional[List[Tuple[int, int]]]:
+    """解析Range头，返回闭区间列表；无法解析时返回None表示忽略该头"""
+    if not range_header:
+        return None
+    unit, _, specs = range_header.partition("=")
+    if unit.strip().lower() != "bytes" or not specs:
+        return None
+
+    ranges = []
+    for spec in specs.split(","):
+        start_text, sep, end_text = spec.strip().partition("-")
+        if not sep:
+            return None
+        try:
+            if start_text:
+                start = int(start_text)
+                end = int(end_text) if end_text else size - 1
+                if start > end:
+                    return None
+            else:
+                # 后缀区间：最后N个字节
+                suffix = int(end_text)
+                start, end = max(size - suffix, 0), size - 1
+                if suffix == 0:
+                    continue
+        except ValueError:
+            return None
+        if start >= size:
+            continue
+        ranges.append((start, min(end, size - 1)))
+
+    if len(ranges) > MAX_RANGES:
+        return None
+    if not ranges:
+        raise RangeNotSatisfiableError()
+    return ranges
+
+
+async def iter_file_range(path: str, start: int, end: int) -> AsyncIterator[bytes]:
+    """按块读取文件中[start, end]区间的内容"""
+    remaining = end - start + 1
+    async with aiofiles.open(path, "rb") as f:
+        await f.seek(start)
+        while remaining > 0:
+            chunk = await f.read(min(DOWNLOAD_CHUNK_SIZE, remaining))
+            if not chunk:
+                break
+            remaining -= len(chunk)
+            yield chunk
+
+
+class MultipartRanges:
+    """multipart/byteranges响应体"""
+
+    def __init__(self, path: str, ranges: List[Tuple[int, int]], size: int, content_type: str):
+        self.path = path
+        self.ranges = ranges
+        self.boundary = uuid.uuid4().hex
+        self.content_type = f"multipart/byteranges; boundary={self.boundary}"
+        self._part_headers = [
+            (
+                f"--{self.boundary}\r\n"
+                f"Content-Type: {content_type}\r\n"
+                f"Content-Range: bytes {start}-{end}/{size}\r\n\r\n"
+            ).encode()
+            for start, end in ranges
+        ]
+        self._closing = f"--{self.boundary}--\r\n".encode()
+
+    @property
+    def content_length(self) -> int:
+        body = sum(end - start + 1 + 2 for start, end in self.ranges)
+        return body + sum(map(len, self._part_headers)) + len(self._closing)
+
+    async def __aiter__(self):
+        for header, (start, end) in zip(self._part_headers, self.ranges):
+            yield header
+            async for chunk in iter_file_range(self.path, start, end):
+                yield chunk
+            yield b"\r\n"
+        yield self._closing
@@ -0,0 +1,148 @@
+import asyncio
+import logging
+import os
+import uuid
+from typing import List, Optional
+
+from ..database.email_job_collection import email_job_collection
+
+# 后台发送工作者数量
+EMAIL_QUEUE_WORKERS = int(os.getenv("EMAIL_QUEUE_WORKERS", "2"))
+# 队列为空时的轮询间隔（秒），入队时会立即唤醒工作者
+EMAIL_QUEUE_POLL_INTERVAL = 5
+# 任务租约时长（秒），工作者崩溃后租约过期的任务会被其他工作者重新领取
+EMAIL_QUEUE_LEASE_SECONDS = 120
+# 任务执行期间续约的间隔（秒），长时间运行的任务不会因租约过期被重复领取
+EMAIL_QUEUE_HEARTBEAT_INTERVAL = EMAIL_QUEUE_LEASE_SECONDS / 4
+# 任务最大尝试次数
+EMAIL_QUEUE_MAX_ATTEMPTS = 3
+
+
+class EmailQueue:
+    """基于MongoDB的持久化邮件发送队列，由后台工作者池异步消费"""
+
+    def __init__(self, workers: int = EMAIL_QUEUE_WORKERS):
+        self.logger = logging.getLogger(__name__)
+        self.workers = workers
+        self._tasks: List[asyncio.Task] = []
+        self._wakeup: Optional[asyncio.Event] = None
+        self._running = False
+
+    async def enqueue(self, kind: str, payload: dict) -> dict:
+        """添加发送任务并唤醒工作者"""
+        job = await email_job_collection.add_job(kind, payload)
+        if self._wakeup:
+            self._wakeup.set()
+        return job
+
+    def start(self):
+        """启动工作者池"""
+        if self._running:
+            return
+        self._running = True
+        self._wakeup = asyncio.Event()
+        self._tasks = [
+            asyncio.create_task(self._worker_loop(f"{uuid.uuid4().hex[:8]}-{i}"))
+            for i in range(self.workers)
+        ]
+        self.logger.info(f"邮件发送队列已启动，工作者数量: {self.workers}")
+
+    async def stop(self):
+        """停止工作者池，正在执行的任务租约过期后会被重新领取"""
+        self._running = False
+        for task in self._tasks:
+            task.cancel()
+        await asyncio.gather(*self._tasks, return_exceptions=True)
+        self._tasks = []
+        self.logger.info("邮件发送队列已停止")
+
+    async def _worker_loop(self, worker_id: str):
+        while self._running:
+            try:
+                job = await email_job_collection.claim_next(worker_id, EMAIL_QUEUE_LEASE_SECONDS)
+            except Exception as e:
+                self.logger.error(f"领取邮件任务失败: {e}")
+                job = None
+
+            if job is None:
+                self._wakeup.clear()
+                try:
+                    await asyncio.wait_for(self._wakeup.wait(), EMAIL_QUEUE_POLL_INTERVAL)
+                except asyncio.TimeoutError:
+                    pass
+                continue
+
+            await self._run_job(job)
+
+    async def _run_job(self, job: dict):
+        worker_id = job.get("worker_id")
+        if job.get("attempts", 0) > EMAIL_QUEUE_MAX_ATTEMPTS:
+            await email_job_collection.finish_job(
+                job["_id"], worker_id, "failed", error_message="超过最大重试次数"
+            )
+            return
+
+        dispatch = asyncio.create_task(self._dispatch(job))
+        heartbeat = asyncio.create_task(self._heartbeat(job["_id"], worker_id))
+        try:
+            await asyncio.wait({dispatch, heartbeat}, return_when=asyncio.FIRST_COMPLETED)
+        finally:
+            heartbeat.cancel()
+            if not dispatch.done():
+                # 租约丢失（或工作者停止）：任务已归其他工作者，立即停止发送
+                dispatch.cancel()
+        await asyncio.gather(heartbeat, dispatch, return_exceptions=True)
+
+        if dispatch.cancelled():
+            self.logger.warning(f"邮件任务 {job['_id']} 租约已丢失，停止执行")
+            return
+
+        if dispatch.exception() is not None:
+            e = dispatch.exception()
+            self.logger.error(f"邮件任务 {job['_id']} 执行异常: {e}")
+            if job.get("attempts", 0) < EMAIL_QUEUE_MAX_ATTEMPTS:
+                saved = await email_job_collection.retry_job(job["_id"], worker_id, str(e))
+            else:
+                saved = await email_job_collection.finish_job(job["_id"], worker_id, "failed", error_message=str(e))
+        else:
+            result = dispatch.result()
+            status = "success" if result.get("success") else "failed"
+            saved = await email_job_collection.finish_job(
+                job["_id"], worker_id, status, result=result,
+                error_message=None if result.get("success") else result.get("message")
+            )
+        if not saved:
+            self.logger.warning(f"邮件任务 {job['_id']} 租约已丢失，结果未写入")
+
+    async def _heartbeat(self, job_id, worker_id: str):
+        """定期续约，租约丢失时返回"""
+        while True:
+            await asyncio.sleep(EMAIL_QUEUE_HEARTBEAT_INTERVAL)
+            try:
+                renewed = await email_job_collection.renew_lease(job_id, worker_id, EMAIL_QUEUE_LEASE_SECONDS)
+            except Exception as e:
+                # 数据库暂时不可用时继续执行，租约到期前还有机会续约
+                self.logger.warning(f"邮件任务 {job_id} 续约失败: {e}")
+                continue
+            if not renewed:
+                return
+
+    async def _dispatch(self, job: dict) -> dict:
+        from .smtp_service import smtp_service
+
+        kind, payload = job["kind"], job["payload"]
+        if kind == "send":
+            return await smtp_service.send_email(**payload)
+        if kind == "send_to_teachers":
+            async def on_delivered(teacher_id: str) -> bool:
+                return await email_job_collection.mark_delivered(job["_id"], job.get("worker_id"), teacher_id)
+
+            # 之前的尝试中已发送的收件人不再重复发送
+            return await smtp_service.send_email_to_teachers(
+                **payload, delivered=set(job.get("delivered", [])), on_delivered=on_delivered
+            )
+        raise ValueError(f"未知的邮件任务类型: {kind}")
+
+
+# 全局邮件发送队列实例
+email_queue = EmailQueue()
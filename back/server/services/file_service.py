@@ -1,9 +1,27 @@
+import asyncio
+import hashlib
 import os
 import uuid
 import aiofiles
 from typing import Optional
 from fastapi import UploadFile
 from ..database.file_collection import file_collection_helper
+from .attachment_cache import ATTACHMENT_CACHE_EAGER, attachment_cache, attachment_version, build_attachment_part
+
+# 上传时每次读取并写入磁盘的块大小
+UPLOAD_CHUNK_SIZE = 1024 * 1024
+# 单个上传文件的大小上限
+MAX_UPLOAD_SIZE = 10 * 1024 * 1024
+# 不超过该大小的上传只在内存中缓冲，内容已存在时完全不写磁盘
+UPLOAD_SPOOL_SIZE = int(os.getenv("UPLOAD_SPOOL_SIZE", str(4 * 1024 * 1024)))
+# 相同内容正在被删除时，等待删除完成的重试次数和间隔（秒）
+BLOB_ACQUIRE_RETRIES = 50
+BLOB_ACQUIRE_INTERVAL = 0.1
+
+
+class FileTooLargeError(Exception):
+    """上传文件超过大小限制"""
+
 
 class FileService:
     def __init__(self):
@@ -11,28 +29,72 @@ class FileService:
         self.upload_dir = "uploads"
         os.makedirs(self.upload_dir, exist_ok=True)
     
-    async def upload_file(self, file: UploadFile) -> dict:
-        """上传文件到服务器"""
+    def blob_path(self, digest: str) -> str:
+        """按哈希前缀分两级目录存放文件，避免单个目录下文件过多"""
+        return os.path.join(self.upload_dir, digest[:2], digest[2:4], digest)
+    
+    async def upload_file(self, file: UploadFile, max_size: int = MAX_UPLOAD_SIZE) -> dict:
+        """分块流式上传文件，按内容SHA-256去重存储，按实际接收的字节数限制大小"""
+        # 边接收边计算哈希，小文件缓冲在内存中，超过UPLOAD_SPOOL_SIZE后才写入临时文件
+        temp_path = None
+        temp_file = None
+        spooled = []
+        
         try:
-            # 生成唯一文件名
-            file_extension = os.path.splitext(file.filename)[1]
-            unique_filename = f"{uuid.uuid4()}{file_extension}"
-            file_path = os.path.join(self.upload_dir, unique_filename)
+            size = 0
+            hasher = hashlib.sha256()
+            while True:
+                chunk = await file.read(UPLOAD_CHUNK_SIZE)
+                if not chunk:
+                    break
+                size += len(chunk)
+                if size > max_size:
+                    raise FileTooLargeError(f"文件大小不能超过{max_size // (1024 * 1024)}MB")
+                hasher.update(chunk)
+                if temp_file is None and size <= UPLOAD_SPOOL_SIZE:
+                    spooled.append(chunk)
+                    continue
+                if temp_file is None:
+                    temp_path = os.path.join(self.upload_dir, f"{uuid.uuid4()}.part")
+                    temp_file = await aiofiles.open(temp_path, 'wb')
+                    await temp_file.write(b"".join(spooled))
+                    spooled = []
+                await temp_file.write(chunk)
+            if temp_file is not None:
+                await temp_file.close()
+                temp_file = None
             
-            # 保存文件到磁盘
-            async with aiofiles.open(file_path, 'wb') as f:
-                content = await file.read()
-                await f.write(content)
+            digest = hasher.hexdigest()
+            file_path = self.blob_path(digest)
             
-            # 保存文件信息到数据库
-            file_data = {
-                "filename": file.filename,
-                "content_type": file.content_type,
-                "size": len(content),
-                "file_path": file_path
-            }
+            # 先登记对内容的引用（数据库条件更新，多进程部署下与删除互斥），再按需写入磁盘
+            await self._acquire_blob(digest)
+            try:
+                if not os.path.exists(file_path):
+                    os.makedirs(os.path.dirname(file_path), exist_ok=True)
+                    if temp_path is None:
+                        temp_path = os.path.join(self.upload_dir, f"{uuid.uuid4()}.part")
+                        async with aiofiles.open(temp_path, 'wb') as f:
+                            await f.write(b"".join(spooled))
+                    os.replace(temp_path, file_path)
+                
+                # 保存文件信息到数据库，每次上传一条记录，相同内容的记录共享同一个文件
+                saved_file = await file_collection_helper.add_file({
+                    "filename": file.filename,
+                    "content_type": file.content_type,
+                    "size": size,
+                    "sha256": digest,
+                    "file_path": file_path
+                })
+            except Exception:
+                await self._release_blob(digest, file_path)
+                raise
             
-            saved_file = await file_collection_helper.add_file(file_data)
+            # 预先编码为邮件附件，首次群发时无需再读盘编码
+            if ATTACHMENT_CACHE_EAGER:
+                content = await self.read_file_content(file_path)
+                part = await asyncio.to_thread(build_attachment_part, saved_file, content)
+                attachment_cache.put(saved_file["id"], attachment_version(saved_file), part)
             
             return {
                 "success": True,
@@ -40,11 +102,44 @@ class FileService:
                 "data": saved_file
             }
             
+        except FileTooLargeError as e:
+            return {
+                "success": False,
+                "code": 400,
+                "message": str(e)
+            }
         except Exception as e:
             return {
                 "success": False,
                 "message": f"文件上传失败: {str(e)}"
             }
+        finally:
+            if temp_file is not None:
+                await temp_file.close()
+            if temp_path is not None:
+                self._remove_quietly(temp_path)
+    
+    async def _acquire_blob(self, digest: str):
+        """登记对文件内容的引用，内容正在被其他请求删除时等待删除完成"""
+        for _ in range(BLOB_ACQUIRE_RETRIES):
+            if await file_collection_helper.acquire_blob(digest):
+                return
+            await asyncio.sleep(BLOB_ACQUIRE_INTERVAL)
+        raise RuntimeError("相同内容的文件正在删除，请稍后重试")
+    
+    async def _release_blob(self, digest: str, file_path: str):
+        """释放对文件内容的引用，最后一个引用释放时删除磁盘文件"""
+        if await file_collection_helper.release_blob(digest, file_path):
+            self._remove_quietly(file_path)
+            await file_collection_helper.finish_blob_delete(digest)
+    
+    @staticmethod
+    def _remove_quietly(path: str):
+        """删除上传失败留下的临时文件"""
+        try:
+            os.remove(path)
+        except OSError:
+            pass
     
     async def get_file_info(self, file_id: str) -> Optional[dict]:
         """获取文件信息"""
@@ -64,12 +159,10 @@ class FileService:
                     "message": "文件不存在"
                 }
             
-            # 删除磁盘文件
-            if os.path.exists(file_info["file_path"]):
-                os.remove(file_info["file_path"])
-            
-            # 删除数据库记录
-            await file_collection_helper.delete_file(file_id)
+            # 先删除数据库记录，再释放引用；没有其他记录引用该文件时才删除磁盘文件
+            if await file_collection_helper.delete_file(file_id):
+                await self._release_blob(file_info.get("sha256"), file_info["file_path"])
+            attachment_cache.invalidate(file_id)
             
             return {
                 "success": True,
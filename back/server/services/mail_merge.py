@@ -0,0 +1,73 @@
+import asyncio
+import html
+import re
+import time
+from functools import lru_cache
+from typing import Tuple
+
+# 模板中可用的占位符及其对应的教师字段，同时支持中文别名
+MERGE_FIELDS = {
+    "name": "name",
+    "title": "title",
+    "school": "school",
+    "school_college": "school_college",
+    "resh_dict": "resh_dict",
+    "姓名": "name",
+    "职称": "title",
+    "学校": "school",
+    "学院": "school_college",
+    "研究方向": "resh_dict",
+}
+
+# 发送给教师时需要从数据库读取的字段
+MERGE_TEACHER_FIELDS = ["email", *sorted(set(MERGE_FIELDS.values()))]
+
+PLACEHOLDER_PATTERN = re.compile(r"\{\{\s*([^{}\s]+)\s*\}\}")
+
+
+@lru_cache(maxsize=128)
+def compile_template(template: str) -> Tuple[Tuple[bool, str], ...]:
+    """将模板切分为(是否占位符, 文本或字段名)序列，同一模板只解析一次"""
+    parts = []
+    position = 0
+    for match in PLACEHOLDER_PATTERN.finditer(template):
+        field = MERGE_FIELDS.get(match.group(1))
+        if field is None:
+            # 未知占位符原样保留
+            continue
+        if match.start() > position:
+            parts.append((False, template[position:match.start()]))
+        parts.append((True, field))
+        position = match.end()
+    if position < len(template):
+        parts.append((False, template[position:]))
+    return tuple(parts)
+
+
+def render_template(template: str, teacher: dict, is_html: bool = False) -> str:
+    """用教师信息渲染模板，HTML邮件中的字段值会被转义"""
+    rendered = []
+    for is_field, value in compile_template(template):
+        if is_field:
+            value = str(teacher.get(value) or "")
+            if is_html:
+                value = html.escape(value)
+        rendered.append(value)
+    return "".join(rendered)
+
+
+class RateLimiter:
+    """按固定间隔放行的发送速率限制器"""
+
+    def __init__(self, rate: float):
+        self.interval = 1.0 / rate if rate > 0 else 0.0
+        self._lock = asyncio.Lock()
+        self._next_time = 0.0
+
+    async def wait(self):
+        async with self._lock:
+            now = time.monotonic()
+            delay = self._next_time - now
+            self._next_time = max(now, self._next_time) + self.interval
+        if delay > 0:
+            await asyncio.sleep(delay)
@@ -0,0 +1,169 @@
+import asyncio
+import heapq
+import logging
+import math
+import os
+import re
+from collections import Counter, defaultdict
+from typing import Dict, List, Tuple
+
+from ..database.teacher_collection import teacher_collection
+
+# 定期全量重建的间隔（秒），用于同步爬虫管道等绕过接口直接写库的数据，0表示只在启动时构建
+SEARCH_INDEX_REFRESH_SECONDS = int(os.getenv("SEARCH_INDEX_REFRESH_SECONDS", "600"))
+# 构建失败后的首次重试间隔（秒），之后每次失败翻倍
+SEARCH_INDEX_RETRY_INITIAL = 5
+# 重试间隔上限（秒）
+SEARCH_INDEX_RETRY_MAX = 300
+
+# 参与检索的字段及其权重
+FIELD_WEIGHTS = {
+    "name": 2.0,
+    "resh_dict": 1.0,
+    "school_college": 0.5,
+}
+
+# 连续的中日韩字符，或连续的字母数字
+TOKEN_PATTERN = re.compile(r"[\u3400-\u4dbf\u4e00-\u9fff\uf900-\ufaff]+|[a-z0-9]+")
+CJK_PATTERN = re.compile(r"[\u3400-\u4dbf\u4e00-\u9fff\uf900-\ufaff]")
+
+
+def tokenize(text: str) -> List[str]:
+    """中英文混合分词：中文按字符二元组切分，英文和数字按整词切分"""
+    tokens = []
+    for run in TOKEN_PATTERN.findall((text or "").lower()):
+        if CJK_PATTERN.match(run):
+            if len(run) == 1:
+                tokens.append(run)
+            else:
+                tokens.extend(run[i:i + 2] for i in range(len(run) - 1))
+        else:
+            tokens.append(run)
+    return tokens
+
+
+class TeacherSearchIndex:
+    """基于倒排索引和BM25的教师研究方向检索"""
+
+    def __init__(self, k1: float = 1.2, b: float = 0.75):
+        self.logger = logging.getLogger(__name__)
+        self.k1 = k1
+        self.b = b
+        # 词项 -> {教师ID: 加权词频}
+        self.postings: Dict[str, Dict[str, float]] = defaultdict(dict)
+        # 教师ID -> {词项: 加权词频}，用于增量删除
+        self.doc_terms: Dict[str, Dict[str, float]] = {}
+        self.doc_lengths: Dict[str, float] = {}
+        self.total_length = 0.0
+        self.ready = False
+        # 重建期间通过接口发生的增删，重建完成后重放到新索引上
+        self._journal = None
+
+    def __len__(self) -> int:
+        return len(self.doc_terms)
+
+    def _analyze(self, teacher: dict) -> Dict[str, float]:
+        terms: Counter = Counter()
+        for field, weight in FIELD_WEIGHTS.items():
+            for token in tokenize(teacher.get(field)):
+                terms[token] += weight
+        return dict(terms)
+
+    def add(self, teacher: dict):
+        """添加或重新索引一位教师"""
+        doc_id = teacher["id"]
+        if self._journal is not None:
+            self._journal.append(("add", teacher))
+        if doc_id in self.doc_terms:
+            self.remove(doc_id)
+
+        terms = self._analyze(teacher)
+        self.doc_terms[doc_id] = terms
+        length = sum(terms.values())
+        self.doc_lengths[doc_id] = length
+        self.total_length += length
+        for term, tf in terms.items():
+            self.postings[term][doc_id] = tf
+
+    def remove(self, doc_id: str):
+        """从索引中移除一位教师"""
+        if self._journal is not None:
+            self._journal.append(("remove", doc_id))
+        terms = self.doc_terms.pop(doc_id, None)
+        if terms is None:
+            return
+        self.total_length -= self.doc_lengths.pop(doc_id)
+        for term in terms:
+            posting = self.postings.get(term)
+            if posting is None:
+                continue
+            posting.pop(doc_id, None)
+            if not posting:
+                del self.postings[term]
+
+    async def rebuild(self) -> bool:
+        """从数据库全量重建索引，返回是否成功
+
+        新索引在独立的实例中构建，完成后再替换，重建期间旧索引仍可正常检索。
+        """
+        fresh = TeacherSearchIndex(self.k1, self.b)
+        self._journal = []
+        try:
+            async for teacher in teacher_collection.iter_all(list(FIELD_WEIGHTS)):
+                fresh.add(teacher)
+        except Exception as e:
+            self.logger.error(f"教师检索索引构建失败: {e}")
+            return False
+        else:
+            for op, arg in self._journal:
+                if op == "add":
+                    fresh.add(arg)
+                else:
+                    fresh.remove(arg)
+            self.postings = fresh.postings
+            self.doc_terms = fresh.doc_terms
+            self.doc_lengths = fresh.doc_lengths
+            self.total_length = fresh.total_length
+            self.ready = True
+        finally:
+            self._journal = None
+        self.logger.info(f"教师检索索引构建完成，共 {len(self)} 位教师，{len(self.postings)} 个词项")
+        return True
+
+    async def run(self, refresh_seconds: int = SEARCH_INDEX_REFRESH_SECONDS):
+        """后台维护索引：失败时按指数退避重试，成功后按refresh_seconds定期重建"""
+        delay = SEARCH_INDEX_RETRY_INITIAL
+        while True:
+            if await self.rebuild():
+                if refresh_seconds <= 0:
+                    return
+                delay = SEARCH_INDEX_RETRY_INITIAL
+                await asyncio.sleep(refresh_seconds)
+            else:
+                self.logger.info(f"{delay} 秒后重试构建教师检索索引")
+                await asyncio.sleep(delay)
+                delay = min(delay * 2, SEARCH_INDEX_RETRY_MAX)
+
+    def search(self, query: str, offset: int = 0, limit: int = 20) -> Tuple[int, List[Tuple[str, float]]]:
+        """BM25检索，返回(命中总数, [(教师ID, 得分)])"""
+        doc_count = len(self.doc_terms)
+        if not doc_count:
+            return 0, []
+
+        avg_length = self.total_length / doc_count or 1.0
+        scores: Dict[str, float] = defaultdict(float)
+        for term in set(tokenize(query)):
+            posting = self.postings.get(term)
+            if not posting:
+                continue
+            idf = math.log(1 + (doc_count - len(posting) + 0.5) / (len(posting) + 0.5))
+            for doc_id, tf in posting.items():
+                norm = self.k1 * (1 - self.b + self.b * self.doc_lengths[doc_id] / avg_length)
+                scores[doc_id] += idf * tf * (self.k1 + 1) / (tf + norm)
+
+        top = heapq.nlargest(offset + limit, scores.items(), key=lambda hit: hit[1])
+        return len(scores), top[offset:]
+
+
+# 全局教师检索索引实例
+teacher_search_index = TeacherSearchIndex()
@@ -0,0 +1,190 @@
+import hashlib
+import logging
+import os
+import smtplib
+import ssl
+import threading
+import time
+from collections import deque
+from contextlib import contextmanager
+from typing import Deque, Dict, Tuple
+
+# 每个SMTP配置最多保持的连接数
+SMTP_POOL_SIZE = int(os.getenv("SMTP_POOL_SIZE", "4"))
+# 单个连接发送多少封邮件后重建（163/QQ等服务器对单连接发信数有限制）
+SMTP_POOL_MAX_MESSAGES = int(os.getenv("SMTP_POOL_MAX_MESSAGES", "50"))
+# 连接空闲超过该秒数后关闭，避免使用已被服务器断开的连接
+SMTP_POOL_IDLE_TIMEOUT = int(os.getenv("SMTP_POOL_IDLE_TIMEOUT", "60"))
+
+
+class PooledConnection:
+    """连接池中的一个已认证SMTP会话"""
+
+    def __init__(self, server: smtplib.SMTP):
+        self.server = server
+        self.messages_sent = 0
+        self.last_used = time.monotonic()
+
+    def is_idle_expired(self) -> bool:
+        return time.monotonic() - self.last_used > SMTP_POOL_IDLE_TIMEOUT
+
+    def is_alive(self) -> bool:
+        """通过NOOP检查连接是否仍可用"""
+        try:
+            return self.server.noop()[0] == 250
+        except (smtplib.SMTPException, OSError):
+            return False
+
+    def close(self):
+        try:
+            self.server.quit()
+        except (smtplib.SMTPException, OSError):
+            self.server.close()
+
+
+class SMTPConnectionPool:
+    """按SMTP配置复用已认证连接，供所有发信路径共享（线程安全，在线程中使用）"""
+
+    def __init__(self, size: int = SMTP_POOL_SIZE):
+        self.logger = logging.getLogger(__name__)
+        self.size = size
+        self._lock = threading.Lock()
+        self._idle: Dict[Tuple, Deque[PooledConnection]] = {}
+        self._slots: Dict[Tuple, threading.BoundedSemaphore] = {}
+        # 每个配置正在借用或等待连接的线程数，为0且没有空闲连接时删除该配置的条目
+        self._users: Dict[Tuple, int] = {}
+
+    @staticmethod
+    def config_key(config: dict) -> Tuple:
+        # 密码只以摘要形式出现在键中
+        return (
+            config["smtp_server"], config["smtp_port"], config["username"],
+            hashlib.sha256(config["password"].encode("utf-8")).hexdigest(), config.get("use_tls", True),
+        )
+
+    @staticmethod
+    def create_ssl_context(config: dict) -> ssl.SSLContext:
+        """创建SSL上下文"""
+        context = ssl.create_default_context()
+
+        # 针对163邮箱的特殊处理
+        if "163.com" in config["smtp_server"]:
+            context.check_hostname = False
+            context.verify_mode = ssl.CERT_NONE
+        return context
+
+    def _open(self, config: dict) -> PooledConnection:
+        """建立新连接并完成TLS握手和认证"""
+        context = self.create_ssl_context(config)
+
+        # 根据端口选择连接方式
+        if config["smtp_port"] == 465:
+            # 465端口使用SSL
+            server = smtplib.SMTP_SSL(config["smtp_server"], config["smtp_port"], context=context, timeout=30)
+        else:
+            # 587端口使用TLS
+            server = smtplib.SMTP(config["smtp_server"], config["smtp_port"], timeout=30)
+        # 握手或认证任一步失败都关闭套接字
+        try:
+            if config["smtp_port"] != 465:
+                server.ehlo()
+                if config["use_tls"]:
+                    server.starttls(context=context)
+                    server.ehlo()
+            server.login(config["username"], config["password"])
+        except Exception:
+            server.close()
+            raise
+        self.logger.info(f"新建SMTP连接: {config['smtp_server']}:{config['smtp_port']}")
+        return PooledConnection(server)
+
+    def _acquire(self, config: dict) -> PooledConnection:
+        key = self.config_key(config)
+        with self._lock:
+            slots = self._slots.setdefault(key, threading.BoundedSemaphore(self.size))
+            self._users[key] = self._users.get(key, 0) + 1
+        slots.acquire()
+
+        try:
+            while True:
+                with self._lock:
+                    idle = self._idle.get(key)
+                    conn = idle.pop() if idle else None
+                if conn is None:
+                    return self._open(config)
+                if not conn.is_idle_expired() and conn.is_alive():
+                    return conn
+                conn.close()
+        except Exception:
+            slots.release()
+            self._leave(key)
+            raise
+
+    def _release(self, config: dict, conn: PooledConnection, broken: bool = False):
+        key = self.config_key(config)
+        conn.last_used = time.monotonic()
+        if broken or conn.messages_sent >= SMTP_POOL_MAX_MESSAGES:
+            conn.close()
+        else:
+            with self._lock:
+                self._idle.setdefault(key, deque()).append(conn)
+        self._slots[key].release()
+        self._leave(key)
+
+    def _leave(self, key: Tuple):
+        """借用结束：关闭所有配置中空闲超时的连接，并删除已无连接和使用者的配置条目"""
+        expired = []
+        with self._lock:
+            self._users[key] -= 1
+            for idle_key in list(self._idle):
+                idle = self._idle[idle_key]
+                while idle and idle[0].is_idle_expired():
+                    expired.append(idle.popleft())
+                if not idle:
+                    del self._idle[idle_key]
+            for slot_key in list(self._slots):
+                if not self._users.get(slot_key) and slot_key not in self._idle:
+                    del self._slots[slot_key]
+                    self._users.pop(slot_key, None)
+        for conn in expired:
+            conn.close()
+
+    @contextmanager
+    def connection(self, config: dict):
+        """借出一个已认证连接，用完自动归还；出错的连接不会放回池中"""
+        conn = self._acquire(config)
+        try:
+            yield conn
+        except Exception:
+            self._release(config, conn, broken=True)
+            raise
+        self._release(config, conn)
+
+    def sendmail(self, config: dict, from_addr: str, to_addrs, msg: str):
+        """通过池中连接发送邮件，连接被服务器断开时换新连接重试一次"""
+        for attempt in range(2):
+            try:
+                with self.connection(config) as conn:
+                    conn.server.sendmail(from_addr, to_addrs, msg)
+                    conn.messages_sent += 1
+                return
+            except smtplib.SMTPServerDisconnected:
+                if attempt:
+                    raise
+                self.logger.warning("SMTP连接已断开，使用新连接重试")
+
+    def close_all(self):
+        """关闭所有空闲连接"""
+        with self._lock:
+            idle, self._idle = self._idle, {}
+            for key in list(self._slots):
+                if not self._users.get(key):
+                    del self._slots[key]
+                    self._users.pop(key, None)
+        for connections in idle.values():
+            for conn in connections:
+                conn.close()
+
+
+# 全局SMTP连接池实例
+smtp_pool = SMTPConnectionPool()
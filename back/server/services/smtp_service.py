@@ -1,20 +1,25 @@
+import asyncio
 import smtplib
-import ssl
 from email.mime.text import MIMEText
 from email.mime.multipart import MIMEMultipart
 from email.mime.base import MIMEBase
-from email import encoders
 from email.header import Header
 from email.utils import formataddr
-from typing import List, Optional, Dict
+from typing import Awaitable, Callable, List, Optional, Dict, Set
 from datetime import datetime
 import os
 import logging
 import base64
-import mimetypes
-import urllib.parse
 
 from ..database.smtp_collection import smtp_config_collection, email_log_collection
+from .attachment_cache import attachment_cache, attachment_version, build_attachment_part
+from .mail_merge import MERGE_TEACHER_FIELDS, RateLimiter, render_template
+from .smtp_pool import SMTP_POOL_SIZE, smtp_pool
+
+# 邮件合并时同时发送的邮件数，默认与连接池大小一致
+MAIL_MERGE_CONCURRENCY = int(os.getenv("MAIL_MERGE_CONCURRENCY", str(SMTP_POOL_SIZE)))
+# 邮件合并时每秒最多发送的邮件数
+MAIL_MERGE_RATE = float(os.getenv("MAIL_MERGE_RATE", "5"))
 
 class SMTPService:
     """SMTP邮件发送服务类"""
@@ -34,9 +39,10 @@ class SMTPService:
         cc_emails: Optional[List[str]] = None,
         bcc_emails: Optional[List[str]] = None,
         is_html: bool = False,
-        attachment_ids: Optional[List[str]] = None
+        attachment_ids: Optional[List[str]] = None,
+        attachments: Optional[List[MIMEBase]] = None
     ) -> Dict[str, any]:
-        """发送邮件"""
+        """发送邮件，attachments为已编码的附件部分，传入时不再按attachment_ids加载"""
         
         # 获取SMTP配置
         config = await self.get_smtp_config()
@@ -49,123 +55,11 @@ class SMTPService:
             return {"success": False, "message": error_msg}
         
         try:
-            # 创建邮件消息
-            message = MIMEMultipart()
-            
-            # 正确构造From头部，支持非ASCII字符
-            sender_name = config['sender_name']
-            sender_email = config['sender_email']
-            
-            # 检查发送者名称是否包含非ASCII字符
-            try:
-                sender_name.encode('ascii')
-                # 如果是纯ASCII字符，直接使用
-                from_header = f"{sender_name} <{sender_email}>"
-            except UnicodeEncodeError:
-                # 如果包含非ASCII字符，使用RFC2047编码
-                encoded_name = Header(sender_name, 'utf-8').encode()
-                from_header = f"{encoded_name} <{sender_email}>"
-            
-            message["From"] = from_header
-            message["To"] = ", ".join(to_emails)
-            
-            # 对主题也进行编码处理
-            try:
-                subject.encode('ascii')
-                message["Subject"] = subject
-            except UnicodeEncodeError:
-                message["Subject"] = Header(subject, 'utf-8').encode()
-            
-            if cc_emails:
-                message["Cc"] = ", ".join(cc_emails)
-            
-            # 添加邮件正文
-            if is_html:
-                message.attach(MIMEText(body, "html", "utf-8"))
-            else:
-                message.attach(MIMEText(body, "plain", "utf-8"))
-            
-            # 添加附件
-            if attachment_ids:
-                from ..services.file_service import file_service
-                
-                for file_id in attachment_ids:
-                    try:
-                        # 获取文件信息
-                        file_info = await file_service.get_file_info(file_id)
-                        if not file_info:
-                            continue
-                        
-                        # 读取文件内容
-                        file_data = await file_service.read_file_content(file_info['file_path'])
-                        original_size = len(file_data)
-                        
-                        # 确定MIME类型，优先使用数据库中的content_type，如果为空则根据文件扩展名推断
-                        mime_type = file_info['content_type']
-                        if not mime_type or mime_type == 'application/octet-stream':
-                            # 使用mimetypes模块根据文件扩展名推断MIME类型
-                            guessed_type, _ = mimetypes.guess_type(file_info['filename'])
-                            mime_type = guessed_type or 'application/octet-stream'
-                        
-                        main_type, sub_type = mime_type.split('/', 1) if '/' in mime_type else ('application', 'octet-stream')
-                        
-                        self.logger.info(f"附件 {file_info['filename']} 原始大小: {original_size} bytes, MIME类型: {mime_type}")
-                        
-                        # 创建附件部分 - 使用更标准的方式
-                        if main_type == 'text':
-                            # 对于文本文件，使用MIMEText
-                            if isinstance(file_data, bytes):
-                                file_data = file_data.decode('utf-8', errors='replace')
-                            part = MIMEText(file_data, sub_type, 'utf-8')
-                        else:
-                            # 对于二进制文件，使用MIMEBase
-                            part = MIMEBase(main_type, sub_type)
-                            
-                            # 确保文件数据是bytes类型
-                            if isinstance(file_data, str):
-                                file_data = file_data.encode('utf-8')
-                            
-                            part.set_payload(file_data)
-                            
-                            # 编码附件
-                            encoders.encode_base64(part)
-                        
-                        # 记录处理后的大小
-                        if main_type == 'text':
-                            processed_size = len(part.get_payload().encode('utf-8'))
-                            self.logger.info(f"附件 {file_info['filename']} 文本处理后大小: {processed_size} bytes")
-                        else:
-                            encoded_size = len(part.get_payload())
-                            self.logger.info(f"附件 {file_info['filename']} base64编码后大小: {encoded_size} bytes")
-                        
-                        # 添加附件头部
-                        filename = file_info['filename']
-                        
-                        # 使用正确的方式设置Content-Disposition，避免邮件客户端显示为.bin文件
-                        try:
-                            # 尝试ASCII编码
-                            filename.encode('ascii')
-                            # 如果是ASCII字符，直接使用
-                            disposition = f'attachment; filename="{filename}"'
-                        except UnicodeEncodeError:
-                            # 如果包含非ASCII字符，使用RFC2231标准
-                            encoded_filename = urllib.parse.quote(filename, safe='')
-                            disposition = f'attachment; filename*=utf-8\'\'{encoded_filename}'
-                        
-                        # 设置附件头部信息
-                        part.add_header("Content-Disposition", disposition)
-                        
-                        # 对于文本文件，确保正确的Content-Type设置
-                        if main_type == 'text':
-                            # MIMEText会自动设置Content-Type，但我们需要确保它作为附件处理
-                            part.replace_header('Content-Type', f'{mime_type}; name="{filename}"')
-                        
-                        # Content-Transfer-Encoding会由相应的MIME类和编码器自动设置
-                        message.attach(part)
-                        
-                    except Exception as e:
-                        self.logger.warning(f"附件处理失败: {str(e)}")
-                        continue
+            if attachments is None:
+                attachments = await self._load_attachments(attachment_ids)
+            message = await self._build_message(
+                config, to_emails, subject, body, cc_emails, is_html, attachments
+            )
             
             # 准备收件人列表
             all_recipients = to_emails.copy()
@@ -174,31 +68,8 @@ class SMTPService:
             if bcc_emails:
                 all_recipients.extend(bcc_emails)
             
-            # 发送邮件
-            context = ssl.create_default_context()
-            
-            # 针对163邮箱的特殊处理
-            if "163.com" in config["smtp_server"]:
-                context.check_hostname = False
-                context.verify_mode = ssl.CERT_NONE
-            
-            # 根据端口选择连接方式
-            if config["smtp_port"] == 465:
-                # 465端口使用SSL
-                with smtplib.SMTP_SSL(config["smtp_server"], config["smtp_port"], context=context) as server:
-                    server.login(config["username"], config["password"])
-                    text = message.as_string()
-                    server.sendmail(config["sender_email"], all_recipients, text)
-            else:
-                # 587端口使用TLS
-                with smtplib.SMTP(config["smtp_server"], config["smtp_port"], timeout=30) as server:
-                    server.ehlo()
-                    if config["use_tls"]:
-                        server.starttls(context=context)
-                        server.ehlo()
-                    server.login(config["username"], config["password"])
-                    text = message.as_string()
-                    server.sendmail(config["sender_email"], all_recipients, text)
+            # smtplib是阻塞调用，放到线程中执行，避免阻塞事件循环
+            await asyncio.to_thread(self._deliver, config, message, all_recipients)
             
             # 记录成功日志
             await self._log_email_attempt(
@@ -236,6 +107,200 @@ class SMTPService:
             )
             return {"success": False, "message": error_msg}
     
+    async def send_email_to_teachers(
+        self,
+        teacher_ids: List[str],
+        subject: str,
+        body: str,
+        is_html: bool = False,
+        attachment_ids: Optional[List[str]] = None,
+        personalize: bool = True,
+        delivered: Optional[Set[str]] = None,
+        on_delivered: Optional[Callable[[str], Awaitable[bool]]] = None
+    ) -> Dict[str, any]:
+        """批量发送邮件给指定教师，personalize为True时逐个教师渲染模板单独发送
+
+        delivered为已发送过的教师ID（任务重试时跳过），on_delivered在每封邮件发送成功后调用，
+        返回False表示任务租约已丢失，停止继续发送。
+        """
+        from ..database.teacher_collection import teacher_collection
+        
+        # 一次查询获取有邮箱的教师，只取邮件合并需要的字段
+        teachers = await teacher_collection.retrieve_many(teacher_ids, MERGE_TEACHER_FIELDS)
+        teachers = [teacher for teacher in teachers if teacher.get("email")]
+        
+        if not teachers:
+            return {"success": False, "message": "未找到有效的教师邮箱地址"}
+        
+        if personalize:
+            return await self._send_merged(
+                teachers, subject, body, is_html, attachment_ids,
+                delivered=delivered, on_delivered=on_delivered
+            )
+        
+        teacher_emails = [teacher["email"] for teacher in teachers]
+        result = await self.send_email(
+            to_emails=teacher_emails,
+            subject=subject,
+            body=body,
+            is_html=is_html,
+            attachment_ids=attachment_ids
+        )
+        if result["success"]:
+            result.update({"sent_to": teacher_emails, "count": len(teacher_emails)})
+        return result
+    
+    async def _send_merged(
+        self,
+        teachers: List[dict],
+        subject: str,
+        body: str,
+        is_html: bool,
+        attachment_ids: Optional[List[str]],
+        delivered: Optional[Set[str]] = None,
+        on_delivered: Optional[Callable[[str], Awaitable[bool]]] = None
+    ) -> Dict[str, any]:
+        """邮件合并：每位教师一封个性化邮件，并发受限、速率受限地发送"""
+        delivered = delivered or set()
+        semaphore = asyncio.Semaphore(MAIL_MERGE_CONCURRENCY)
+        limiter = RateLimiter(MAIL_MERGE_RATE)
+        # 附件只加载一次，所有收件人共用
+        attachments = await self._load_attachments(attachment_ids)
+        
+        async def send_one(teacher: dict) -> dict:
+            if teacher["id"] in delivered:
+                return {
+                    "teacher_id": teacher["id"],
+                    "email": teacher["email"],
+                    "success": True,
+                    "message": "此前已发送，跳过"
+                }
+            async with semaphore:
+                await limiter.wait()
+                # 每位收件人的发送结果由send_email单独写入email_logs
+                result = await self.send_email(
+                    to_emails=[teacher["email"]],
+                    subject=render_template(subject, teacher),
+                    body=render_template(body, teacher, is_html),
+                    is_html=is_html,
+                    attachments=attachments
+                )
+            if result["success"] and on_delivered and not await on_delivered(teacher["id"]):
+                raise RuntimeError("邮件任务租约已丢失，停止发送")
+            return {
+                "teacher_id": teacher["id"],
+                "email": teacher["email"],
+                "success": result["success"],
+                "message": result["message"]
+            }
+        
+        tasks = [asyncio.create_task(send_one(teacher)) for teacher in teachers]
+        try:
+            results = await asyncio.gather(*tasks)
+        except BaseException:
+            # 任一收件人异常（如租约丢失）时停止其余发送，已发送的收件人已记录，重试时跳过
+            for task in tasks:
+                task.cancel()
+            await asyncio.gather(*tasks, return_exceptions=True)
+            raise
+        sent = sum(1 for result in results if result["success"])
+        failed = len(results) - sent
+        
+        self.logger.info(f"邮件合并发送完成: 成功 {sent} 封，失败 {failed} 封")
+        return {
+            "success": failed == 0,
+            "message": f"邮件合并发送完成：成功 {sent} 封，失败 {failed} 封",
+            "count": len(results),
+            "sent": sent,
+            "failed": failed,
+            "results": results
+        }
+    
+    async def _build_message(
+        self,
+        config: dict,
+        to_emails: List[str],
+        subject: str,
+        body: str,
+        cc_emails: Optional[List[str]] = None,
+        is_html: bool = False,
+        attachments: Optional[List[MIMEBase]] = None
+    ) -> MIMEMultipart:
+        """构造邮件消息"""
+        # 创建邮件消息
+        message = MIMEMultipart()
+        
+        # 正确构造From头部，支持非ASCII字符
+        sender_name = config['sender_name']
+        sender_email = config['sender_email']
+        
+        # 检查发送者名称是否包含非ASCII字符
+        try:
+            sender_name.encode('ascii')
+            # 如果是纯ASCII字符，直接使用
+            from_header = f"{sender_name} <{sender_email}>"
+        except UnicodeEncodeError:
+            # 如果包含非ASCII字符，使用RFC2047编码
+            encoded_name = Header(sender_name, 'utf-8').encode()
+            from_header = f"{encoded_name} <{sender_email}>"
+        
+        message["From"] = from_header
+        message["To"] = ", ".join(to_emails)
+        
+        # 对主题也进行编码处理
+        try:
+            subject.encode('ascii')
+            message["Subject"] = subject
+        except UnicodeEncodeError:
+            message["Subject"] = Header(subject, 'utf-8').encode()
+        
+        if cc_emails:
+            message["Cc"] = ", ".join(cc_emails)
+        
+        # 添加邮件正文
+        if is_html:
+            message.attach(MIMEText(body, "html", "utf-8"))
+        else:
+            message.attach(MIMEText(body, "plain", "utf-8"))
+        
+        # 添加附件（已编码的附件部分来自缓存，多封邮件共享）
+        for part in attachments or []:
+            message.attach(part)
+        
+        return message
+    
+    async def _load_attachments(self, attachment_ids: Optional[List[str]]) -> List[MIMEBase]:
+        """加载附件部分，命中缓存时不再读取磁盘和重新编码"""
+        from ..services.file_service import file_service
+        
+        attachments = []
+        for file_id in attachment_ids or []:
+            try:
+                # 获取文件信息
+                file_info = await file_service.get_file_info(file_id)
+                if not file_info:
+                    continue
+                
+                version = attachment_version(file_info)
+                part = attachment_cache.get(file_id, version)
+                if part is None:
+                    # 读取文件内容并在线程中编码
+                    file_data = await file_service.read_file_content(file_info['file_path'])
+                    part = await asyncio.to_thread(build_attachment_part, file_info, file_data)
+                    attachment_cache.put(file_id, version, part)
+                attachments.append(part)
+            
+            except Exception as e:
+                self.logger.warning(f"附件处理失败: {str(e)}")
+                continue
+        
+        return attachments
+    
+    def _deliver(self, config: dict, message: MIMEMultipart, all_recipients: List[str]):
+        """通过连接池中的SMTP会话发送邮件（阻塞调用，需在线程中执行）"""
+        text = message.as_string()
+        smtp_pool.sendmail(config, config["sender_email"], all_recipients, text)
+    
     async def _log_email_attempt(
         self,
         to_emails: List[str],
@@ -261,33 +326,15 @@ class SMTPService:
         }
         await email_log_collection.add_log(log_data)
     
+    def _check_connection(self, config_data: dict):
+        """借出一个连接池连接，新建连接时会完成握手和认证（阻塞调用，需在线程中执行）"""
+        with smtp_pool.connection(config_data):
+            pass
+    
     async def test_smtp_connection(self, config_data: dict) -> dict:
         """测试SMTP连接"""
         try:
-            context = ssl.create_default_context()
-            
-            # 针对163邮箱的特殊处理
-            if "163.com" in config_data["smtp_server"]:
-                # 163邮箱建议使用更宽松的SSL设置
-                context.check_hostname = False
-                context.verify_mode = ssl.CERT_NONE
-            
-            # 根据端口选择连接方式
-            if config_data["smtp_port"] == 465:
-                # 465端口使用SSL
-                with smtplib.SMTP_SSL(config_data["smtp_server"], config_data["smtp_port"], context=context) as server:
-                    server.set_debuglevel(1)  # 启用调试模式
-                    server.login(config_data["username"], config_data["password"])
-            else:
-                # 587端口使用TLS
-                with smtplib.SMTP(config_data["smtp_server"], config_data["smtp_port"], timeout=30) as server:
-                    server.set_debuglevel(1)  # 启用调试模式
-                    server.ehlo()  # 发送EHLO命令
-                    if config_data["use_tls"]:
-                        server.starttls(context=context)
-                        server.ehlo()  # TLS后再次发送EHLO
-                    server.login(config_data["username"], config_data["password"])
-            
+            await asyncio.to_thread(self._check_connection, config_data)
             return {"success": True, "message": "SMTP连接测试成功"}
             
         except smtplib.SMTPAuthenticationError as e:
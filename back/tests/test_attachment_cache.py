@@ -0,0 +1,77 @@
+import pytest
+from datetime import datetime
+from unittest.mock import AsyncMock, patch
+import sys
+import os
+
+# 添加项目根目录到Python路径
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from server.services.attachment_cache import AttachmentCache, attachment_cache, build_attachment_part
+from server.services.file_service import file_service
+from server.services.smtp_service import smtp_service
+
+class TestAttachmentCache:
+    """附件编码缓存测试类"""
+
+    def setup_method(self):
+        """测试前的设置"""
+        self.file_info = {
+            "id": "507f1f77bcf86cd799439011",
+            "filename": "简介.pdf",
+            "content_type": "application/pdf",
+            "size": 3000,
+            "sha256": "abc",
+            "upload_time": datetime(2024, 1, 1),
+            "file_path": "uploads/test.pdf"
+        }
+        attachment_cache.clear()
+
+    def _part(self, size: int = 3000):
+        return build_attachment_part(self.file_info, b"x" * size)
+
+    def test_evicts_least_recently_used_over_budget(self):
+        """测试超出字节预算时淘汰最久未使用的附件"""
+        part = self._part()
+        cache = AttachmentCache(max_bytes=len(part.get_payload()) * 2)
+        cache.put("a", "v", part)
+        cache.put("b", "v", part)
+        cache.get("a", "v")
+        cache.put("c", "v", part)
+
+        assert cache.get("a", "v") is part
+        assert cache.get("b", "v") is None
+        assert cache.get("c", "v") is part
+
+    def test_changed_checksum_is_a_miss(self):
+        """测试文件校验和变化时不使用旧缓存"""
+        cache = AttachmentCache()
+        cache.put("a", "old", self._part())
+
+        assert cache.get("a", "new") is None
+
+    @pytest.mark.asyncio
+    async def test_load_attachments_encodes_once(self):
+        """测试同一附件多次发送只读取和编码一次"""
+        with patch.object(file_service, 'get_file_info', AsyncMock(return_value=self.file_info)), \
+             patch.object(file_service, 'read_file_content', AsyncMock(return_value=b"%PDF-1.4")) as mock_read:
+            first = await smtp_service._load_attachments([self.file_info["id"]])
+            second = await smtp_service._load_attachments([self.file_info["id"]])
+
+        assert mock_read.call_count == 1
+        assert first[0] is second[0]
+        assert "filename*=utf-8''" in first[0]["Content-Disposition"]
+
+    @pytest.mark.asyncio
+    async def test_delete_file_invalidates_cache(self):
+        """测试删除文件后缓存失效"""
+        attachment_cache.put(self.file_info["id"], "abc", self._part())
+        with patch('server.services.file_service.file_collection_helper') as mock_helper, \
+             patch('server.services.file_service.os.path.exists', return_value=False):
+            mock_helper.retrieve_file = AsyncMock(return_value=self.file_info)
+            mock_helper.delete_file = AsyncMock(return_value=True)
+            mock_helper.release_blob = AsyncMock(return_value=False)
+            result = await file_service.delete_file(self.file_info["id"])
+
+        assert result["success"] is True
+        assert attachment_cache.get(self.file_info["id"], "abc") is None
@@ -0,0 +1,291 @@
+import pytest
+import asyncio
+import hashlib
+from datetime import datetime
+from fastapi.testclient import TestClient
+from unittest.mock import AsyncMock, patch
+import sys
+import os
+
+# 添加项目根目录到Python路径
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from main import app
+from server.services import file_service as file_service_module
+from server.services.file_service import file_service
+
+client = TestClient(app)
+
+class FakeUploadFile:
+    """按块返回内容的上传文件"""
+
+    def __init__(self, content: bytes, filename: str = "report.pdf"):
+        self.filename = filename
+        self.content_type = "application/pdf"
+        self.content = content
+        self.position = 0
+        self.read_sizes = []
+
+    async def read(self, size: int = -1) -> bytes:
+        self.read_sizes.append(size)
+        chunk = self.content[self.position:self.position + size]
+        self.position += len(chunk)
+        return chunk
+
+class FakeFileCollection:
+    """内存中的files集合"""
+
+    def __init__(self):
+        self.files = {}
+
+    async def add_file(self, file_data):
+        file_id = f"507f1f77bcf86cd79943901{len(self.files)}"
+        self.files[file_id] = {"id": file_id, **file_data}
+        return self.files[file_id]
+
+    async def retrieve_file(self, file_id):
+        return self.files.get(file_id)
+
+    async def delete_file(self, file_id):
+        return self.files.pop(file_id, None) is not None
+
+    async def count_references(self, file_path):
+        return sum(1 for file in self.files.values() if file["file_path"] == file_path)
+
+class FakeBlobFileCollection(FakeFileCollection):
+    """带内容引用计数的files集合，模拟blobs集合上的条件更新"""
+
+    def __init__(self):
+        super().__init__()
+        self.blobs = {}
+
+    async def acquire_blob(self, digest):
+        blob = self.blobs.setdefault(digest, {"refs": 0})
+        if blob.get("deleting"):
+            return False
+        blob["refs"] += 1
+        return True
+
+    async def release_blob(self, digest, file_path):
+        blob = self.blobs.get(digest)
+        if blob is not None:
+            blob["refs"] -= 1
+            if blob["refs"] > 0:
+                return False
+        if await self.count_references(file_path) > 0:
+            return False
+        if blob is None:
+            return True
+        blob["deleting"] = True
+        return True
+
+    async def finish_blob_delete(self, digest):
+        self.blobs.pop(digest, None)
+
+class TestFileUpload:
+    """文件流式上传测试类"""
+
+    def setup_method(self):
+        """测试前的设置"""
+        self.collection = FakeBlobFileCollection()
+
+    async def _run(self, tmp_path, coroutine_factory):
+        with patch.object(file_service, 'upload_dir', str(tmp_path)), \
+             patch.object(file_service_module, 'UPLOAD_CHUNK_SIZE', 4), \
+             patch.object(file_service_module, 'file_collection_helper', self.collection):
+            return await coroutine_factory()
+
+    async def _upload(self, tmp_path, upload, **kwargs):
+        return await self._run(tmp_path, lambda: file_service.upload_file(upload, **kwargs))
+
+    @pytest.mark.asyncio
+    async def test_streams_in_chunks_and_hashes(self, tmp_path):
+        """测试分块写入磁盘并计算校验和"""
+        content = b"0123456789"
+        upload = FakeUploadFile(content)
+
+        result = await self._upload(tmp_path, upload)
+
+        assert result["success"] is True
+        assert all(size == 4 for size in upload.read_sizes)
+        assert result["data"]["size"] == len(content)
+        assert result["data"]["sha256"] == hashlib.sha256(content).hexdigest()
+        with open(result["data"]["file_path"], "rb") as f:
+            assert f.read() == content
+        assert not any(name.endswith(".part") for name in os.listdir(tmp_path))
+
+    @pytest.mark.asyncio
+    async def test_rejects_oversized_upload_by_received_bytes(self, tmp_path):
+        """测试按实际接收字节数拒绝超限文件，不留下临时文件"""
+        result = await self._upload(tmp_path, FakeUploadFile(b"x" * 10), max_size=8)
+
+        assert result["success"] is False
+        assert result["code"] == 400
+        assert os.listdir(tmp_path) == []
+
+    @pytest.mark.asyncio
+    async def test_identical_uploads_share_one_blob(self, tmp_path):
+        """测试相同内容只存储一份，按哈希分目录存放"""
+        content = b"brochure"
+        digest = hashlib.sha256(content).hexdigest()
+
+        first = await self._upload(tmp_path, FakeUploadFile(content, "a.pdf"))
+        second = await self._upload(tmp_path, FakeUploadFile(content, "b.pdf"))
+
+        assert first["data"]["id"] != second["data"]["id"]
+        assert first["data"]["file_path"] == second["data"]["file_path"]
+        assert first["data"]["file_path"] == os.path.join(str(tmp_path), digest[:2], digest[2:4], digest)
+        assert sorted(os.listdir(tmp_path)) == [digest[:2]]
+
+    @pytest.mark.asyncio
+    async def test_blob_removed_with_last_reference(self, tmp_path):
+        """测试最后一条引用删除时才删除磁盘文件"""
+        first = await self._upload(tmp_path, FakeUploadFile(b"cv", "a.pdf"))
+        second = await self._upload(tmp_path, FakeUploadFile(b"cv", "b.pdf"))
+        file_path = first["data"]["file_path"]
+
+        await self._run(tmp_path, lambda: file_service.delete_file(first["data"]["id"]))
+        assert os.path.exists(file_path)
+
+        await self._run(tmp_path, lambda: file_service.delete_file(second["data"]["id"]))
+        assert not os.path.exists(file_path)
+        assert self.collection.blobs == {}
+
+    @pytest.mark.asyncio
+    async def test_concurrent_deletes_release_blob_once(self, tmp_path):
+        """测试并发删除同一条记录时只释放一次引用"""
+        first = await self._upload(tmp_path, FakeUploadFile(b"cv", "a.pdf"))
+        await self._upload(tmp_path, FakeUploadFile(b"cv", "b.pdf"))
+        file_path = first["data"]["file_path"]
+
+        await self._run(tmp_path, lambda: asyncio.gather(
+            file_service.delete_file(first["data"]["id"]),
+            file_service.delete_file(first["data"]["id"]),
+        ))
+
+        assert os.path.exists(file_path)
+        assert self.collection.blobs[first["data"]["sha256"]]["refs"] == 1
+
+    @pytest.mark.asyncio
+    async def test_duplicate_upload_writes_nothing_to_disk(self, tmp_path):
+        """测试内容已存在时重复上传不写磁盘"""
+        await self._upload(tmp_path, FakeUploadFile(b"brochure", "a.pdf"))
+
+        with patch.object(file_service_module.aiofiles, 'open') as mock_open:
+            result = await self._upload(tmp_path, FakeUploadFile(b"brochure", "b.pdf"))
+
+        assert result["success"] is True
+        mock_open.assert_not_called()
+
+    @pytest.mark.asyncio
+    async def test_large_upload_spills_to_temp_file(self, tmp_path):
+        """测试超过内存缓冲上限的上传写入临时文件后移动到位"""
+        content = b"0123456789abcdef"
+        with patch.object(file_service_module, 'UPLOAD_SPOOL_SIZE', 6):
+            result = await self._upload(tmp_path, FakeUploadFile(content))
+
+        with open(result["data"]["file_path"], "rb") as f:
+            assert f.read() == content
+        assert not any(name.endswith(".part") for name in os.listdir(tmp_path))
+
+    @pytest.mark.asyncio
+    async def test_upload_waits_for_blob_being_deleted(self, tmp_path):
+        """测试相同内容正在被删除时上传等待删除完成"""
+        digest = hashlib.sha256(b"cv").hexdigest()
+        self.collection.blobs[digest] = {"refs": 0, "deleting": True}
+
+        async def finish_delete_later():
+            await asyncio.sleep(0.05)
+            await self.collection.finish_blob_delete(digest)
+
+        async def upload():
+            asyncio.get_running_loop().create_task(finish_delete_later())
+            return await file_service.upload_file(FakeUploadFile(b"cv"))
+
+        with patch.object(file_service_module, 'BLOB_ACQUIRE_INTERVAL', 0.01):
+            result = await self._run(tmp_path, upload)
+
+        assert result["success"] is True
+        assert os.path.exists(result["data"]["file_path"])
+        assert self.collection.blobs[digest] == {"refs": 1}
+
+class TestFileDownload:
+    """文件下载条件请求与Range测试类"""
+
+    def setup_method(self):
+        """测试前的设置"""
+        self.content = bytes(range(100))
+        self.digest = hashlib.sha256(self.content).hexdigest()
+
+    def _get(self, tmp_path, headers=None):
+        file_path = tmp_path / "blob"
+        file_path.write_bytes(self.content)
+        file_info = {
+            "id": "507f1f77bcf86cd799439011",
+            "filename": "简介.pdf",
+            "content_type": "application/pdf",
+            "size": len(self.content),
+            "sha256": self.digest,
+            "upload_time": datetime(2024, 1, 1, 8, 0, 0),
+            "file_path": str(file_path)
+        }
+        with patch.object(file_service, 'get_file_info', AsyncMock(return_value=file_info)):
+            return client.get(f"/files/download/{file_info['id']}", headers=headers or {})
+
+    def test_full_download_has_validators(self, tmp_path):
+        """测试完整下载返回ETag和Last-Modified"""
+        response = self._get(tmp_path)
+
+        assert response.status_code == 200
+        assert response.content == self.content
+        assert response.headers["etag"] == f'"{self.digest}"'
+        assert response.headers["accept-ranges"] == "bytes"
+        assert "last-modified" in response.headers
+
+    def test_if_none_match_returns_304(self, tmp_path):
+        """测试ETag匹配时返回304"""
+        response = self._get(tmp_path, {"If-None-Match": f'W/"other", "{self.digest}"'})
+
+        assert response.status_code == 304
+        assert response.content == b""
+
+    def test_if_modified_since_returns_304(self, tmp_path):
+        """测试文件未修改时返回304"""
+        last_modified = self._get(tmp_path).headers["last-modified"]
+
+        response = self._get(tmp_path, {"If-Modified-Since": last_modified})
+
+        assert response.status_code == 304
+
+    def test_single_range(self, tmp_path):
+        """测试单区间请求"""
+        response = self._get(tmp_path, {"Range": "bytes=10-19"})
+
+        assert response.status_code == 206
+        assert response.content == self.content[10:20]
+        assert response.headers["content-range"] == "bytes 10-19/100"
+
+    def test_multiple_ranges(self, tmp_path):
+        """测试多区间请求返回multipart/byteranges"""
+        response = self._get(tmp_path, {"Range": "bytes=0-4, -5"})
+
+        assert response.status_code == 206
+        assert response.headers["content-type"].startswith("multipart/byteranges")
+        assert int(response.headers["content-length"]) == len(response.content)
+        assert b"Content-Range: bytes 0-4/100" in response.content
+        assert b"Content-Range: bytes 95-99/100" in response.content
+        assert self.content[95:] in response.content
+
+    def test_unsatisfiable_range_returns_416(self, tmp_path):
+        """测试超出文件范围的区间返回416"""
+        response = self._get(tmp_path, {"Range": "bytes=200-300"})
+
+        assert response.status_code == 416
+        assert response.headers["content-range"] == "bytes */100"
+
+    def test_stale_if_range_returns_full_file(self, tmp_path):
+        """测试If-Range不匹配时返回完整文件"""
+        response = self._get(tmp_path, {"Range": "bytes=0-4", "If-Range": '"stale"'})
+
+        assert response.status_code == 200
+        assert response.content == self.content
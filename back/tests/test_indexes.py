@@ -0,0 +1,54 @@
+import pytest
+from unittest.mock import AsyncMock, MagicMock
+import sys
+import os
+
+# 添加项目根目录到Python路径
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from pymongo import ASCENDING, DESCENDING, IndexModel
+from server.database.indexes import ensure_indexes
+
+class TestEnsureIndexes:
+    """索引注册表校对测试类"""
+
+    def setup_method(self):
+        """测试前的设置"""
+        self.indexes = [
+            IndexModel([("send_time", DESCENDING)], name="send_time_-1"),
+            IndexModel([("status", ASCENDING), ("send_time", DESCENDING)], name="status_1_send_time_-1"),
+        ]
+        self.collection = MagicMock()
+        self.collection.name = "email_logs"
+        self.collection.create_indexes = AsyncMock(side_effect=lambda models: [m.document["name"] for m in models])
+
+    @pytest.mark.asyncio
+    async def test_creates_missing_indexes(self):
+        """测试创建缺失的索引"""
+        self.collection.index_information = AsyncMock(return_value={
+            "_id_": {"key": [("_id", 1)]},
+            "send_time_-1": {"key": [("send_time", -1.0)]},
+        })
+
+        report = await ensure_indexes(self.collection, self.indexes)
+
+        assert report["created"] == ["status_1_send_time_-1"]
+        assert report["drifted"] == []
+        assert report["extra"] == []
+
+    @pytest.mark.asyncio
+    async def test_reports_drift_and_extra(self):
+        """测试报告与声明不一致及未声明的索引"""
+        self.collection.index_information = AsyncMock(return_value={
+            "_id_": {"key": [("_id", 1)]},
+            "send_time_-1": {"key": [("send_time", 1)]},
+            "status_1_send_time_-1": {"key": [("status", 1), ("send_time", -1)], "unique": True},
+            "subject_1": {"key": [("subject", 1)]},
+        })
+
+        report = await ensure_indexes(self.collection, self.indexes)
+
+        assert report["created"] == []
+        assert report["drifted"] == ["send_time_-1", "status_1_send_time_-1"]
+        assert report["extra"] == ["subject_1"]
+        self.collection.create_indexes.assert_not_called()
@@ -0,0 +1,103 @@
+import pytest
+from unittest.mock import AsyncMock, patch
+import sys
+import os
+
+# 添加项目根目录到Python路径
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from server.services.mail_merge import compile_template, render_template
+from server.services.smtp_service import smtp_service
+
+class TestMailMerge:
+    """邮件合并模板测试类"""
+
+    def setup_method(self):
+        """测试前的设置"""
+        self.teacher = {
+            "id": "507f1f77bcf86cd799439011",
+            "name": "张三",
+            "title": "教授",
+            "school": "华东师范大学",
+            "resh_dict": "<机器学习>",
+            "email": "zhang@university.edu.cn"
+        }
+
+    def test_render_english_and_chinese_placeholders(self):
+        """测试中英文占位符渲染"""
+        template = "{{姓名}}{{ title }}您好，关注您在{{resh_dict}}方面的研究。{{unknown}}"
+
+        rendered = render_template(template, self.teacher)
+
+        assert rendered == "张三教授您好，关注您在<机器学习>方面的研究。{{unknown}}"
+
+    def test_html_values_are_escaped(self):
+        """测试HTML邮件中字段值被转义"""
+        rendered = render_template("<p>{{研究方向}}</p>", self.teacher, is_html=True)
+
+        assert rendered == "<p>&lt;机器学习&gt;</p>"
+
+    def test_template_is_compiled_once(self):
+        """测试同一模板只解析一次"""
+        compile_template.cache_clear()
+        for _ in range(3):
+            render_template("{{name}}老师", self.teacher)
+
+        assert compile_template.cache_info().misses == 1
+
+    @pytest.mark.asyncio
+    async def test_send_merged_sends_one_message_per_teacher(self):
+        """测试每位教师单独发送个性化邮件"""
+        other = {**self.teacher, "id": "507f1f77bcf86cd799439012", "name": "李四", "email": "li@university.edu.cn"}
+        send_results = {
+            "zhang@university.edu.cn": {"success": True, "message": "邮件发送成功"},
+            "li@university.edu.cn": {"success": False, "message": "SMTP认证失败"},
+        }
+
+        async def fake_send_email(to_emails, subject, body, **kwargs):
+            return send_results[to_emails[0]]
+
+        with patch.object(smtp_service, 'send_email', AsyncMock(side_effect=fake_send_email)) as mock_send:
+            result = await smtp_service._send_merged([self.teacher, other], "致{{姓名}}", "{{name}}老师好", False, None)
+
+        assert result["sent"] == 1 and result["failed"] == 1
+        assert result["success"] is False
+        subjects = sorted(call.kwargs["subject"] for call in mock_send.call_args_list)
+        assert subjects == ["致张三", "致李四"]
+        assert all(len(call.kwargs["to_emails"]) == 1 for call in mock_send.call_args_list)
+
+    @pytest.mark.asyncio
+    async def test_send_merged_skips_delivered_and_records_progress(self):
+        """测试重试时跳过已发送的收件人，并逐个记录发送成功的收件人"""
+        other = {**self.teacher, "id": "507f1f77bcf86cd799439012", "name": "李四", "email": "li@university.edu.cn"}
+        recorded = []
+
+        async def on_delivered(teacher_id):
+            recorded.append(teacher_id)
+            return True
+
+        with patch.object(smtp_service, 'send_email', AsyncMock(return_value={"success": True, "message": "邮件发送成功"})) as mock_send:
+            result = await smtp_service._send_merged(
+                [self.teacher, other], "致{{姓名}}", "您好", False, None,
+                delivered={self.teacher["id"]}, on_delivered=on_delivered
+            )
+
+        assert result["sent"] == 2
+        mock_send.assert_awaited_once()
+        assert mock_send.call_args.kwargs["to_emails"] == ["li@university.edu.cn"]
+        assert recorded == [other["id"]]
+
+    @pytest.mark.asyncio
+    async def test_send_merged_stops_when_lease_lost(self):
+        """测试租约丢失时停止发送其余收件人"""
+        teachers = [{**self.teacher, "id": str(i), "email": f"t{i}@university.edu.cn"} for i in range(5)]
+
+        async def on_delivered(teacher_id):
+            return False
+
+        with patch('server.services.smtp_service.MAIL_MERGE_CONCURRENCY', 1), \
+             patch.object(smtp_service, 'send_email', AsyncMock(return_value={"success": True, "message": "邮件发送成功"})) as mock_send:
+            with pytest.raises(RuntimeError):
+                await smtp_service._send_merged(teachers, "主题", "您好", False, None, on_delivered=on_delivered)
+
+        assert mock_send.await_count == 1
@@ -0,0 +1,116 @@
+import asyncio
+import pytest
+import sys
+import os
+
+# 添加项目根目录到Python路径
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from server.services import search_service
+from server.services.search_service import TeacherSearchIndex, tokenize
+
+class TestTokenize:
+    """中英文分词测试类"""
+
+    def test_cjk_bigrams_and_words(self):
+        """测试中文二元组与英文整词切分"""
+        assert tokenize("机器学习, Deep Learning") == ["机器", "器学", "学习", "deep", "learning"]
+
+    def test_single_cjk_character(self):
+        """测试单个中文字符"""
+        assert tokenize("光 3D") == ["光", "3d"]
+
+class TestTeacherSearchIndex:
+    """BM25倒排索引测试类"""
+
+    def setup_method(self):
+        """测试前的设置"""
+        self.index = TeacherSearchIndex()
+        self.index.add({"id": "1", "name": "张三", "resh_dict": "机器学习,深度学习", "school_college": "计算机学院"})
+        self.index.add({"id": "2", "name": "李四", "resh_dict": "计算机视觉", "school_college": "软件学院"})
+        self.index.add({"id": "3", "name": "王五", "resh_dict": "数据库系统", "school_college": "数据学院"})
+
+    def test_search_ranks_by_relevance(self):
+        """测试检索结果按相关度排序"""
+        total, hits = self.index.search("深度学习")
+
+        assert total == 1
+        assert hits[0][0] == "1"
+
+    def test_search_pagination(self):
+        """测试检索分页"""
+        total, first = self.index.search("学院", offset=0, limit=2)
+        _, second = self.index.search("学院", offset=2, limit=2)
+
+        assert total == 3
+        assert len(first) == 2
+        assert len(second) == 1
+        assert {doc_id for doc_id, _ in first + second} == {"1", "2", "3"}
+
+    def test_incremental_update_and_remove(self):
+        """测试增量更新与删除"""
+        self.index.add({"id": "2", "name": "李四", "resh_dict": "自然语言处理", "school_college": "软件学院"})
+        assert self.index.search("视觉")[0] == 0
+        assert self.index.search("语言")[1][0][0] == "2"
+
+        self.index.remove("3")
+        assert self.index.search("数据库")[0] == 0
+        assert "数据" not in self.index.postings
+        assert len(self.index) == 2
+
+class TestSearchIndexRebuild:
+    """索引重建测试类"""
+
+    @pytest.mark.asyncio
+    async def test_rebuild_keeps_old_index_on_failure(self, monkeypatch):
+        """测试重建失败时保留旧索引"""
+        async def broken_iter_all(fields):
+            raise RuntimeError("数据库不可用")
+            yield
+
+        index = TeacherSearchIndex()
+        index.add({"id": "1", "name": "张三", "resh_dict": "机器学习", "school_college": ""})
+        index.ready = True
+        monkeypatch.setattr(search_service.teacher_collection, "iter_all", broken_iter_all)
+
+        assert await index.rebuild() is False
+        assert index.ready
+        assert index.search("学习")[0] == 1
+
+    @pytest.mark.asyncio
+    async def test_rebuild_replays_changes_made_during_build(self, monkeypatch):
+        """测试重建期间的增删在新索引中保留"""
+        index = TeacherSearchIndex()
+
+        async def iter_all(fields):
+            yield {"id": "1", "name": "张三", "resh_dict": "机器学习", "school_college": ""}
+            # 模拟重建过程中接口新增和删除教师
+            index.add({"id": "2", "name": "李四", "resh_dict": "计算机视觉", "school_college": ""})
+            index.remove("1")
+            await asyncio.sleep(0)
+
+        monkeypatch.setattr(search_service.teacher_collection, "iter_all", iter_all)
+
+        assert await index.rebuild() is True
+        assert index.ready
+        assert set(index.doc_terms) == {"2"}
+        assert index._journal is None
+
+    @pytest.mark.asyncio
+    async def test_run_retries_with_backoff(self, monkeypatch):
+        """测试构建失败后按退避间隔重试"""
+        index = TeacherSearchIndex()
+        results = iter([False, False, True])
+        delays = []
+
+        async def rebuild():
+            return next(results)
+
+        async def fake_sleep(delay):
+            delays.append(delay)
+
+        monkeypatch.setattr(index, "rebuild", rebuild)
+        monkeypatch.setattr(search_service.asyncio, "sleep", fake_sleep)
+
+        await index.run(refresh_seconds=0)
+        assert delays == [search_service.SEARCH_INDEX_RETRY_INITIAL, search_service.SEARCH_INDEX_RETRY_INITIAL * 2]
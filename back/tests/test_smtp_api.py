@@ -10,6 +10,8 @@ sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
 
 from main import app
 from server.models.smtp import SMTPConfigSchema, EmailSchema
+from server.database.email_job_collection import email_job_collection
+from server.services.email_queue import EmailQueue, email_queue
 
 client = TestClient(app)
 
@@ -254,7 +256,7 @@ class TestEmailSending:
     """邮件发送测试类"""
     
     def setup_method(self):
-        self.base_url = "/api/v1/smtp"
+        self.base_url = "/smtp"
         self.sample_email = {
             "to_emails": ["recipient@example.com"],
             "subject": "测试邮件",
@@ -262,36 +264,134 @@ class TestEmailSending:
             "is_html": False
         }
     
-    @patch('server.services.smtp_service.smtp_service.send_email')
-    def test_send_email_success(self, mock_send_email):
-        """测试成功发送邮件"""
-        mock_send_email.return_value = asyncio.Future()
-        mock_send_email.return_value.set_result({
-            "success": True,
-            "message": "邮件发送成功",
-            "message_id": "<test@example.com>"
-        })
+    @patch.object(email_queue, 'enqueue', new_callable=AsyncMock)
+    def test_send_email_success(self, mock_enqueue):
+        """测试邮件成功加入发送队列"""
+        mock_enqueue.return_value = {"id": "507f1f77bcf86cd799439011", "status": "queued"}
         
         response = client.post(f"{self.base_url}/send", json=self.sample_email)
         
         assert response.status_code == 200
         data = response.json()
-        assert data["message"] == "邮件发送成功"
+        assert data["message"] == "邮件已加入发送队列"
+        assert data["data"][0] == {"job_id": "507f1f77bcf86cd799439011", "status": "queued"}
     
-    @patch('server.services.smtp_service.smtp_service.send_email')
-    def test_send_email_failure(self, mock_send_email):
-        """测试邮件发送失败"""
-        mock_send_email.return_value = asyncio.Future()
-        mock_send_email.return_value.set_result({
-            "success": False,
-            "message": "邮件发送失败：SMTP服务器连接超时"
-        })
+    @patch.object(email_queue, 'enqueue', new_callable=AsyncMock)
+    def test_send_email_failure(self, mock_enqueue):
+        """测试邮件加入发送队列失败"""
+        mock_enqueue.side_effect = RuntimeError("数据库连接失败")
         
         response = client.post(f"{self.base_url}/send", json=self.sample_email)
         
         assert response.status_code == 200
         data = response.json()
-        assert "error" in data
+        assert data["code"] == 500
+        assert "数据库连接失败" in data["message"]
+
+class TestEmailQueue:
+    """邮件发送队列测试类"""
+
+    def setup_method(self):
+        self.sample_email = {
+            "to_emails": ["recipient@example.com"],
+            "subject": "测试邮件",
+            "body": "这是一封测试邮件",
+            "is_html": False
+        }
+
+    @patch.object(email_queue, 'enqueue', new_callable=AsyncMock)
+    def test_send_email_returns_job_id(self, mock_enqueue):
+        """测试发送接口立即返回任务ID"""
+        mock_enqueue.return_value = {"id": "507f1f77bcf86cd799439011", "status": "queued"}
+
+        response = client.post("/smtp/send", json=self.sample_email)
+
+        data = response.json()
+        assert data["code"] == 200
+        assert data["data"][0]["job_id"] == "507f1f77bcf86cd799439011"
+        kind, payload = mock_enqueue.call_args[0]
+        assert kind == "send"
+        assert payload["to_emails"] == ["recipient@example.com"]
+
+    @patch.object(email_queue, 'enqueue', new_callable=AsyncMock)
+    def test_send_to_teachers_returns_job_id(self, mock_enqueue):
+        """测试批量发送接口立即返回任务ID"""
+        mock_enqueue.return_value = {"id": "507f1f77bcf86cd799439012", "status": "queued"}
+
+        response = client.post("/smtp/send-to-teachers", json={
+            "teacher_ids": ["507f1f77bcf86cd799439011"],
+            "subject": "测试邮件",
+            "body": "您好"
+        })
+
+        data = response.json()
+        assert data["data"][0]["job_id"] == "507f1f77bcf86cd799439012"
+        assert mock_enqueue.call_args[0][0] == "send_to_teachers"
+
+    @pytest.mark.asyncio
+    async def test_run_job_records_result(self):
+        """测试工作者执行任务并记录结果"""
+        queue = EmailQueue(workers=1)
+        job = {"_id": "507f1f77bcf86cd799439011", "kind": "send", "payload": {}, "attempts": 1, "worker_id": "w1"}
+
+        with patch.object(queue, '_dispatch', AsyncMock(return_value={"success": True, "message": "邮件发送成功"})), \
+             patch.object(email_job_collection, 'finish_job', new_callable=AsyncMock) as mock_finish:
+            await queue._run_job(job)
+
+        assert mock_finish.call_args[0][:3] == (job["_id"], "w1", "success")
+
+    @pytest.mark.asyncio
+    async def test_run_job_retries_on_exception(self):
+        """测试任务异常时放回队列重试"""
+        queue = EmailQueue(workers=1)
+        job = {"_id": "507f1f77bcf86cd799439011", "kind": "send", "payload": {}, "attempts": 1, "worker_id": "w1"}
+
+        with patch.object(queue, '_dispatch', AsyncMock(side_effect=RuntimeError("连接中断"))), \
+             patch.object(email_job_collection, 'retry_job', new_callable=AsyncMock) as mock_retry:
+            await queue._run_job(job)
+
+        mock_retry.assert_called_once_with(job["_id"], "w1", "连接中断")
+
+    @pytest.mark.asyncio
+    async def test_heartbeat_renews_lease_during_long_job(self):
+        """测试长时间运行的任务定期续约"""
+        queue = EmailQueue(workers=1)
+        job = {"_id": "507f1f77bcf86cd799439011", "kind": "send", "payload": {}, "attempts": 1, "worker_id": "w1"}
+
+        async def slow_dispatch(job):
+            await asyncio.sleep(0.05)
+            return {"success": True, "message": "邮件发送成功"}
+
+        with patch('server.services.email_queue.EMAIL_QUEUE_HEARTBEAT_INTERVAL', 0.01), \
+             patch.object(queue, '_dispatch', slow_dispatch), \
+             patch.object(email_job_collection, 'renew_lease', AsyncMock(return_value=True)) as mock_renew, \
+             patch.object(email_job_collection, 'finish_job', new_callable=AsyncMock) as mock_finish:
+            await queue._run_job(job)
+
+        assert mock_renew.await_count >= 2
+        assert mock_renew.call_args[0][:2] == (job["_id"], "w1")
+        mock_finish.assert_awaited_once()
+
+    @pytest.mark.asyncio
+    async def test_lost_lease_stops_job_without_writing_result(self):
+        """测试租约丢失时停止发送且不覆盖其他工作者的结果"""
+        queue = EmailQueue(workers=1)
+        job = {"_id": "507f1f77bcf86cd799439011", "kind": "send", "payload": {}, "attempts": 1, "worker_id": "w1"}
+        finished = []
+
+        async def slow_dispatch(job):
+            await asyncio.sleep(1)
+            finished.append(job)
+            return {"success": True, "message": "邮件发送成功"}
+
+        with patch('server.services.email_queue.EMAIL_QUEUE_HEARTBEAT_INTERVAL', 0.01), \
+             patch.object(queue, '_dispatch', slow_dispatch), \
+             patch.object(email_job_collection, 'renew_lease', AsyncMock(return_value=False)), \
+             patch.object(email_job_collection, 'finish_job', new_callable=AsyncMock) as mock_finish:
+            await queue._run_job(job)
+
+        assert finished == []
+        mock_finish.assert_not_called()
 
 if __name__ == "__main__":
     # 运行测试
@@ -0,0 +1,98 @@
+import pytest
+import smtplib
+from unittest.mock import MagicMock, patch
+import sys
+import os
+
+# 添加项目根目录到Python路径
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from server.services import smtp_pool as smtp_pool_module
+from server.services.smtp_pool import SMTPConnectionPool
+
+class TestSMTPConnectionPool:
+    """SMTP连接池测试类"""
+
+    def setup_method(self):
+        """测试前的设置"""
+        self.config = {
+            "smtp_server": "smtp.example.com",
+            "smtp_port": 587,
+            "username": "sender@example.com",
+            "password": "secret",
+            "use_tls": False,
+            "sender_email": "sender@example.com"
+        }
+        self.pool = SMTPConnectionPool(size=2)
+
+    def _server(self):
+        server = MagicMock()
+        server.noop.return_value = (250, b"OK")
+        return server
+
+    def test_reuses_authenticated_connection(self):
+        """测试多封邮件复用同一连接"""
+        with patch.object(smtp_pool_module.smtplib, "SMTP", side_effect=lambda *a, **k: self._server()) as mock_smtp:
+            for _ in range(3):
+                self.pool.sendmail(self.config, "sender@example.com", ["a@example.com"], "msg")
+
+        assert mock_smtp.call_count == 1
+
+    def test_recycles_after_message_limit(self):
+        """测试达到单连接发信上限后重建连接"""
+        with patch.object(smtp_pool_module, "SMTP_POOL_MAX_MESSAGES", 2), \
+             patch.object(smtp_pool_module.smtplib, "SMTP", side_effect=lambda *a, **k: self._server()) as mock_smtp:
+            for _ in range(3):
+                self.pool.sendmail(self.config, "sender@example.com", ["a@example.com"], "msg")
+
+        assert mock_smtp.call_count == 2
+
+    def test_discards_connection_failing_noop(self):
+        """测试NOOP失败的连接被丢弃"""
+        stale = self._server()
+        stale.noop.side_effect = smtplib.SMTPServerDisconnected()
+        servers = [stale, self._server()]
+        with patch.object(smtp_pool_module.smtplib, "SMTP", side_effect=lambda *a, **k: servers.pop(0)) as mock_smtp:
+            self.pool.sendmail(self.config, "sender@example.com", ["a@example.com"], "msg")
+            self.pool.sendmail(self.config, "sender@example.com", ["a@example.com"], "msg")
+
+        assert mock_smtp.call_count == 2
+
+    def test_retries_once_when_disconnected(self):
+        """测试发送时连接断开换新连接重试"""
+        broken = self._server()
+        broken.sendmail.side_effect = smtplib.SMTPServerDisconnected()
+        healthy = self._server()
+        servers = [broken, healthy]
+        with patch.object(smtp_pool_module.smtplib, "SMTP", side_effect=lambda *a, **k: servers.pop(0)):
+            self.pool.sendmail(self.config, "sender@example.com", ["a@example.com"], "msg")
+
+        healthy.sendmail.assert_called_once()
+
+    def test_closes_socket_when_starttls_fails(self):
+        """测试STARTTLS失败时关闭套接字"""
+        server = self._server()
+        server.starttls.side_effect = smtplib.SMTPException("不支持STARTTLS")
+        config = {**self.config, "use_tls": True}
+        with patch.object(smtp_pool_module.smtplib, "SMTP", return_value=server):
+            with pytest.raises(smtplib.SMTPException):
+                self.pool.sendmail(config, "sender@example.com", ["a@example.com"], "msg")
+
+        server.close.assert_called_once()
+        assert self.pool._slots == {}
+
+    def test_drops_entries_when_last_connection_closes(self):
+        """测试配置的最后一个连接关闭后删除该配置的条目"""
+        with patch.object(smtp_pool_module.smtplib, "SMTP", side_effect=lambda *a, **k: self._server()):
+            for password in ("old", "new"):
+                with self.pool.connection({**self.config, "password": password}):
+                    pass
+
+            assert len(self.pool._idle) == 2
+            with patch.object(smtp_pool_module, "SMTP_POOL_IDLE_TIMEOUT", -1):
+                with self.pool.connection(self.config):
+                    pass
+
+        assert self.pool._idle == {}
+        assert self.pool._slots == {}
+        assert self.pool._users == {}
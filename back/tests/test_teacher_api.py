@@ -1,15 +1,18 @@
 import pytest
 import asyncio
+import json
 from fastapi.testclient import TestClient
-from unittest.mock import AsyncMock, patch
+from unittest.mock import AsyncMock, MagicMock, patch
 import sys
 import os
 
 # 添加项目根目录到Python路径
 sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
 
+from bson.objectid import ObjectId
 from main import app
 from server.models.teacher import TeacherSchema, UpdateTeacherModel
+from server.database import teacher_collection
 
 client = TestClient(app)
 
@@ -202,6 +205,197 @@ class TestTeacherAPI:
             args = mock_update.call_args[0]
             assert args[1] == {"position": "教授"}
 
+class TestTeacherPagination:
+    """教师分页与字段投影测试类"""
+
+    @patch.object(teacher_collection, 'retrieve_page', new_callable=AsyncMock)
+    def test_get_teachers_first_page(self, mock_retrieve_page):
+        """测试获取第一页并返回next_cursor"""
+        mock_retrieve_page.return_value = (
+            [{"id": "507f1f77bcf86cd799439011", "name": "张教授"}],
+            "507f1f77bcf86cd799439011"
+        )
+
+        response = client.get("/teacher/?limit=1&fields=name")
+
+        assert response.status_code == 200
+        data = response.json()
+        assert data["next_cursor"] == "507f1f77bcf86cd799439011"
+        assert data["data"][0][0]["name"] == "张教授"
+        mock_retrieve_page.assert_called_once_with(None, 1, ["name"])
+
+    @patch.object(teacher_collection, 'retrieve_page', new_callable=AsyncMock)
+    def test_get_teachers_with_cursor(self, mock_retrieve_page):
+        """测试携带cursor获取后续页"""
+        mock_retrieve_page.return_value = ([], None)
+        cursor = "507f1f77bcf86cd799439011"
+
+        response = client.get(f"/teacher/?cursor={cursor}")
+
+        data = response.json()
+        assert data["message"] == "Empty list returned"
+        assert data["next_cursor"] is None
+        mock_retrieve_page.assert_called_once_with(cursor, 50, None)
+
+    def test_get_teachers_invalid_cursor(self):
+        """测试非法cursor"""
+        response = client.get("/teacher/?cursor=not-an-object-id")
+
+        data = response.json()
+        assert data["code"] == 400
+
+    def test_get_teachers_unknown_field(self):
+        """测试投影未知字段"""
+        response = client.get("/teacher/?fields=name,password")
+
+        data = response.json()
+        assert data["code"] == 400
+        assert "password" in data["message"]
+
+class TestTeacherExport:
+    """教师流式导出测试类"""
+
+    def setup_method(self):
+        """测试前的设置"""
+        self.teachers = [
+            {"id": "1", "name": "张教授", "email": "zhang@university.edu.cn"},
+            {"id": "2", "name": "李教授", "email": "li@university.edu.cn"},
+        ]
+
+    def _iter_all(self):
+        async def iter_all(fields=None, batch_size=None):
+            for teacher in self.teachers:
+                yield teacher
+        return iter_all
+
+    def test_export_ndjson(self):
+        """测试NDJSON导出"""
+        with patch.object(teacher_collection, 'iter_all', self._iter_all()):
+            response = client.get("/teacher/export?fields=name,email")
+
+        assert response.status_code == 200
+        assert response.headers["content-type"].startswith("application/x-ndjson")
+        lines = response.text.strip().split("\n")
+        assert len(lines) == 2
+        assert json.loads(lines[0])["name"] == "张教授"
+
+    def test_export_csv(self):
+        """测试CSV导出"""
+        with patch.object(teacher_collection, 'iter_all', self._iter_all()):
+            response = client.get("/teacher/export?format=csv&fields=name,email")
+
+        assert response.status_code == 200
+        rows = response.text.strip().splitlines()
+        assert rows[0] == "id,name,email"
+        assert rows[2] == "2,李教授,li@university.edu.cn"
+
+    def test_export_invalid_format(self):
+        """测试不支持的导出格式"""
+        response = client.get("/teacher/export?format=xml")
+
+        assert response.status_code == 422
+
+class TestTeacherBulk:
+    """教师批量写入测试类"""
+
+    def setup_method(self):
+        """测试前的设置"""
+        self.valid_teacher = {
+            "name": "张教授",
+            "title": "教授",
+            "url": "https://example.com/zhang",
+            "email": "zhang@university.edu.cn",
+            "resh_dict": "机器学习",
+            "school_college": "计算机学院",
+        }
+
+    @patch.object(teacher_collection, 'bulk_upsert', new_callable=AsyncMock)
+    def test_bulk_add_reports_per_row(self, mock_bulk_upsert):
+        """测试批量写入逐行返回结果"""
+        mock_bulk_upsert.return_value = [{"status": "inserted", "id": "507f1f77bcf86cd799439011"}]
+
+        response = client.post("/teacher/bulk", json=[self.valid_teacher, {"name": "缺少字段"}])
+
+        data = response.json()["data"][0]
+        assert data["inserted"] == 1
+        assert data["invalid"] == 1
+        assert data["results"][0]["id"] == "507f1f77bcf86cd799439011"
+        assert data["results"][1]["status"] == "invalid"
+        # 只有校验通过的记录参与写入
+        written, ordered = mock_bulk_upsert.call_args[0]
+        assert len(written) == 1 and ordered is False
+
+    @patch.object(teacher_collection, 'bulk_upsert', new_callable=AsyncMock)
+    def test_bulk_add_ndjson(self, mock_bulk_upsert):
+        """测试NDJSON上传批量写入"""
+        mock_bulk_upsert.return_value = [{"status": "updated", "id": "507f1f77bcf86cd799439011"}]
+        content = json.dumps(self.valid_teacher, ensure_ascii=False) + "\n{not json}\n"
+
+        response = client.post(
+            "/teacher/bulk/ndjson?ordered=true",
+            files={"file": ("teachers.ndjson", content.encode("utf-8"), "application/x-ndjson")},
+        )
+
+        data = response.json()["data"][0]
+        assert data["updated"] == 1
+        assert data["invalid"] == 1
+        assert mock_bulk_upsert.call_args[0][1] is True
+
+    @patch.object(teacher_collection, 'bulk_upsert', new_callable=AsyncMock)
+    def test_bulk_add_ndjson_reports_undecodable_line(self, mock_bulk_upsert):
+        """测试非UTF-8的行标记为invalid，其余记录照常写入"""
+        mock_bulk_upsert.return_value = [{"status": "inserted", "id": "507f1f77bcf86cd799439011"}]
+        content = json.dumps(self.valid_teacher, ensure_ascii=False).encode("utf-8") + b"\n" \
+            + json.dumps({"name": "王老师"}, ensure_ascii=False).encode("gbk") + b"\n"
+
+        response = client.post(
+            "/teacher/bulk/ndjson",
+            files={"file": ("teachers.ndjson", content, "application/x-ndjson")},
+        )
+
+        assert response.status_code == 200
+        data = response.json()["data"][0]
+        assert data["inserted"] == 1
+        assert data["invalid"] == 1
+        assert data["results"][1]["error"].startswith("Invalid UTF-8")
+
+class TestTeacherRetrieveMany:
+    """教师批量查询测试类"""
+
+    class FakeCursor:
+        def __init__(self, docs):
+            self.docs = docs
+
+        def __aiter__(self):
+            self._iter = iter(self.docs)
+            return self
+
+        async def __anext__(self):
+            try:
+                return next(self._iter)
+            except StopIteration:
+                raise StopAsyncIteration
+
+    @pytest.mark.asyncio
+    async def test_retrieve_many_single_query_in_input_order(self):
+        """测试一次$in查询并按输入顺序返回"""
+        first, second = ObjectId(), ObjectId()
+        fake_collection = MagicMock()
+        fake_collection.find.return_value = self.FakeCursor([
+            {"_id": second, "name": "李教授", "email": "li@university.edu.cn"},
+            {"_id": first, "name": "张教授", "email": "zhang@university.edu.cn"},
+        ])
+
+        with patch.object(teacher_collection, 'collection', fake_collection):
+            teachers = await teacher_collection.retrieve_many(
+                [str(first), "invalid", str(second), str(first)], ["name", "email"]
+            )
+
+        assert [t["name"] for t in teachers] == ["张教授", "李教授"]
+        fake_collection.find.assert_called_once_with(
+            {"_id": {"$in": [first, second]}}, {"name": 1, "email": 1}
+        )
+
 class TestSMTPParameters:
     """SMTP参数测试类"""
     
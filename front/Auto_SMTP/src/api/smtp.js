@@ -28,14 +28,17 @@ export const smtpApi = {
   
   // 邮件发送相关
   sendEmail: (emailData) => api.post('/send', emailData),
-  sendToTeachers: (teacherIds, subject, body, isHtml = false, attachmentIds = []) => 
+  sendToTeachers: (teacherIds, subject, body, isHtml = false, attachmentIds = [], personalize = true) => 
     api.post('/send-to-teachers', {
       teacher_ids: teacherIds,
       subject: subject,
       body: body,
       is_html: isHtml,
-      attachment_ids: attachmentIds
+      attachment_ids: attachmentIds,
+      personalize: personalize
     }),
+  // 查询发送任务状态（发送接口返回job_id）
+  getJob: (jobId) => api.get(`/jobs/${jobId}`),
   
   // 邮件记录相关
   getEmailLogs: (params = {}) => {
@@ -19,8 +19,22 @@ api.interceptors.response.use(
 )
 
 export const teacherApi = {
-  // 获取所有教师
-  getAllTeachers: () => api.get('/'),
+  // 分页获取教师（cursor为上一页返回的next_cursor）
+  getTeachersPage: (params = {}) => api.get('/', { params }),
+
+  // 获取所有教师（按next_cursor逐页拉取后合并）
+  getAllTeachers: async (limit = 500) => {
+    const teachers = []
+    let cursor = null
+    let response
+    do {
+      response = await teacherApi.getTeachersPage(cursor ? { cursor, limit } : { limit })
+      if (response.code !== 200) return response
+      teachers.push(...(response.data?.[0] || []))
+      cursor = response.next_cursor
+    } while (cursor)
+    return { ...response, data: [teachers], next_cursor: null }
+  },
   
   // 获取单个教师
   getTeacher: (id) => api.get(`/${id}`),
@@ -43,6 +57,9 @@ export const teacherApi = {
   // 按学院筛选教师 (保留兼容性)
   getTeachersByCollege: (college) => api.get(`/college/${college}`),
   
+  // 按研究方向全文检索教师（BM25排序，分页）
+  searchTeachers: (q, page = 1, size = 20) => api.get('/search', { params: { q, page, size } }),
+  
   // 按研究方向筛选教师 (保留兼容性)
   getTeachersByResearch: (research) => api.get(`/research/${research}`)
 }